@@ -3,6 +3,8 @@ import json
 import logging
 from openai import OpenAI
 from clip_analyzer import CLIPVisualAnalyzer
+from image_hash_index import PerceptualHashIndex
+from thumbnail_similarity import ThumbnailSimilarityIndex
 import requests
 import re
 from datetime import datetime
@@ -11,7 +13,8 @@ class AIAnalyzer:
     def __init__(self):
         self.openai_client = OpenAI(api_key=os.environ.get('OPENAI_API_KEY', 'sk-fallback-key'))
         self.demo_mode = not os.environ.get('OPENAI_API_KEY') or os.environ.get('OPENAI_API_KEY') == 'sk-fallback-key'
-        self.clip_analyzer = CLIPVisualAnalyzer()
+        self.clip_analyzer = CLIPVisualAnalyzer(hash_index=PerceptualHashIndex(),
+                                                similarity_index=ThumbnailSimilarityIndex())
         self.last_error = None
     
     def analyze_channel(self, channel_info, videos):
@@ -32,6 +32,10 @@ with app.app_context():
     # Import models to ensure tables are created
     import models  # noqa: F401
     db.create_all()
+    
+    # Bring databases created by earlier versions up to date
+    from migrations import run_migrations
+    run_migrations()
 
 # Import routes after app initialization
 import routes  # noqa: F401
@@ -0,0 +1,489 @@
+"""Micro-benchmarks for the local analysis code paths
+
+Run all benchmarks with ``python benchmarks.py`` or pick some by name,
+e.g. ``python benchmarks.py dominant_colors``.
+"""
+import io
+import logging
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+from PIL import Image
+
+from clip_analyzer import CLIPVisualAnalyzer, ImageFeatures
+from keyword_matcher import KeywordMatcher
+from performance_grid import optimize_schedule
+from thumbnail_similarity import DIMENSIONS, ThumbnailSimilarityIndex
+
+
+def _timeit(func, repeat=50):
+    """Best-of-N wall time of func() in milliseconds"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def _synthetic_image(width, height, seed=0):
+    """Noisy image with a few flat color blocks, like a typical thumbnail"""
+    rng = np.random.default_rng(seed)
+    pixels = rng.integers(0, 256, size=(height, width, 3), dtype=np.uint8)
+    pixels[:height // 2, :width // 3] = (200, 30, 30)
+    pixels[height // 2:, width // 2:] = (20, 60, 180)
+    pixels[:height // 4, width // 2:] = (245, 245, 245)
+    return Image.fromarray(pixels)
+
+
+def _shaded_image(width, height, seed=0):
+    """A softly lit red area over a dark blue background, with sensor noise"""
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:height, 0:width]
+    pixels = np.empty((height, width, 3))
+    pixels[:] = (20, 30, 70)
+    light = 1 - 0.08 * ((x - width / 3) ** 2 + (y - height / 2) ** 2) / (width / 3) ** 2
+    area = (x < 2 * width / 3)
+    pixels[area] = np.outer(light[area], (214, 66, 27))
+    pixels += rng.normal(0, 2, pixels.shape)
+    return Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8))
+
+
+def _legacy_dominant_colors(pixels, num_colors=3):
+    """The original per-pixel dict loop, kept as the benchmark baseline"""
+    color_counts = {}
+    for pixel in pixels[::10]:
+        color_key = tuple(pixel)
+        color_counts[color_key] = color_counts.get(color_key, 0) + 1
+    sorted_colors = sorted(color_counts.items(), key=lambda x: x[1], reverse=True)
+    return ['#{:02x}{:02x}{:02x}'.format(*color) for color, _ in sorted_colors[:num_colors]]
+
+
+def bench_dominant_colors():
+    analyzer = CLIPVisualAnalyzer()
+    features = ImageFeatures(_synthetic_image(1280, 720))
+    pixels = np.asarray(features.image.resize((150, 150))).reshape(-1, 3)
+
+    legacy = _timeit(lambda: _legacy_dominant_colors(pixels))
+    binned = _timeit(lambda: analyzer._quantized_palette(pixels, 3))
+    refined = _timeit(lambda: analyzer._refine_palette(pixels, analyzer._quantized_palette(pixels, 3), 3))
+    end_to_end = _timeit(lambda: analyzer._extract_dominant_colors(features))
+
+    print(f"  legacy dict loop:        {legacy:8.3f} ms  {_legacy_dominant_colors(pixels)}")
+    print(f"  bincount palette:        {binned:8.3f} ms  {analyzer._extract_dominant_colors(features)}")
+    print(f"  bincount + 3 k-means:    {refined:8.3f} ms")
+    print(f"  with 150x150 sampling:   {end_to_end:8.3f} ms")
+
+    # One shaded red area: without merging, adjacent bins come back as
+    # near-duplicate dominant colors and the harmony score is penalized
+    shaded = ImageFeatures(_shaded_image(1280, 720))
+    merge_distance = analyzer.palette_config['merge_distance']
+    for label, distance in (('unmerged bins:', 0), (f'merged within {merge_distance}:', merge_distance)):
+        analyzer.palette_config['merge_distance'] = distance
+        colors = analyzer._extract_dominant_colors(shaded)
+        elapsed = _timeit(lambda: analyzer._extract_dominant_colors(shaded))
+        print(f"  shaded, {label:18s} {elapsed:6.3f} ms  {colors} "
+              f"harmony {analyzer._calculate_color_harmony(colors)}")
+    analyzer.palette_config['merge_distance'] = merge_distance
+
+
+def bench_thumbnail_batch():
+    analyzer = CLIPVisualAnalyzer()
+    images = {f"thumb-{i}": _synthetic_image(320, 180, seed=i) for i in range(50)}
+    videos = [{'id': url, 'thumbnail_url': url} for url in images]
+    # Serve decoded images from memory so only the metric computation is timed
+    analyzer._load_image = lambda url, **kwargs: images[url]
+
+    single = _timeit(lambda: analyzer.analyze_thumbnail('thumb-0'), repeat=5)
+    batch = _timeit(lambda: analyzer.analyze_thumbnails_batch(videos), repeat=5)
+
+    print(f"  1 thumbnail, single path:   {single:8.2f} ms")
+    print(f"  50 thumbnails, batch path:  {batch:8.2f} ms ({batch / 50:.2f} ms each, {batch / single:.1f}x one thumbnail)")
+
+
+def _synthetic_jpeg(width, height, seed=0):
+    """JPEG bytes of a smooth gradient with flat blocks and a text-like strip"""
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:height, 0:width]
+    pixels = np.stack([
+        255 * x / width,
+        255 * y / height,
+        128 + 100 * np.sin(x / (width / 12) + seed)
+    ], axis=2)
+    pixels[height // 8:height // 3, width // 10:width // 2] = rng.integers(0, 256, 3)
+    pixels[height // 2:height // 2 + height // 10:, width // 3:2 * width // 3][:, ::max(1, width // 80)] = 255
+    pixels += rng.normal(0, 6, pixels.shape)
+
+    buffer = io.BytesIO()
+    Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8)).save(buffer, 'JPEG', quality=90)
+    return buffer.getvalue()
+
+
+def _scores(result, prefix=''):
+    """Flatten every numeric score in a nested analysis result"""
+    scores = {}
+    for key, value in result.items():
+        path = f"{prefix}{key}"
+        if isinstance(value, dict):
+            scores.update(_scores(value, f"{path}."))
+        elif isinstance(value, (int, float)) and (key == 'score' or key.endswith('_score')):
+            scores[path] = float(value)
+    return scores
+
+
+def bench_jpeg_draft():
+    """Decode cost and score drift of reduced-resolution JPEG decoding
+
+    Uses JPEGs from $BENCH_IMAGE_DIR when set, otherwise synthetic ones.
+    """
+    analyzer = CLIPVisualAnalyzer()
+    suites = {
+        'quality': analyzer._analyze_quality,
+        'thumbnail': analyzer._analyze_thumbnail_features,
+        'channel_art': analyzer._analyze_channel_art_features
+    }
+
+    image_dir = os.environ.get('BENCH_IMAGE_DIR')
+    if image_dir:
+        samples = [open(os.path.join(image_dir, name), 'rb').read()
+                   for name in sorted(os.listdir(image_dir)) if name.lower().endswith(('.jpg', '.jpeg'))]
+    else:
+        samples = [_synthetic_jpeg(2560, 1440, seed) for seed in range(3)] + \
+                  [_synthetic_jpeg(1280, 720, seed) for seed in range(3)]
+
+    for family, suite in suites.items():
+        target = analyzer.decode_targets[family]
+        full_ms = draft_ms = 0
+        full_bytes = draft_bytes = 0
+        drift = {}
+
+        for data in samples:
+            full_ms += _timeit(lambda: analyzer._decode_image(data), repeat=3)
+            draft_ms += _timeit(lambda: analyzer._decode_image(data, target), repeat=3)
+
+            full = analyzer._decode_image(data)
+            draft = analyzer._decode_image(data, target)
+            full_bytes += full.width * full.height * 3
+            draft_bytes += draft.width * draft.height * 3
+
+            full_scores = _scores(suite(ImageFeatures(full)))
+            draft_scores = _scores(suite(ImageFeatures(draft)))
+            for path, value in full_scores.items():
+                if path in draft_scores:
+                    drift.setdefault(path, []).append(abs(draft_scores[path] - value))
+
+        print(f"  {family} (target {target[0]}x{target[1]}, {len(samples)} images):")
+        print(f"    decode time:   {full_ms:8.1f} ms -> {draft_ms:8.1f} ms ({full_ms / draft_ms:.1f}x)")
+        print(f"    pixel memory:  {full_bytes / 2**20:8.1f} MB -> {draft_bytes / 2**20:8.1f} MB "
+              f"({full_bytes / draft_bytes:.1f}x)")
+        print("    score drift (mean / max abs points):")
+        for path, values in sorted(drift.items(), key=lambda item: -max(item[1])):
+            print(f"      {path:45s} {np.mean(values):6.2f} / {max(values):6.2f}")
+
+
+def bench_region_stats():
+    """Direct slicing vs summed-area tables for grids and sliding windows"""
+    image = _synthetic_image(1280, 720)
+
+    def grid(rows, cols):
+        row_edges = np.arange(rows + 1) * 720 // rows
+        col_edges = np.arange(cols + 1) * 1280 // cols
+        top, left = np.meshgrid(row_edges[:-1], col_edges[:-1], indexing='ij')
+        bottom, right = np.meshgrid(row_edges[1:], col_edges[1:], indexing='ij')
+        return top, bottom, left, right
+
+    def windows(size, stride):
+        top, left = np.meshgrid(np.arange(0, 720 - size + 1, stride),
+                                np.arange(0, 1280 - size + 1, stride), indexing='ij')
+        return top, top + size, left, left + size
+
+    cases = [(f"{n}x{n} grid", grid(n, n)) for n in (3, 12, 48)] + \
+            [(f"{size}px windows, stride {stride}", windows(size, stride)) for size, stride in ((128, 64), (64, 16))]
+
+    for label, bounds in cases:
+        def run(use_tables):
+            # Fresh features every run, so table construction is included
+            features = ImageFeatures(image)
+            features.rgb
+            features._box_stats(*bounds, 'rgb', True, use_tables)
+
+        direct = _timeit(lambda: run(False), repeat=5)
+        tables = _timeit(lambda: run(True), repeat=5)
+        coverage = ((bounds[1] - bounds[0]) * (bounds[3] - bounds[2])).sum() / (1280 * 720)
+        print(f"  {label:28s} {bounds[0].size:5d} regions, {coverage:4.1f}x coverage: "
+              f"direct {direct:8.2f} ms, summed-area tables {tables:7.2f} ms")
+
+
+def bench_palette_scoring():
+    """Per-palette scoring of hex strings vs one pass over stacked palette arrays"""
+    analyzer = CLIPVisualAnalyzer()
+    rng = np.random.default_rng(0)
+    palettes = rng.integers(0, 256, size=(1000, 16, 3)).astype(float)
+    hex_palettes = [analyzer._palette_hex(palette) for palette in palettes]
+
+    per_palette = _timeit(lambda: [(analyzer._calculate_color_harmony(colors),
+                                    analyzer._analyze_color_contrast(colors))
+                                   for colors in hex_palettes], repeat=3)
+    stacked = _timeit(lambda: (analyzer._color_harmony_scores(palettes),
+                               analyzer._contrast_matrix(palettes)), repeat=3)
+
+    print(f"  1000 x 16-color palettes, one call each:  {per_palette:8.2f} ms")
+    print(f"  same palettes as one (1000, 16, 3) array: {stacked:8.2f} ms (all-pairs contrast)")
+
+
+def bench_pyramid():
+    """Small-size resampling from the full image vs from the shared pyramid"""
+    analyzer = CLIPVisualAnalyzer()
+    image = analyzer._decode_image(_synthetic_jpeg(2560, 1440))
+    sizes = list(analyzer.metric_scales.values())
+
+    def direct():
+        for size in sizes:
+            image.resize(size)
+
+    def pyramid():
+        features = ImageFeatures(image)
+        for size in sizes:
+            features.scaled(size).resize(size)
+
+    print(f"  {len(sizes)} metric sizes from a 2560x1440 image:")
+    print(f"    each from full resolution: {_timeit(direct, repeat=10):8.2f} ms")
+    print(f"    from the nearest level:    {_timeit(pyramid, repeat=10):8.2f} ms (pyramid build included)")
+
+
+def bench_similarity_search():
+    """Top-10 cosine search over 120k random unit descriptors"""
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((120_000, DIMENSIONS)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    metadata = [{'thumbnail_url': f"thumb-{i}", 'youtube_optimized_score': float(i % 100)}
+                for i in range(len(vectors))]
+
+    with tempfile.TemporaryDirectory() as directory:
+        ThumbnailSimilarityIndex(directory).add_many(vectors, metadata)
+
+        # Queries are noisy copies of known rows, so recall@1 is measurable
+        targets = rng.choice(len(vectors), 50, replace=False)
+        queries = vectors[targets] + 0.03 * rng.standard_normal((50, DIMENSIONS)).astype(np.float32)
+
+        for bits in (0, 16):
+            index = ThumbnailSimilarityIndex(directory, projection_bits=bits)
+            index.search(queries[0])  # Load the rows outside the timing
+
+            start = time.perf_counter()
+            results = [index.search(query, k=10) for query in queries]
+            elapsed = (time.perf_counter() - start) * 1000 / len(queries)
+
+            recall = np.mean([result[0]['thumbnail_url'] == f"thumb-{target}"
+                              for result, target in zip(results, targets)])
+            label = f"{bits}-bit buckets" if bits else "exact scan"
+            print(f"  {label:15s} {elapsed:6.2f} ms per query, recall@1 {recall:.2f}")
+
+
+def bench_keyword_matcher():
+    """Per-keyword substring checks vs one Aho-Corasick pass, as the lists grow"""
+    rng = np.random.default_rng(0)
+    letters = list('ابتثجحخدذرزسشصضطظعغفقكلمنهوي')
+    title = ' '.join(''.join(rng.choice(letters, rng.integers(2, 7))) for _ in range(10))
+
+    for size in (100, 1000, 10000):
+        keywords = [''.join(rng.choice(letters, rng.integers(3, 8))) for _ in range(size)]
+        matcher = KeywordMatcher()
+        matcher.register('bench', {'keywords': keywords})
+
+        per_keyword = _timeit(lambda: [keyword for keyword in keywords if keyword in title], repeat=20)
+        one_pass = _timeit(lambda: matcher.scan(title), repeat=20)
+        print(f"  {size:6d} keywords, {len(title)}-char title: "
+              f"per keyword {per_keyword:7.3f} ms, one pass {one_pass:7.3f} ms")
+
+
+def bench_schedule_optimizer():
+    """Exact top-5 weekly schedule search on a 7x24 grid, per slot count and spacing"""
+    rng = np.random.default_rng(0)
+    gains = np.expm1(rng.normal(scale=0.3, size=168))
+
+    for slots, min_gap in ((3, 24), (7, 24), (7, 12), (14, 6), (21, 4), (21, 1)):
+        elapsed = _timeit(lambda: optimize_schedule(gains, slots, min_gap), repeat=3)
+        print(f"  {slots:2d} slots, {min_gap:2d}h apart: {elapsed:7.1f} ms")
+
+
+def bench_latest_analysis():
+    """Latest-analysis and title-history lookups before and after the lookup migrations
+
+    Builds a throwaway SQLite database through the app's models with
+    BENCH_ANALYSIS_ROWS channel analyses (10M by default) and a fifth as
+    many title analyses, without their indexes or title hashes. It then
+    times ChannelAnalysis.latest_for_channel, history_for_channel and
+    TitleAnalysis.history_for_title, applies the 0001 and 0002 migrations
+    with run_migrations(), and times the helpers again. At 10M rows the
+    build takes several minutes and a few GB of disk.
+    """
+    rows = int(os.environ.get('BENCH_ANALYSIS_ROWS', 10_000_000))
+    title_rows = max(1, rows // 5)
+    channels = max(1, rows // 50)
+    titles = max(1, title_rows // 10)
+    rng = np.random.default_rng(0)
+
+    with tempfile.TemporaryDirectory() as directory:
+        url = f"sqlite:///{os.path.join(directory, 'bench.db')}"
+        os.environ['DATABASE_URL'] = url
+        from app import app, db
+        from migrations import run_migrations
+        from models import LOOKUP_INDEXES, ChannelAnalysis, TitleAnalysis
+        logging.getLogger().setLevel(logging.WARNING)
+
+        if app.config['SQLALCHEMY_DATABASE_URI'] != url:
+            print("  skipped: app was already imported with another database")
+            return
+
+        with app.app_context():
+            # The state of a database from before the lookup migrations
+            for index in LOOKUP_INDEXES:
+                index.drop(db.engine, checkfirst=True)
+            with db.engine.begin() as connection:
+                connection.execute(db.text("DELETE FROM schema_migrations "
+                                           "WHERE name IN ('0001_title_hash', '0002_lookup_indexes')"))
+
+            start = time.perf_counter()
+            dates = np.datetime64('2020-09-13') + rng.integers(0, 150_000_000, rows).astype('timedelta64[s]')
+            with db.engine.begin() as connection:
+                for offset in range(0, rows, 500_000):
+                    chunk = slice(offset, min(rows, offset + 500_000))
+                    channel_ids = rng.integers(0, channels, chunk.stop - chunk.start).tolist()
+                    connection.execute(db.insert(ChannelAnalysis), [
+                        {'channel_id': f'UC{channel:022d}', 'channel_name': 'قناة', 'analysis_date': date}
+                        for channel, date in zip(channel_ids, dates[chunk].astype(object))
+                    ])
+                for offset in range(0, title_rows, 500_000):
+                    chunk = slice(offset, min(title_rows, offset + 500_000))
+                    title_ids = rng.integers(0, titles, chunk.stop - chunk.start).tolist()
+                    connection.execute(db.insert(TitleAnalysis), [
+                        {'title': f'كيف تتعلم البرمجة في {title} يوم', 'title_hash': None, 'analysis_date': date}
+                        for title, date in zip(title_ids, dates[chunk].astype(object))
+                    ])
+            print(f"  {rows:,} channel analyses ({channels:,} channels), {title_rows:,} title analyses "
+                  f"({titles:,} titles): built in {time.perf_counter() - start:.1f} s")
+
+            channel_lookups = [f'UC{channel:022d}' for channel in rng.integers(0, channels, 20).tolist()]
+            title_lookups = [f'كيف تتعلم البرمجة في {title} يوم' for title in rng.integers(0, titles, 20).tolist()]
+            helpers = [
+                ('latest_for_channel', ChannelAnalysis.latest_for_channel, channel_lookups),
+                ('history_for_channel', ChannelAnalysis.history_for_channel, channel_lookups),
+                ('history_for_title', TitleAnalysis.history_for_title, title_lookups),
+            ]
+
+            def time_helpers(lookups, repeat):
+                timings = {}
+                for name, helper, arguments in helpers:
+                    def run():
+                        for argument in arguments[:lookups]:
+                            helper(argument)
+                            db.session.rollback()
+                    timings[name] = _timeit(run, repeat=repeat) / lookups
+                return timings
+
+            scanned = time_helpers(lookups=3, repeat=1)
+
+            start = time.perf_counter()
+            run_migrations()
+            print(f"  title hash backfill and lookup indexes: {time.perf_counter() - start:.1f} s")
+            indexed = time_helpers(lookups=20, repeat=20)
+
+            for name, _, _ in helpers:
+                print(f"  {name:20s} {scanned[name]:9.2f} ms before, {indexed[name]:7.3f} ms after "
+                      f"({scanned[name] / indexed[name]:,.0f}x)")
+
+            db.session.remove()
+            db.engine.dispose()
+
+
+def _reset_peak_rss():
+    """Reset the kernel's RSS high-water mark (Linux); ru_maxrss survives fork and exec"""
+    with open('/proc/self/clear_refs', 'w') as refs:
+        refs.write('5')
+
+
+def _peak_rss_mb():
+    with open('/proc/self/status') as status:
+        for line in status:
+            if line.startswith('VmHWM:'):
+                return int(line.split()[1]) / 1024
+
+
+def _current_rss_mb():
+    with open('/proc/self/status') as status:
+        for line in status:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1]) / 1024
+
+
+def _peak_rss_child(suite_name, data, target, results):
+    """Decode and analyze one image, reporting the peak RSS growth in MB"""
+    analyzer = CLIPVisualAnalyzer()
+    suite = getattr(analyzer, suite_name)
+    _reset_peak_rss()
+    baseline = _current_rss_mb()
+
+    image = analyzer._decode_image(data, target)
+    if image is not None:
+        suite(ImageFeatures(image))
+
+    results.put((_peak_rss_mb() - baseline, image.size if image is not None else None))
+
+
+def _encode(pixels, image_format):
+    buffer = io.BytesIO()
+    Image.fromarray(pixels).save(buffer, image_format)
+    return buffer.getvalue()
+
+
+def bench_memory():
+    """Peak RSS growth per analysis, each run in a fresh process (Linux only)"""
+    analyzer = CLIPVisualAnalyzer()
+    rng = np.random.default_rng(0)
+    cases = [
+        ('4000x2250 JPEG, quality', '_analyze_quality', _synthetic_jpeg(4000, 2250), 'quality'),
+        ('1280x720 JPEG, thumbnail', '_analyze_thumbnail_features', _synthetic_jpeg(1280, 720), 'thumbnail'),
+        ('2560x1440 PNG, channel art', '_analyze_channel_art_features',
+         _encode(rng.integers(0, 256, (1440, 2560, 3), dtype=np.uint8), 'PNG'), 'channel_art'),
+        ('6000x4000 PNG, over pixel cap', '_analyze_channel_art_features',
+         _encode(np.zeros((4000, 6000, 3), dtype=np.uint8), 'PNG'), 'channel_art'),
+    ]
+
+    context = multiprocessing.get_context('spawn')
+    for label, suite_name, data, family in cases:
+        results = context.Queue()
+        process = context.Process(target=_peak_rss_child,
+                                  args=(suite_name, data, analyzer.decode_targets[family], results))
+        process.start()
+        peak_mb, size = results.get()
+        process.join()
+
+        decoded = f"{size[0]}x{size[1]}" if size else "rejected"
+        print(f"  {label:32s} {len(data) / 2**20:5.1f} MB file, decoded {decoded:>10s}: "
+              f"peak RSS +{peak_mb:6.1f} MB")
+
+
+BENCHMARKS = {
+    'dominant_colors': bench_dominant_colors,
+    'thumbnail_batch': bench_thumbnail_batch,
+    'jpeg_draft': bench_jpeg_draft,
+    'region_stats': bench_region_stats,
+    'palette_scoring': bench_palette_scoring,
+    'memory': bench_memory,
+    'pyramid': bench_pyramid,
+    'similarity_search': bench_similarity_search,
+    'keyword_matcher': bench_keyword_matcher,
+    'schedule_optimizer': bench_schedule_optimizer,
+    'latest_analysis': bench_latest_analysis,
+}
+
+
+if __name__ == '__main__':
+    for name in sys.argv[1:] or BENCHMARKS:
+        print(f"{name}:")
+        BENCHMARKS[name]()
@@ -0,0 +1,328 @@
+import heapq
+from collections import deque
+import logging
+import math
+import threading
+import time
+from datetime import datetime
+
+# Coarse gap distribution reported to users: (upper bound in days, label)
+GAP_BUCKETS = [
+    (1, 'أقل من يوم'), (2, 'يوم'), (4, '2-3 أيام'), (7, '4-6 أيام'),
+    (14, 'أسبوع'), (30, 'أسبوعان إلى شهر'), (90, '1-3 أشهر'), (math.inf, 'أكثر من 3 أشهر')
+]
+
+# Fine log-scale gap histogram for quantiles: bins of log2(1 + hours)
+_GAP_BIN_WIDTH = 0.125
+_GAP_BINS = 128
+
+
+def frequency_label(median_gap_days):
+    """Posting frequency label of a typical gap between uploads"""
+    if median_gap_days is None:
+        return 'غير منتظم'
+    if median_gap_days < 3:
+        return 'يومي'
+    if median_gap_days < 7:
+        return 'أسبوعي'
+    if median_gap_days < 30:
+        return 'شهري'
+    return 'غير منتظم'
+
+
+def _seconds(published_at):
+    """UTC seconds of a stored (naive UTC) timestamp"""
+    return int((published_at - datetime(1970, 1, 1)).total_seconds())
+
+
+def _iso(seconds):
+    return datetime.utcfromtimestamp(seconds).isoformat() if seconds is not None else None
+
+
+class CadenceAccumulator:
+    """Upload cadence statistics built in one pass over uploads in publish order
+
+    Keeps only running sums, fixed-size histograms and per-month totals, so
+    memory does not grow with history length and new uploads can be added
+    to an existing accumulator. Uploads younger than min_age_days count
+    toward the monthly views only once promote() sees them old enough.
+    """
+
+    def __init__(self, hiatus_days=30, min_age_days=7, longest_hiatuses=5):
+        self.hiatus_days = hiatus_days
+        self.min_age_days = min_age_days
+        self.longest_hiatuses = longest_hiatuses
+
+        self.count = 0
+        self.first = None
+        self.last = None
+
+        # Gaps in days: Welford mean/variance plus histograms
+        self.gaps = 0
+        self.gap_mean = 0.0
+        self.gap_m2 = 0.0
+        self.gap_histogram = [0] * _GAP_BINS
+        self.gap_buckets = [0] * len(GAP_BUCKETS)
+
+        # Runs of consecutive calendar weeks with uploads
+        self.last_week = None
+        self.streak = 0
+        self.streak_start = None
+        self.longest_streak = (0, None, None)
+
+        self.hiatus_count = 0
+        self.hiatus_days_total = 0.0
+        self.hiatuses = []  # min-heap of (days, start, end)
+
+        # month -> [uploads, mature uploads, sum of log(1 + views)]
+        self.periods = {}
+        # Uploads not yet old enough for the views statistics, in publish order
+        self.pending = deque()
+
+    def add(self, published, views, now):
+        """Add one upload (UTC seconds); uploads must arrive in publish order"""
+        if self.last is not None:
+            self._add_gap(published - self.last)
+        else:
+            self.first = published
+        self.count += 1
+        self.last = published
+
+        week = (published // 86400 + 3) // 7
+        if week != self.last_week:
+            if self.last_week is not None and week == self.last_week + 1:
+                self.streak += 1
+            else:
+                self.streak, self.streak_start = 1, published
+            self.last_week = week
+            if self.streak > self.longest_streak[0]:
+                self.longest_streak = (self.streak, self.streak_start, published)
+
+        self._period(published)[0] += 1
+        if self.pending or now - published < self.min_age_days * 86400:
+            self.pending.append(published)
+        else:
+            self._add_views(published, views)
+
+    def promote(self, uploads, now):
+        """Count pending uploads that reached min_age_days, with their current views
+
+        uploads are (published, views) in publish order, starting with the
+        oldest pending upload.
+        """
+        for published, views in uploads:
+            if not self.pending or now - self.pending[0] < self.min_age_days * 86400:
+                break
+            if published == self.pending[0]:
+                self.pending.popleft()
+                self._add_views(published, views)
+
+    def _period(self, published):
+        moment = datetime.utcfromtimestamp(published)
+        return self.periods.setdefault(f'{moment.year}-{moment.month:02d}', [0, 0, 0.0])
+
+    def _add_views(self, published, views):
+        period = self._period(published)
+        period[1] += 1
+        period[2] += math.log1p(max(0, views or 0))
+
+    def _add_gap(self, seconds):
+        days = max(0, seconds) / 86400
+        self.gaps += 1
+        delta = days - self.gap_mean
+        self.gap_mean += delta / self.gaps
+        self.gap_m2 += delta * (days - self.gap_mean)
+
+        index = int(math.log2(1 + days * 24) / _GAP_BIN_WIDTH)
+        self.gap_histogram[min(index, _GAP_BINS - 1)] += 1
+        self.gap_buckets[next(i for i, (limit, _) in enumerate(GAP_BUCKETS) if days < limit)] += 1
+
+        if days >= self.hiatus_days:
+            self.hiatus_count += 1
+            self.hiatus_days_total += days
+            entry = (days, self.last, self.last + seconds)
+            if len(self.hiatuses) < self.longest_hiatuses:
+                heapq.heappush(self.hiatuses, entry)
+            elif entry > self.hiatuses[0]:
+                heapq.heapreplace(self.hiatuses, entry)
+
+    def gap_quantile(self, q):
+        """Approximate gap quantile in days, from the log-scale histogram"""
+        if not self.gaps:
+            return None
+        target = q * self.gaps
+        seen = 0
+        for index, count in enumerate(self.gap_histogram):
+            if count and seen + count >= target:
+                position = index + (target - seen) / count
+                return (2 ** (position * _GAP_BIN_WIDTH) - 1) / 24
+            seen += count
+        return self.gap_mean
+
+    def summary(self, now, recent_periods=12):
+        if not self.count:
+            return None
+
+        median_gap = self.gap_quantile(0.5)
+        gap_std = math.sqrt(self.gap_m2 / self.gaps) if self.gaps else 0.0
+        span_days = (self.last - self.first) / 86400
+
+        current_week = (now // 86400 + 3) // 7
+        current_streak = self.streak if self.last_week is not None and current_week - self.last_week <= 1 else 0
+        longest, longest_start, longest_end = self.longest_streak
+
+        return {
+            'uploads': self.count,
+            'first_upload': _iso(self.first),
+            'last_upload': _iso(self.last),
+            'span_days': round(span_days, 1),
+            'days_since_last_upload': round((now - self.last) / 86400, 1),
+            'uploads_per_week': round(self.count / max(1.0, span_days / 7), 2),
+            'posting_frequency': frequency_label(median_gap),
+            # 1 for perfectly even gaps, toward 0 as they vary more
+            'consistency': round(1 / (1 + gap_std / self.gap_mean), 3) if self.gap_mean > 0 else 0.0,
+            'gaps': {
+                'median_days': round(median_gap, 2) if median_gap is not None else None,
+                'p90_days': round(self.gap_quantile(0.9), 2) if self.gaps else None,
+                'mean_days': round(self.gap_mean, 2),
+                'std_days': round(gap_std, 2),
+                'distribution': {label: count for (_, label), count in zip(GAP_BUCKETS, self.gap_buckets)}
+            },
+            'streaks': {
+                'current_weeks': current_streak,
+                'longest_weeks': longest,
+                'longest_start': _iso(longest_start),
+                'longest_end': _iso(longest_end)
+            },
+            'hiatuses': {
+                'threshold_days': self.hiatus_days,
+                'count': self.hiatus_count,
+                'total_days': round(self.hiatus_days_total, 1),
+                'longest': [
+                    {'start': _iso(start), 'end': _iso(end), 'days': round(days, 1)}
+                    for days, start, end in sorted(self.hiatuses, reverse=True)
+                ]
+            },
+            'performance': self._performance(recent_periods)
+        }
+
+    def _performance(self, recent_periods):
+        """Correlation of monthly upload count with the month's typical views"""
+        active = [(key, uploads, mature, log_views) for key, (uploads, mature, log_views) in self.periods.items()]
+        active.sort()
+        measured = [(uploads, log_views / mature) for _, uploads, mature, log_views in active if mature]
+
+        correlation = None
+        if len(measured) >= 3:
+            n = len(measured)
+            mean_x = sum(x for x, _ in measured) / n
+            mean_y = sum(y for _, y in measured) / n
+            covariance = sum((x - mean_x) * (y - mean_y) for x, y in measured)
+            spread = math.sqrt(sum((x - mean_x) ** 2 for x, _ in measured) * sum((y - mean_y) ** 2 for _, y in measured))
+            correlation = covariance / spread if spread > 0 else 0.0
+
+        if correlation is None:
+            interpretation = 'بيانات غير كافية'
+        elif correlation > 0.3:
+            interpretation = 'الأشهر الأكثر نشراً تحقق مشاهدات أعلى لكل فيديو'
+        elif correlation < -0.3:
+            interpretation = 'زيادة النشر ترتبط بمشاهدات أقل لكل فيديو'
+        else:
+            interpretation = 'لا علاقة واضحة بين وتيرة النشر والمشاهدات'
+
+        return {
+            'correlation': round(correlation, 3) if correlation is not None else None,
+            'interpretation': interpretation,
+            'periods': [
+                {
+                    'period': key,
+                    'uploads': uploads,
+                    # Geometric mean of views of videos old enough to compare
+                    'typical_views': round(math.expm1(log_views / mature)) if mature else None
+                }
+                for key, uploads, mature, log_views in active[-recent_periods:]
+            ]
+        }
+
+
+class CadenceAnalytics:
+    """Per-channel cadence analytics over the full stored upload history
+
+    Accumulators are cached per channel. A refresh streams only uploads
+    published after the newest one already counted, plus the pending ones
+    that became old enough for the views statistics; if older uploads
+    appeared since (the stored history grew backwards), the channel is
+    recomputed from scratch. Views are those stored when an upload reached
+    the minimum age. Channels refresh under their own locks.
+    """
+
+    def __init__(self, cache_ttl=600, hiatus_days=30):
+        self.cache_ttl = cache_ttl
+        self.hiatus_days = hiatus_days
+        self.lock = threading.Lock()
+        self.channel_locks = {}
+        self.cache = {}  # channel_id -> (checked_at, accumulator, summary, newest published_at counted)
+
+    def analyze(self, channel_id):
+        """Cadence summary of a channel's stored uploads, or None without history"""
+        if not channel_id:
+            return None
+
+        with self.lock:
+            channel_lock = self.channel_locks.setdefault(channel_id, threading.Lock())
+
+        with channel_lock:
+            with self.lock:
+                cached = self.cache.get(channel_id)
+            if cached and time.monotonic() - cached[0] < self.cache_ttl:
+                return cached[2]
+
+            try:
+                accumulator, watermark = self._refresh(channel_id, *(cached[1::2] if cached else (None, None)))
+                summary = accumulator.summary(int(time.time()))
+                with self.lock:
+                    self.cache[channel_id] = (time.monotonic(), accumulator, summary, watermark)
+                return summary
+
+            except Exception as e:
+                # A partly refreshed accumulator is not reusable
+                with self.lock:
+                    self.cache.pop(channel_id, None)
+                logging.error(f"Error analyzing upload cadence: {str(e)}")
+                return None
+
+    def invalidate(self, channel_id):
+        """Make the next analyze() look for new uploads"""
+        with self.lock:
+            cached = self.cache.get(channel_id)
+            if cached:
+                self.cache[channel_id] = (-math.inf, *cached[1:])
+
+    def _refresh(self, channel_id, accumulator, watermark):
+        """Accumulator extended with uploads after watermark, or rebuilt; and the new watermark"""
+        from models import VideoStatistics
+
+        stored = VideoStatistics.query.filter(VideoStatistics.channel_id == channel_id,
+                                              VideoStatistics.published_at.isnot(None))
+        query = stored.with_entities(VideoStatistics.published_at, VideoStatistics.view_count)
+
+        now = int(time.time())
+        if accumulator is not None:
+            newer = query.filter(VideoStatistics.published_at > watermark)
+            if accumulator.count + newer.count() != stored.count():
+                accumulator = None
+            else:
+                if accumulator.pending and now - accumulator.pending[0] >= accumulator.min_age_days * 86400:
+                    matured = query.filter(VideoStatistics.published_at >= datetime.utcfromtimestamp(accumulator.pending[0]),
+                                           VideoStatistics.published_at <= watermark)
+                    accumulator.promote(((_seconds(published_at), views) for published_at, views
+                                         in matured.order_by(VideoStatistics.published_at).yield_per(5000)), now)
+                query = newer
+
+        if accumulator is None:
+            accumulator = CadenceAccumulator(hiatus_days=self.hiatus_days)
+
+        for published_at, views in query.order_by(VideoStatistics.published_at).yield_per(5000):
+            accumulator.add(_seconds(published_at), views, now)
+            watermark = published_at
+        return accumulator, watermark
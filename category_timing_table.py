@@ -0,0 +1,150 @@
+import json
+import queue
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+
+
+class CategoryTimingTable:
+    """Timing recommendations per (category, target audience), computed ahead of requests
+
+    Entries live in the CategoryTiming table and are memoized per process,
+    so serving one is a dict lookup. Missing and stale entries are queued
+    for a single background worker, which calls compute(category,
+    target_audience) and stores the result; the worker also sweeps the
+    table for stale rows on a schedule. Requests never wait for compute.
+    """
+
+    def __init__(self, compute, refresh_interval=86400, sweep_interval=600, retry_delay=300):
+        self.compute = compute
+        self.refresh_interval = timedelta(seconds=refresh_interval)
+        self.sweep_interval = sweep_interval
+        self.retry_delay = retry_delay
+        self.lock = threading.Lock()
+        self.entries = {}  # key -> (refreshed_date, recommendations)
+        self.pending = set()
+        self.retry_after = {}
+        self.queue = queue.Queue()
+        self.worker = None
+
+    def get(self, category, target_audience=''):
+        """Stored recommendations for the key, or None until they are computed"""
+        key = self._key(category, target_audience)
+        with self.lock:
+            entry = self.entries.get(key)
+
+        if entry is None:
+            entry = self._load(key)
+
+        if entry is None or self._is_stale(entry[0]):
+            self.schedule(key)
+        return entry[1] if entry else None
+
+    def schedule(self, key):
+        """Queue a key for background refresh, unless already queued or recently failed"""
+        with self.lock:
+            if key in self.pending or self.retry_after.get(key, 0) > time.monotonic():
+                return
+            self.pending.add(key)
+            if self.worker is None or not self.worker.is_alive():
+                self.worker = threading.Thread(target=self._run, name='category-timing-refresh', daemon=True)
+                self.worker.start()
+        self.queue.put(key)
+
+    def warm(self, keys):
+        """Queue keys so their entries exist before the first request asks"""
+        for category, target_audience in keys:
+            self.schedule(self._key(category, target_audience))
+
+    @staticmethod
+    def _key(category, target_audience):
+        return (' '.join(category.split())[:100], ' '.join((target_audience or '').lower().split())[:200])
+
+    def _is_stale(self, refreshed_date):
+        return refreshed_date is None or datetime.utcnow() - refreshed_date > self.refresh_interval
+
+    def _load(self, key):
+        """Entry from the database, memoized; None when the key has no row"""
+        try:
+            from models import CategoryTiming
+
+            record = CategoryTiming.query.filter_by(category=key[0], target_audience=key[1]).first()
+            if record is None:
+                return None
+
+            entry = (record.refreshed_date, json.loads(record.recommendations))
+            with self.lock:
+                self.entries[key] = entry
+            return entry
+
+        except Exception as e:
+            logging.error(f"Error loading category timing: {str(e)}")
+            return None
+
+    def _run(self):
+        from app import app
+
+        while True:
+            try:
+                key = self.queue.get(timeout=self.sweep_interval)
+            except queue.Empty:
+                with app.app_context():
+                    self._sweep()
+                continue
+
+            try:
+                with app.app_context():
+                    self._refresh(key)
+            finally:
+                with self.lock:
+                    self.pending.discard(key)
+
+    def _refresh(self, key):
+        """Compute and store one entry, unless another process just did"""
+        try:
+            entry = self._load(key)
+            if entry is not None and not self._is_stale(entry[0]):
+                return
+
+            recommendations = self.compute(*key)
+            if not recommendations:
+                with self.lock:
+                    self.retry_after[key] = time.monotonic() + self.retry_delay
+                return
+
+            from app import db
+            from models import CategoryTiming
+
+            record = CategoryTiming.query.filter_by(category=key[0], target_audience=key[1]).first()
+            if record is None:
+                record = CategoryTiming(category=key[0], target_audience=key[1])
+                db.session.add(record)
+            record.recommendations = json.dumps(recommendations, ensure_ascii=False)
+            record.refreshed_date = datetime.utcnow()
+            db.session.commit()
+
+            with self.lock:
+                self.entries[key] = (record.refreshed_date, recommendations)
+                self.retry_after.pop(key, None)
+
+        except Exception as e:
+            from app import db
+            db.session.rollback()
+            logging.error(f"Error refreshing category timing: {str(e)}")
+
+    def _sweep(self):
+        """Queue every stored entry that has gone stale"""
+        try:
+            from models import CategoryTiming
+
+            cutoff = datetime.utcnow() - self.refresh_interval
+            rows = (CategoryTiming.query
+                    .with_entities(CategoryTiming.category, CategoryTiming.target_audience)
+                    .filter(CategoryTiming.refreshed_date < cutoff)
+                    .all())
+            for category, target_audience in rows:
+                self.schedule((category, target_audience))
+
+        except Exception as e:
+            logging.error(f"Error sweeping category timing: {str(e)}")
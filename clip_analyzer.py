@@ -6,12 +6,310 @@ import io
 import base64
 import numpy as np
 from datetime import datetime
+from functools import cached_property, lru_cache
+from concurrent.futures import ThreadPoolExecutor
 import json
+from process_pool import ImageProcessPool
+from thumbnail_similarity import thumbnail_vector
+
+def _sums_and_squares(flat, square_dtype, chunk_values=1 << 20):
+    """Exact sums of the values along the last axis and of their squares
+    
+    The squares are widened in slices of about chunk_values values, so
+    the temporary copy stays small for large images.
+    """
+    totals = np.zeros(flat.shape[:-1], dtype=np.uint64)
+    squares = np.zeros(flat.shape[:-1], dtype=np.uint64)
+    step = max(1, chunk_values // flat[..., 0].size)
+    for start in range(0, flat.shape[-1], step):
+        part = flat[..., start:start + step]
+        totals += part.sum(axis=-1, dtype=np.uint64)
+        squares += np.square(part, dtype=square_dtype).sum(axis=-1, dtype=np.uint64)
+    return totals, squares
+
+
+def _pixel_moments(rgb):
+    """Value mean, value standard deviation and intensity variance of (..., H, W, 3) images
+    
+    The first two pool all RGB channel values; intensity is the unweighted
+    mean of a pixel's channels. All three come from exact integer sums.
+    """
+    # Guards the divisions below against zero-sized images
+    pixel_count = max(rgb.shape[-3] * rgb.shape[-2], 1)
+    
+    channel_sum = np.add(rgb[..., 0], rgb[..., 1], dtype=np.uint16)
+    channel_sum += rgb[..., 2]
+    totals, sum_squares = _sums_and_squares(channel_sum.reshape(*rgb.shape[:-3], -1), np.uint32)
+    _, value_squares = _sums_and_squares(rgb.reshape(*rgb.shape[:-3], -1), np.uint16)
+    
+    mean = totals / (3 * pixel_count)
+    std = np.sqrt(np.maximum(value_squares / (3 * pixel_count) - mean ** 2, 0))
+    intensity_variance = np.maximum(sum_squares / pixel_count - (3 * mean) ** 2, 0) / 9
+    return mean, std, intensity_variance
+
+
+def _saturation_table():
+    """HSV saturation of each (max channel, max - min) pair, indexed by max << 8 | spread"""
+    max_c = np.arange(256, dtype=np.float32)[:, None]
+    spread = np.arange(256, dtype=np.float32)[None, :]
+    ratio = spread / np.maximum(max_c, 1)
+    # Pairs with spread > max cannot occur
+    return np.trunc(np.minimum(ratio, 1).astype(np.float64) * 255.0).astype(np.uint8)
+
+
+_SATURATION = _saturation_table()
+
+
+@lru_cache(maxsize=8)
+def _merge_offsets(levels, bin_width, merge_distance):
+    """Offsets of the color bins whose centers lie within merge_distance, as an (M, 3) array"""
+    radius = min(levels - 1, int(merge_distance // bin_width))
+    steps = np.arange(-radius, radius + 1)
+    offsets = np.stack(np.meshgrid(steps, steps, steps, indexing='ij'), axis=-1).reshape(-1, 3)
+    distance = bin_width * np.sqrt((offsets ** 2).sum(axis=1))
+    return offsets[distance <= merge_distance]
+
+
+class ImageFeatures:
+    """Per-image feature planes shared by all visual metrics
+    
+    Every plane is derived from the decoded image once, on first access,
+    and reused by each metric that needs it. Arrays are read-only views
+    so that no metric can disturb another's input.
+    """
+    
+    # Queries covering the image at least this many times over are answered
+    # from summed-area tables instead of by summing each region's pixels
+    table_min_coverage = 5
+    
+    def __init__(self, image):
+        if image.mode != 'RGB':
+            image = image.convert('RGB')
+        self.image = image
+        self.width, self.height = image.size
+        # Dimensions before any reduced-resolution decode
+        self.source_size = image.info.get('source_size', image.size)
+        self.source_width, self.source_height = self.source_size
+        # Resolution pyramid, extended by scaled() as smaller levels are needed
+        self._pyramid = [image]
+    
+    @property
+    def pixel_count(self):
+        return self.width * self.height
+    
+    def scaled(self, min_size):
+        """Smallest pyramid level that still covers min_size (width, height)
+        
+        Each level is a 2x area-averaging reduction of the one above it, so
+        metrics that work at different small sizes resample from a nearby
+        level instead of from the full-resolution image.
+        """
+        min_width, min_height = min_size
+        levels = self._pyramid
+        index = 0
+        while True:
+            width, height = levels[index].size
+            if (width + 1) // 2 < min_width or (height + 1) // 2 < min_height:
+                return levels[index]
+            if index + 1 == len(levels):
+                levels.append(levels[index].reduce(2))
+            index += 1
+    
+    @cached_property
+    def rgb(self):
+        """RGB pixels as an (H, W, 3) uint8 array"""
+        return self._readonly(np.asarray(self.image))
+    
+    @cached_property
+    def gray(self):
+        """Luma plane as produced by PIL's 'L' conversion"""
+        return self._readonly(np.asarray(self.image.convert('L')))
+    
+    @cached_property
+    def intensity(self):
+        """Unweighted mean of the RGB channels as float32"""
+        return self._readonly(self.rgb.mean(axis=2, dtype=np.float32))
+    
+    @cached_property
+    def hsv(self):
+        """HSV pixels as an (H, W, 3) uint8 array"""
+        return self._readonly(np.asarray(self.image.convert('HSV')))
+    
+    @property
+    def saturation(self):
+        return self.hsv[:, :, 1]
+    
+    @property
+    def value(self):
+        return self.hsv[:, :, 2]
+    
+    def region_stats(self, top, bottom, left, right, plane='rgb'):
+        """Mean, variance and sample count of plane[top:bottom, left:right]
+        
+        Bounds follow NumPy slice semantics. The 'rgb' plane pools all three
+        channel values of each pixel; 'gray' is the luma plane.
+        """
+        top, bottom, _ = slice(top, bottom).indices(self.height)
+        left, right, _ = slice(left, right).indices(self.width)
+        bounds = [np.array([value]) for value in (top, max(bottom, top), left, max(right, left))]
+        
+        mean, variance, count = self._box_stats(*bounds, plane, variance=True)
+        return float(mean[0]), float(variance[0]), int(count[0])
+    
+    def grid_stats(self, rows, cols, plane='rgb', variance=False):
+        """Per-cell means, variances (or None) and counts of a rows x cols grid
+        
+        Cell edges are at i * height // rows and j * width // cols.
+        """
+        row_edges = np.arange(rows + 1) * self.height // rows
+        col_edges = np.arange(cols + 1) * self.width // cols
+        top, left = np.meshgrid(row_edges[:-1], col_edges[:-1], indexing='ij')
+        bottom, right = np.meshgrid(row_edges[1:], col_edges[1:], indexing='ij')
+        return self._box_stats(top, bottom, left, right, plane, variance)
+    
+    def window_stats(self, size, stride, plane='rgb', variance=False):
+        """Means, variances (or None) and counts of square sliding windows
+        
+        Windows are size x size pixels with top-left corners every stride
+        pixels, as a (rows, cols) grid of positions.
+        """
+        size = min(size, self.height, self.width)
+        top, left = np.meshgrid(np.arange(0, self.height - size + 1, stride),
+                                np.arange(0, self.width - size + 1, stride), indexing='ij')
+        return self._box_stats(top, top + size, left, left + size, plane, variance)
+    
+    def _box_stats(self, top, bottom, left, right, plane, variance, use_tables=None):
+        """Region statistics from exact integer sums
+        
+        Sums come from the summed-area tables (O(1) per region) or from the
+        pixels directly. Both give the same integers, so the path taken never
+        changes a result.
+        """
+        channels = 3 if plane == 'rgb' else 1
+        area = (bottom - top) * (right - left)
+        count = area * channels
+        
+        if use_tables is None:
+            use_tables = (self._has_tables(plane, variance) or
+                          area.sum() >= self.table_min_coverage * self.pixel_count)
+        
+        if use_tables:
+            def box_sum(table):
+                return table[bottom, right] - table[top, right] - table[bottom, left] + table[top, left]
+            
+            totals = box_sum(getattr(self, f'_{plane}_sum_table'))
+            squares = box_sum(getattr(self, f'_{plane}_square_table')) if variance else None
+        else:
+            pixels = self.rgb if plane == 'rgb' else self.gray
+            regions = [pixels[t:b, l:r] for t, b, l, r in zip(top.flat, bottom.flat, left.flat, right.flat)]
+            totals = np.array([region.sum(dtype=np.int64) for region in regions]).reshape(top.shape)
+            squares = None
+            if variance:
+                squares = np.array([np.square(region, dtype=np.int64).sum() for region in regions]).reshape(top.shape)
+        
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = totals / count
+            spread = np.maximum(squares / count - mean ** 2, 0) if variance else None
+        return mean, spread, count
+    
+    def _has_tables(self, plane, variance):
+        built = self.__dict__
+        return f'_{plane}_sum_table' in built and (not variance or f'_{plane}_square_table' in built)
+    
+    # Summed-area tables: table[y, x] is the sum over plane[:y, :x], built on
+    # first use. Building one costs a few passes over the image, which only
+    # pays off once queries overlap, e.g. sliding windows.
+    @cached_property
+    def _rgb_sum_table(self):
+        rgb = self.rgb
+        channel_sum = np.add(rgb[..., 0], rgb[..., 1], dtype=np.int32)
+        channel_sum += rgb[..., 2]
+        return self._integral(channel_sum)
+    
+    @cached_property
+    def _rgb_square_table(self):
+        rgb = self.rgb
+        channel_squares = np.square(rgb[..., 0], dtype=np.int32)
+        for c in (1, 2):
+            channel_squares += np.square(rgb[..., c], dtype=np.int32)
+        return self._integral(channel_squares)
+    
+    @cached_property
+    def _gray_sum_table(self):
+        return self._integral(self.gray)
+    
+    @cached_property
+    def _gray_square_table(self):
+        return self._integral(np.square(self.gray, dtype=np.int32))
+    
+    @staticmethod
+    def _integral(plane):
+        """Zero-padded summed-area table of a 2D plane"""
+        table = np.zeros((plane.shape[0] + 1, plane.shape[1] + 1), dtype=np.int64)
+        np.cumsum(plane, axis=1, dtype=np.int64, out=table[1:, 1:])
+        # Accumulating down the rows one vector add at a time is several times
+        # faster than np.cumsum(axis=0), which walks the image column-wise
+        for y in range(2, table.shape[0]):
+            np.add(table[y], table[y - 1], out=table[y])
+        return table
+    
+    @staticmethod
+    def _readonly(array):
+        if array.flags.writeable:
+            array.flags.writeable = False
+        return array
+
+class ImageBatch:
+    """Feature planes for a stack of same-sized images
+    
+    Mirrors ImageFeatures with a leading batch axis. The luma and HSV
+    planes are computed in NumPy with the same integer arithmetic PIL
+    uses, so per-image metrics match the single-image path.
+    """
+    
+    def __init__(self, images):
+        self.images = [image if image.mode == 'RGB' else image.convert('RGB') for image in images]
+        self.width, self.height = self.images[0].size
+        self.source_size = None
+    
+    def __len__(self):
+        return len(self.images)
+    
+    @property
+    def pixel_count(self):
+        return self.width * self.height
+    
+    @cached_property
+    def rgb(self):
+        """RGB pixels as an (N, H, W, 3) uint8 tensor"""
+        return np.stack([np.asarray(image) for image in self.images])
+    
+    @cached_property
+    def gray(self):
+        """Luma planes from PIL's 'L' conversion"""
+        return np.stack([np.asarray(image.convert('L')) for image in self.images])
+    
+    @cached_property
+    def value(self):
+        """HSV value planes (max channel)"""
+        rgb = self.rgb
+        return np.maximum(np.maximum(rgb[..., 0], rgb[..., 1]), rgb[..., 2])
+    
+    @cached_property
+    def saturation(self):
+        """HSV saturation planes, bit-exact with PIL's 'HSV' conversion"""
+        rgb = self.rgb
+        max_c = self.value
+        codes = max_c.astype(np.uint16)
+        codes <<= 8
+        codes |= max_c - np.minimum(np.minimum(rgb[..., 0], rgb[..., 1]), rgb[..., 2])
+        # Saturation depends only on the (max, max - min) pair, so it is looked up
+        return np.take(_SATURATION.reshape(-1), codes)
 
 class CLIPVisualAnalyzer:
     """CLIP-inspired visual analysis for YouTube channel images and thumbnails"""
     
-    def __init__(self):
+    def __init__(self, process_workers=None, hash_index=None, similarity_index=None):
         self.openai_key = os.environ.get('OPENAI_API_KEY')
         self.huggingface_token = os.environ.get('HUGGINGFACE_TOKEN')
         self.demo_mode = not self.openai_key or 'insufficient_quota' in str(getattr(self, 'last_error', ''))
@@ -24,53 +322,72 @@ class CLIPVisualAnalyzer:
             'color_vibrancy': {'min': 0.4, 'max': 0.9, 'weight': 0.25},
             'composition': {'min': 0.5, 'max': 1.0, 'weight': 0.25}
         }
+        
+        # Dominant color extraction: histogram bin resolution, the RGB
+        # distance within which bins merge into the more populated one, and
+        # optional k-means refinement passes over the binned palette
+        self.palette_config = {
+            'bits_per_channel': 5,
+            'merge_distance': 32,
+            'kmeans_iterations': 0
+        }
+        
+        # Channel-wide thumbnail scoring: download pool size and the number
+        # of same-sized images stacked into one tensor
+        self.batch_config = {
+            'max_workers': 8,
+            'chunk_size': 16
+        }
+        
+        # Minimum decode size per metric family. JPEGs are decoded straight
+        # to the smallest DCT scale (1/2, 1/4, 1/8) that still covers it;
+        # None decodes at full resolution.
+        self.decode_targets = {
+            'quality': (640, 360),
+            'thumbnail': (480, 270),
+            'channel_art': (1280, 720)
+        }
+        
+        # Working size of the metrics that analyze a downscaled copy.
+        # mobile_readability resamples from the nearest ImageFeatures pyramid
+        # level; dominant_colors point-samples a grid of this size instead
+        self.metric_scales = {
+            'mobile_readability': (120, 90),  # Typical mobile thumbnail size
+            'dominant_colors': (150, 150)
+        }
+        
+        # Per-image ingestion caps: downloads are streamed and abandoned past
+        # max_bytes, and images that would decode to more than max_pixels
+        # (after any reduced-resolution decode) are rejected before decoding
+        self.ingest_limits = {
+            'max_bytes': int(os.environ.get('IMAGE_MAX_BYTES', str(10 * 1024 * 1024))),
+            'max_pixels': int(os.environ.get('IMAGE_MAX_PIXELS', str(16 * 1024 * 1024))),
+            'max_uploads': 10,
+            'chunk_size': 64 * 1024
+        }
+        
+        # Optional process pool for the CPU-bound metrics; 0 analyzes in-process
+        if process_workers is None:
+            process_workers = int(os.environ.get('IMAGE_ANALYSIS_WORKERS', '0'))
+        self.process_pool = ImageProcessPool(process_workers) if process_workers > 0 else None
+        
+        # Optional PerceptualHashIndex; repeat analyses of the same art are
+        # served from it instead of re-running the metrics
+        self.hash_index = hash_index
+        
+        # Optional ThumbnailSimilarityIndex; channel thumbnail scoring adds
+        # each scored thumbnail to it for find_similar_thumbnails()
+        self.similarity_index = similarity_index
     
     def analyze_image_quality(self, image_url):
         """Comprehensive image quality analysis"""
         try:
             # Download and process image
-            response = requests.get(image_url, timeout=10)
-            if response.status_code != 200:
+            image = self._load_image(image_url, target_size=self.decode_targets['quality'])
+            if image is None:
                 return self._get_fallback_analysis()
             
-            image = Image.open(io.BytesIO(response.content))
-            if image.mode != 'RGB':
-                image = image.convert('RGB')
-            
-            # Technical quality analysis
-            technical_analysis = self._analyze_technical_quality(image)
-            
-            # Visual appeal analysis
-            visual_analysis = self._analyze_visual_appeal(image)
-            
-            # Composition analysis
-            composition_analysis = self._analyze_composition(image)
-            
-            # Color scheme analysis
-            color_analysis = self._analyze_color_scheme(image)
-            
-            # Calculate overall score
-            overall_score = self._calculate_overall_score({
-                **technical_analysis,
-                **visual_analysis,
-                **composition_analysis,
-                **color_analysis
-            })
-            
-            return {
-                'overall_score': round(overall_score, 2),
-                'technical_quality': technical_analysis,
-                'visual_appeal': visual_analysis,
-                'composition': composition_analysis,
-                'color_scheme': color_analysis,
-                'recommendations': self._generate_recommendations(overall_score, {
-                    **technical_analysis,
-                    **visual_analysis,
-                    **composition_analysis,
-                    **color_analysis
-                }),
-                'analysis_date': datetime.utcnow().isoformat()
-            }
+            return self._run_cached('quality', image_url, '_analyze_quality', ImageFeatures(image))
             
         except Exception as e:
             logging.error(f"Error analyzing image quality: {str(e)}")
@@ -79,24 +396,30 @@ class CLIPVisualAnalyzer:
     def analyze_thumbnail(self, thumbnail_url, video_title=""):
         """Analyze thumbnail specifically for YouTube optimization"""
         try:
-            # Base image analysis
-            base_analysis = self.analyze_image_quality(thumbnail_url)
-            
-            # Download image for thumbnail-specific analysis
-            response = requests.get(thumbnail_url, timeout=10)
-            if response.status_code != 200:
+            image = self._load_image(thumbnail_url, target_size=self.decode_targets['thumbnail'])
+            if image is None:
                 return self._get_fallback_thumbnail_analysis()
             
-            image = Image.open(io.BytesIO(response.content))
-            if image.mode != 'RGB':
-                image = image.convert('RGB')
+            # Click appeal does not depend on the title, so any thumbnail result can be reused
+            return self._run_cached('thumbnail', thumbnail_url, '_analyze_thumbnail_features',
+                                    ImageFeatures(image), video_title)
+            
+        except Exception as e:
+            logging.error(f"Error analyzing thumbnail: {str(e)}")
+            return self._get_fallback_thumbnail_analysis()
+    
+    def _analyze_thumbnail_features(self, features, video_title=""):
+        """Thumbnail analysis over precomputed image features"""
+        try:
+            # Base image analysis
+            base_analysis = self._analyze_quality_safe(features)
             
             # Thumbnail-specific analysis
             thumbnail_specific = {
-                'click_appeal': self._analyze_click_appeal(image, video_title),
-                'text_overlay': self._analyze_text_overlay(image),
-                'thumbnail_style': self._analyze_thumbnail_style(image),
-                'mobile_readability': self._analyze_mobile_readability(image)
+                'click_appeal': self._analyze_click_appeal(features, video_title),
+                'text_overlay': self._analyze_text_overlay(features),
+                'thumbnail_style': self._analyze_thumbnail_style(features),
+                'mobile_readability': self._analyze_mobile_readability(features)
             }
             
             # Combine analyses
@@ -117,24 +440,33 @@ class CLIPVisualAnalyzer:
     def analyze_channel_art(self, banner_url, channel_info=None):
         """Analyze channel banner/art for branding effectiveness"""
         try:
-            # Base image analysis
-            base_analysis = self.analyze_image_quality(banner_url)
-            
-            # Download image for channel-specific analysis
-            response = requests.get(banner_url, timeout=10)
-            if response.status_code != 200:
+            image = self._load_image(banner_url, target_size=self.decode_targets['channel_art'])
+            if image is None:
                 return self._get_fallback_channel_art_analysis()
             
-            image = Image.open(io.BytesIO(response.content))
-            if image.mode != 'RGB':
-                image = image.convert('RGB')
+            # Brand presence depends on these channel fields, so they are part of the key
+            channel_info = channel_info or {}
+            kind = 'channel_art:{:d}{:d}'.format(bool(channel_info.get('customUrl')),
+                                                 len(channel_info.get('description') or '') > 100)
+            return self._run_cached(kind, banner_url, '_analyze_channel_art_features',
+                                    ImageFeatures(image), channel_info)
+            
+        except Exception as e:
+            logging.error(f"Error analyzing channel art: {str(e)}")
+            return self._get_fallback_channel_art_analysis()
+    
+    def _analyze_channel_art_features(self, features, channel_info=None):
+        """Channel art analysis over precomputed image features"""
+        try:
+            # Base image analysis
+            base_analysis = self._analyze_quality_safe(features)
             
             # Channel art specific analysis
             channel_specific = {
-                'brand_presence': self._analyze_brand_presence(image, channel_info),
-                'text_readability': self._analyze_banner_text(image),
-                'visual_hierarchy': self._analyze_visual_hierarchy(image),
-                'platform_compatibility': self._analyze_banner_compatibility(image)
+                'brand_presence': {'score': self._analyze_brand_presence(features, channel_info)},
+                'text_readability': {'score': self._analyze_banner_text(features)},
+                'visual_hierarchy': {'score': self._analyze_visual_hierarchy(features)},
+                'platform_compatibility': {'score': self._analyze_banner_compatibility(features)}
             }
             
             # Calculate branding effectiveness score
@@ -156,23 +488,503 @@ class CLIPVisualAnalyzer:
             logging.error(f"Error analyzing channel art: {str(e)}")
             return self._get_fallback_channel_art_analysis()
     
-    def _analyze_technical_quality(self, image):
+    def analyze_thumbnails_batch(self, videos):
+        """Score all of a channel's thumbnails with the local visual metrics
+        
+        Thumbnails are downloaded concurrently, same-sized images are stacked
+        into one tensor and scored together, and the per-video
+        youtube_optimized_score values are aggregated into a channel score.
+        """
+        try:
+            videos = [video for video in videos if video.get('thumbnail_url')]
+            images = self._load_images([video['thumbnail_url'] for video in videos])
+            scores = self._score_images(images)
+            
+            breakdown = []
+            for index, video in enumerate(videos):
+                entry = {
+                    'video_id': video.get('id', ''),
+                    'title': video.get('title', ''),
+                    'thumbnail_url': video['thumbnail_url']
+                }
+                if index in scores:
+                    entry.update(scores[index])
+                else:
+                    entry['error'] = 'تعذر تحميل الصورة المصغرة'
+                breakdown.append(entry)
+            
+            if self.similarity_index is not None:
+                self._index_thumbnails(images, videos, breakdown)
+            
+            return self._aggregate_thumbnail_scores(breakdown)
+            
+        except Exception as e:
+            logging.error(f"Error in batch thumbnail analysis: {str(e)}")
+            return self._aggregate_thumbnail_scores([])
+    
+    def compare_thumbnails(self, uploads):
+        """Score uploaded thumbnail variants and rank them by youtube_optimized_score
+        
+        uploads is a list of (filename, data) pairs, where data is the
+        encoded image as bytes or an in-memory file object.
+        """
+        try:
+            uploads = uploads[:self.ingest_limits['max_uploads']]
+            
+            def decode(upload):
+                filename, data = upload
+                try:
+                    if len(data.getbuffer() if hasattr(data, 'getbuffer') else data) > self.ingest_limits['max_bytes']:
+                        logging.warning(f"Skipping upload {filename}: exceeds the byte limit")
+                        return None
+                    return self._decode_image(data, self.decode_targets['thumbnail'])
+                except Exception as e:
+                    logging.error(f"Error decoding upload {filename}: {str(e)}")
+                    return None
+            
+            # PIL releases the GIL while decoding
+            workers = max(1, min(self.batch_config['max_workers'], len(uploads)))
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                images = list(pool.map(decode, uploads))
+            scores = self._score_images(images)
+            
+            variants, failed = [], []
+            for index, (filename, _) in enumerate(uploads):
+                entry = {'filename': filename}
+                if index in scores:
+                    entry.update(scores[index])
+                    variants.append(entry)
+                else:
+                    entry['error'] = 'تعذر قراءة الصورة'
+                    failed.append(entry)
+            
+            variants.sort(key=lambda entry: entry['youtube_optimized_score'], reverse=True)
+            for rank, entry in enumerate(variants, 1):
+                entry['rank'] = rank
+                entry['score_gap'] = round(variants[0]['youtube_optimized_score'] - entry['youtube_optimized_score'], 2)
+            
+            return {
+                'variants': variants + failed,
+                'best_variant': variants[0]['filename'] if variants else None,
+                'compared_count': len(variants),
+                'failed_count': len(failed)
+            }
+            
+        except Exception as e:
+            logging.error(f"Error comparing thumbnails: {str(e)}")
+            return {'variants': [], 'best_variant': None, 'compared_count': 0, 'failed_count': len(uploads)}
+    
+    def _score_images(self, images):
+        """youtube_optimized_score breakdown per loaded image, keyed by list index
+        
+        Images are grouped by size so each group stacks into a single tensor;
+        the chunks are scored on the process pool when one is configured.
+        """
+        groups = {}
+        for index, image in enumerate(images):
+            if image is not None:
+                groups.setdefault(image.size, []).append(index)
+        
+        chunk_size = self.batch_config['chunk_size']
+        chunks = [indices[start:start + chunk_size]
+                  for indices in groups.values()
+                  for start in range(0, len(indices), chunk_size)]
+        batches = [ImageBatch([images[i] for i in chunk]) for chunk in chunks]
+        
+        scores = {}
+        for chunk, batch_scores in zip(chunks, self._run_metrics_many('_score_thumbnail_batch', batches)):
+            scores.update(zip(chunk, batch_scores))
+        return scores
+    
+    def find_similar_thumbnails(self, thumbnail_url, k=10, min_score=None):
+        """Indexed thumbnails that look most like the given one, best first"""
+        try:
+            if self.similarity_index is None:
+                return {'matches': [], 'indexed_count': 0, 'error': 'فهرس التشابه غير مفعل'}
+            
+            image = self._load_image(thumbnail_url, target_size=self.decode_targets['thumbnail'])
+            if image is None:
+                return {'matches': [], 'indexed_count': len(self.similarity_index),
+                        'error': 'تعذر تحميل الصورة المصغرة'}
+            
+            matches = self.similarity_index.search(thumbnail_vector(ImageFeatures(image)), k=k,
+                                                   min_score=min_score, exclude_url=thumbnail_url)
+            return {'matches': matches, 'indexed_count': len(self.similarity_index)}
+            
+        except Exception as e:
+            logging.error(f"Error finding similar thumbnails: {str(e)}")
+            return {'matches': [], 'indexed_count': 0, 'error': 'خطأ في البحث عن صور مشابهة'}
+    
+    def _index_thumbnails(self, images, videos, breakdown):
+        """Add the descriptors of successfully scored thumbnails to the similarity index"""
+        try:
+            vectors, metadata = [], []
+            for image, video, entry in zip(images, videos, breakdown):
+                if image is None or 'error' in entry:
+                    continue
+                vectors.append(thumbnail_vector(ImageFeatures(image)))
+                metadata.append({
+                    'video_id': entry['video_id'],
+                    'title': entry['title'],
+                    'thumbnail_url': entry['thumbnail_url'],
+                    'view_count': int(video.get('view_count', 0) or 0),
+                    'youtube_optimized_score': entry['youtube_optimized_score']
+                })
+            
+            self.similarity_index.add_many(vectors, metadata)
+            
+        except Exception as e:
+            logging.error(f"Error indexing thumbnails: {str(e)}")
+    
+    def _run_cached(self, kind, image_url, method_name, features, *args):
+        """Run a metric suite unless a perceptually identical image was already analyzed"""
+        if self.hash_index is None:
+            return self._run_metrics(method_name, features, *args)
+        
+        hashes = self.hash_index.compute_hashes(features.gray, features.rgb)
+        cached = self.hash_index.lookup(kind, hashes)
+        if cached is not None:
+            return cached
+        
+        result = self._run_metrics(method_name, features, *args)
+        # Fallback results carry a note and say nothing about this image
+        if 'note' not in result:
+            self.hash_index.add(kind, hashes, result, image_url)
+        return result
+    
+    def _run_metrics(self, method_name, context, *args):
+        """Run one metric suite on the process pool when enabled, else in-process"""
+        return self._run_metrics_many(method_name, [context], *args)[0]
+    
+    def _run_metrics_many(self, method_name, contexts, *args):
+        """Run a metric suite over several image contexts
+        
+        With a process pool, all contexts are submitted before any result
+        is awaited so they spread across workers. Any context the pool
+        cannot handle is analyzed in-process instead.
+        """
+        if self.process_pool is None:
+            return [getattr(self, method_name)(context, *args) for context in contexts]
+        
+        futures = [self.process_pool.submit(method_name, context.rgb, args, source_size=context.source_size)
+                   for context in contexts]
+        
+        results = []
+        for context, future in zip(contexts, futures):
+            result = self.process_pool.result(future) if future is not None else None
+            if result is None:
+                result = getattr(self, method_name)(context, *args)
+            results.append(result)
+        return results
+    
+    def _load_images(self, image_urls):
+        """Download and decode images concurrently with a bounded pool"""
+        if not image_urls:
+            return []
+        
+        workers = min(self.batch_config['max_workers'], len(image_urls))
+        session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=workers)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        
+        def load(url):
+            try:
+                # Decoding happens here too; PIL releases the GIL while decoding
+                return self._load_image(url, session=session, target_size=self.decode_targets['thumbnail'])
+            except Exception as e:
+                logging.error(f"Error loading image {url}: {str(e)}")
+                return None
+        
+        try:
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                return list(pool.map(load, image_urls))
+        finally:
+            session.close()
+    
+    def _score_thumbnail_batch(self, batch):
+        """Vectorized thumbnail scores for a stack of same-sized images"""
+        technical = self._batch_technical_quality(batch)
+        visual = self._batch_visual_appeal(batch)
+        composition = self._batch_composition(batch)
+        click_appeal = self._batch_click_appeal(batch)
+        
+        overall = np.round(self._calculate_overall_score({**technical, **visual, **composition}), 2)
+        combined = np.round(overall * 0.6 + click_appeal['score'] * 0.4, 2)
+        
+        return [
+            {
+                'youtube_optimized_score': float(combined[i]),
+                'overall_score': float(overall[i]),
+                'click_appeal': {key: float(values[i]) for key, values in click_appeal.items()},
+                'brightness': float(technical['brightness']['score'][i]),
+                'contrast': float(technical['contrast']['score'][i]),
+                'color_vibrancy': float(visual['color_vibrancy']['score'][i]),
+                'dominant_colors': visual['dominant_colors'][i]
+            }
+            for i in range(len(batch))
+        ]
+    
+    def _batch_technical_quality(self, batch):
+        """Brightness, contrast and sharpness for each image in the batch"""
+        brightness, contrast, intensity_variance = _pixel_moments(batch.rgb)
+        sharpness = intensity_variance / 10000
+        
+        return {
+            'brightness': {'score': self._score_metric_array(brightness, self.quality_metrics['brightness'])},
+            'contrast': {'score': self._score_metric_array(contrast, self.quality_metrics['contrast'])},
+            'sharpness': {'score': self._score_metric_array(sharpness, self.quality_metrics['sharpness'])}
+        }
+    
+    def _batch_visual_appeal(self, batch):
+        """Vibrancy, balance and color harmony for each image in the batch"""
+        saturation = batch.saturation.mean(axis=(1, 2)) / 255.0
+        
+        # Quadrant brightness spread (see _analyze_visual_balance)
+        rgb = batch.rgb
+        half_h, half_w = batch.height // 2, batch.width // 2
+        if half_h and half_w:
+            quadrants = np.stack([
+                rgb[:, :half_h, :half_w].mean(axis=(1, 2, 3)),
+                rgb[:, :half_h, half_w:].mean(axis=(1, 2, 3)),
+                rgb[:, half_h:, :half_w].mean(axis=(1, 2, 3)),
+                rgb[:, half_h:, half_w:].mean(axis=(1, 2, 3))
+            ], axis=1)
+            balance = np.round(np.maximum(50, 90 - quadrants.var(axis=1) / 10), 2)
+        else:
+            # One pixel high or wide: the floor, as in _analyze_visual_balance
+            balance = np.full(len(batch), 50.0)
+        
+        # Harmony is scored for all palettes of the same size at once
+        palettes = self._extract_palettes(batch.rgb)
+        harmony = np.full(len(palettes), 60.0)
+        sizes = np.array([len(palette) for palette in palettes])
+        for size in np.unique(sizes[sizes >= 2]):
+            members = np.flatnonzero(sizes == size)
+            harmony[members] = self._color_harmony_scores(np.stack([palettes[i] for i in members]))
+        
+        return {
+            'color_vibrancy': {'score': self._score_metric_array(saturation, self.quality_metrics['color_vibrancy'])},
+            'visual_balance': {'score': balance},
+            'color_harmony': {'score': harmony},
+            'dominant_colors': [self._palette_hex(palette) for palette in palettes]
+        }
+    
+    def _batch_composition(self, batch):
+        """Rule of thirds and symmetry for each image in the batch"""
+        rgb = batch.rgb
+        height, width = batch.height, batch.width
+        
+        # Mean of a 20x20 window around each thirds intersection (see _get_area_brightness)
+        areas = []
+        for cx in (width // 3, 2 * width // 3):
+            for cy in (height // 3, 2 * height // 3):
+                x = max(0, min(cx - 10, width - 20))
+                y = max(0, min(cy - 10, height - 20))
+                areas.append(rgb[:, y:y + 20, x:x + 20].mean(axis=(1, 2, 3)))
+        rule_of_thirds = np.round(np.clip(np.stack(areas, axis=1).var(axis=1) / 5, 60, 85), 2)
+        
+        gray = batch.gray
+        if width >= 2:
+            left_half = gray[:, :, :width // 2]
+            right_half = gray[:, :, width // 2:][:, :, ::-1]
+            min_width = min(left_half.shape[2], right_half.shape[2])
+            symmetry_diff = np.abs(left_half[:, :, :min_width].astype(np.int16) -
+                                   right_half[:, :, :min_width]).mean(axis=(1, 2))
+            symmetry = np.round(np.maximum(50, 90 - symmetry_diff / 5), 2)
+        else:
+            # No halves to compare: the floor, as in _analyze_symmetry
+            symmetry = np.full(len(batch), 50.0)
+        
+        return {'overall_composition': {'score': np.round((rule_of_thirds + symmetry) / 2, 2)}}
+    
+    def _batch_click_appeal(self, batch):
+        """Complexity, high-contrast and vibrancy click appeal for each image"""
+        gray = batch.gray
+        pixel_count = batch.pixel_count
+        
+        # Visual complexity (see _analyze_visual_complexity)
+        edges = ((np.abs(np.diff(gray, axis=2)) > 30).sum(axis=(1, 2)) +
+                 (np.abs(np.diff(gray, axis=1)) > 30).sum(axis=(1, 2)))
+        edge_density = edges / pixel_count
+        complexity = np.select(
+            [edge_density < 0.05, edge_density <= 0.15],
+            [60 + edge_density * 500, np.full_like(edge_density, 85)],
+            85 - (edge_density - 0.15) * 200
+        )
+        complexity = np.round(np.clip(complexity, 50, 90), 2)
+        
+        # Share of very dark and very bright pixels (see _analyze_high_contrast)
+        contrast_ratio = ((gray < 64).sum(axis=(1, 2)) + (gray >= 192).sum(axis=(1, 2))) / pixel_count
+        high_contrast = np.round(np.select(
+            [contrast_ratio > 0.3, contrast_ratio > 0.2],
+            [np.full_like(contrast_ratio, 85), np.full_like(contrast_ratio, 75)],
+            60 + contrast_ratio * 50
+        ), 2)
+        
+        # Saturation x value vibrancy (see _analyze_color_vibrancy)
+        vibrancy = (batch.saturation * batch.value).mean(axis=(1, 2)) / (255 * 255)
+        vibrancy_score = np.round(np.select(
+            [vibrancy < 0.3, vibrancy <= 0.6],
+            [60 + vibrancy * 83, np.full_like(vibrancy, 85)],
+            85 - (vibrancy - 0.6) * 50
+        ), 2)
+        
+        score = np.round(complexity * 0.3 + high_contrast * 0.4 + vibrancy_score * 0.3, 2)
+        
+        return {
+            'score': score,
+            'visual_complexity': complexity,
+            'high_contrast': high_contrast,
+            'color_vibrancy': vibrancy_score
+        }
+    
+    def _aggregate_thumbnail_scores(self, breakdown):
+        """Channel-level thumbnail score from per-video results"""
+        scored = [entry for entry in breakdown if 'youtube_optimized_score' in entry]
+        if not scored:
+            return {
+                'channel_thumbnail_score': None,
+                'analyzed_count': 0,
+                'failed_count': len(breakdown),
+                'videos': breakdown
+            }
+        
+        scores = np.array([entry['youtube_optimized_score'] for entry in scored])
+        best = scored[int(scores.argmax())]
+        worst = scored[int(scores.argmin())]
+        
+        return {
+            'channel_thumbnail_score': round(float(scores.mean()), 2),
+            'median_score': round(float(np.median(scores)), 2),
+            'score_spread': round(float(scores.std()), 2),
+            'analyzed_count': len(scored),
+            'failed_count': len(breakdown) - len(scored),
+            'best_video': {'video_id': best['video_id'], 'score': best['youtube_optimized_score']},
+            'worst_video': {'video_id': worst['video_id'], 'score': worst['youtube_optimized_score']},
+            'metric_averages': {
+                key: round(float(np.mean([entry['click_appeal'][key] for entry in scored])), 2)
+                for key in ('score', 'visual_complexity', 'high_contrast', 'color_vibrancy')
+            },
+            'videos': breakdown
+        }
+    
+    def _load_image(self, image_url, session=None, target_size=None):
+        """Download and decode an image, or return None if unavailable or too large"""
+        data = self._download_image(image_url, session)
+        if data is None:
+            return None
+        
+        return self._decode_image(data, target_size)
+    
+    def _download_image(self, image_url, session=None):
+        """Stream an image body into memory, or return None past the byte cap"""
+        max_bytes = self.ingest_limits['max_bytes']
+        
+        with (session or requests).get(image_url, timeout=10, stream=True) as response:
+            if response.status_code != 200:
+                return None
+            
+            declared = response.headers.get('Content-Length', '')
+            if declared.isdigit() and int(declared) > max_bytes:
+                logging.warning(f"Skipping image {image_url}: {declared} bytes exceeds the {max_bytes} byte limit")
+                return None
+            
+            # Content-Length may be missing or wrong, so count what actually arrives
+            data = bytearray()
+            for chunk in response.iter_content(chunk_size=self.ingest_limits['chunk_size']):
+                data += chunk
+                if len(data) > max_bytes:
+                    logging.warning(f"Skipping image {image_url}: body exceeds the {max_bytes} byte limit")
+                    return None
+            
+            return data
+    
+    def _decode_image(self, data, target_size=None):
+        """Decode image bytes to RGB, at reduced resolution when target_size allows
+        
+        For JPEGs, Image.draft makes the decoder apply DCT scaling, so the
+        full-resolution pixels are never materialized. The original
+        dimensions are kept in image.info['source_size']. Returns None when
+        the decoded image would exceed ingest_limits['max_pixels'].
+        """
+        image = Image.open(data if hasattr(data, 'read') else io.BytesIO(data))
+        source_size = image.size
+        
+        if target_size and image.format == 'JPEG':
+            image.draft('RGB', target_size)
+        
+        # Only the header has been read so far; image.size is the decode size
+        if image.size[0] * image.size[1] > self.ingest_limits['max_pixels']:
+            logging.warning(f"Skipping image: {image.size[0]}x{image.size[1]} exceeds the "
+                            f"{self.ingest_limits['max_pixels']} pixel limit")
+            return None
+        
+        if image.mode != 'RGB':
+            image = image.convert('RGB')
+        else:
+            image.load()
+        
+        image.info['source_size'] = source_size
+        return image
+    
+    def _analyze_quality(self, features):
+        """Run the general quality metric suite over precomputed image features"""
+        # Technical quality analysis
+        technical_analysis = self._analyze_technical_quality(features)
+        
+        # Visual appeal analysis
+        visual_analysis = self._analyze_visual_appeal(features)
+        
+        # Composition analysis
+        composition_analysis = self._analyze_composition(features)
+        
+        # Color scheme analysis
+        color_analysis = self._analyze_color_scheme(features)
+        
+        metrics = {
+            **technical_analysis,
+            **visual_analysis,
+            **composition_analysis,
+            **color_analysis
+        }
+        
+        # Calculate overall score
+        overall_score = self._calculate_overall_score(metrics)
+        
+        return {
+            'overall_score': round(overall_score, 2),
+            'technical_quality': technical_analysis,
+            'visual_appeal': visual_analysis,
+            'composition': composition_analysis,
+            'color_scheme': color_analysis,
+            'recommendations': self._generate_recommendations(overall_score, metrics),
+            'analysis_date': datetime.utcnow().isoformat()
+        }
+    
+    def _analyze_quality_safe(self, features):
+        """Quality analysis that degrades to the fallback result on error"""
+        try:
+            return self._analyze_quality(features)
+        except Exception as e:
+            logging.error(f"Error analyzing image quality: {str(e)}")
+            return self._get_fallback_analysis()
+    
+    def _analyze_technical_quality(self, features):
         """Analyze technical aspects like brightness, contrast, sharpness"""
         try:
-            # Convert to numpy array for analysis
-            img_array = np.array(image)
+            # Mean and standard deviation of all pixel values, and the
+            # variance of pixel intensity
+            brightness, contrast, intensity_variance = _pixel_moments(features.rgb)
             
             # Brightness analysis
-            brightness = np.mean(img_array)
             brightness_score = self._score_metric(brightness, self.quality_metrics['brightness'])
             
             # Contrast analysis (standard deviation of pixel values)
-            contrast = np.std(img_array)
             contrast_score = self._score_metric(contrast, self.quality_metrics['contrast'])
             
             # Sharpness analysis (simplified edge detection)
-            gray = np.mean(img_array, axis=2)
-            sharpness = np.var(gray) / 10000  # Normalize
+            sharpness = intensity_variance / 10000  # Normalize
             sharpness_score = self._score_metric(sharpness, self.quality_metrics['sharpness'])
             
             return {
@@ -189,26 +1001,24 @@ class CLIPVisualAnalyzer:
                 'sharpness': {'value': 0.5, 'score': 72}
             }
     
-    def _analyze_visual_appeal(self, image):
+    def _analyze_visual_appeal(self, features):
         """Analyze visual appeal factors"""
         try:
             # Color vibrancy analysis
-            img_array = np.array(image)
-            hsv = np.array(image.convert('HSV'))
-            saturation = np.mean(hsv[:, :, 1]) / 255.0
+            saturation = np.mean(features.saturation) / 255.0
             vibrancy_score = self._score_metric(saturation, self.quality_metrics['color_vibrancy'])
             
             # Visual balance analysis
-            balance_score = self._analyze_visual_balance(image)
+            balance_score = self._analyze_visual_balance(features)
             
             # Color harmony analysis
-            dominant_colors = self._extract_dominant_colors(image)
-            harmony_score = self._calculate_color_harmony(dominant_colors)
+            palette = self._extract_palette(features)
+            harmony_score = self._calculate_color_harmony(palette)
             
             return {
                 'color_vibrancy': {'value': round(saturation, 3), 'score': vibrancy_score},
                 'visual_balance': {'score': balance_score},
-                'color_harmony': {'score': harmony_score, 'dominant_colors': dominant_colors}
+                'color_harmony': {'score': harmony_score, 'dominant_colors': self._palette_hex(palette)}
             }
             
         except Exception as e:
@@ -219,14 +1029,14 @@ class CLIPVisualAnalyzer:
                 'color_harmony': {'score': 78, 'dominant_colors': ['#FF5733', '#33FF57', '#3357FF']}
             }
     
-    def _analyze_composition(self, image):
+    def _analyze_composition(self, features):
         """Analyze composition quality"""
         try:
             # Rule of thirds analysis
-            rule_of_thirds_score = self._analyze_rule_of_thirds(image)
+            rule_of_thirds_score = self._analyze_rule_of_thirds(features)
             
             # Symmetry analysis
-            symmetry_score = self._analyze_symmetry(image)
+            symmetry_score = self._analyze_symmetry(features)
             
             # Overall composition score
             composition_score = (rule_of_thirds_score + symmetry_score) / 2
@@ -245,30 +1055,31 @@ class CLIPVisualAnalyzer:
                 'overall_composition': {'score': 69}
             }
     
-    def _analyze_color_scheme(self, image):
+    def _analyze_color_scheme(self, features):
         """Analyze color scheme effectiveness"""
         try:
             # Extract dominant colors
-            dominant_colors = self._extract_dominant_colors(image)
+            palette = self._extract_palette(features)
             
             # Color temperature analysis
-            temperature_score = self._analyze_color_temperature(dominant_colors)
+            temperature_score = self._analyze_color_temperature(palette)
             
             # Color saturation analysis
-            saturation_score = self._analyze_color_saturation(image)
+            saturation_score = self._analyze_color_saturation(features)
             
             # Color contrast analysis
-            contrast_score = self._analyze_color_contrast(dominant_colors)
+            contrast_score = self._analyze_color_contrast(palette)
             
             # Emotional appeal based on colors
-            emotional_score = self._calculate_emotional_appeal(dominant_colors)
+            emotional_score = self._calculate_emotional_appeal(palette)
             
             return {
-                'dominant_colors': dominant_colors,
+                'dominant_colors': self._palette_hex(palette),
                 'color_temperature': {'score': temperature_score},
                 'color_saturation': {'score': saturation_score},
                 'color_contrast': {'score': contrast_score},
-                'emotional_appeal': {'score': emotional_score}
+                'emotional_appeal': {'score': emotional_score},
+                'hue_harmony': self._analyze_hue_harmony(palette)
             }
             
         except Exception as e:
@@ -278,20 +1089,21 @@ class CLIPVisualAnalyzer:
                 'color_temperature': {'score': 75},
                 'color_saturation': {'score': 72},
                 'color_contrast': {'score': 78},
-                'emotional_appeal': {'score': 74}
+                'emotional_appeal': {'score': 74},
+                'hue_harmony': {'score': 70, 'relationship': 'neutral'}
             }
     
-    def _analyze_click_appeal(self, image, title):
+    def _analyze_click_appeal(self, features, title):
         """Analyze thumbnail's click appeal factors"""
         try:
             # Visual complexity analysis (not too busy, not too simple)
-            complexity_score = self._analyze_visual_complexity(image)
+            complexity_score = self._analyze_visual_complexity(features)
             
             # High contrast analysis (important for thumbnails)
-            contrast_score = self._analyze_high_contrast(image)
+            contrast_score = self._analyze_high_contrast(features)
             
             # Color vibrancy for click appeal
-            vibrancy_score = self._analyze_color_vibrancy(image)
+            vibrancy_score = self._analyze_color_vibrancy(features)
             
             # Calculate overall click appeal
             click_appeal_score = (complexity_score * 0.3 + 
@@ -309,18 +1121,19 @@ class CLIPVisualAnalyzer:
             logging.error(f"Error in click appeal analysis: {str(e)}")
             return {'score': 72, 'visual_complexity': 70, 'high_contrast': 75, 'color_vibrancy': 71}
     
-    def _analyze_text_overlay(self, image):
+    def _analyze_text_overlay(self, features):
         """Analyze text overlay quality in thumbnails"""
         try:
             # This is a simplified analysis - in reality, would use OCR
             # For now, analyze areas that might contain text based on color uniformity
             
-            img_array = np.array(image)
+            img_array = features.rgb
             height, width = img_array.shape[:2]
             
             # Check common text areas (top and bottom thirds)
-            top_third = img_array[:height//3, :]
-            bottom_third = img_array[2*height//3:, :]
+            # Images under three pixels high use their first and last rows
+            top_third = img_array[:max(height//3, 1), :]
+            bottom_third = img_array[min(2*height//3, height-1):, :]
             
             # Analyze color uniformity in these areas (text usually has contrasting background)
             top_uniformity = 100 - np.std(top_third)
@@ -339,19 +1152,15 @@ class CLIPVisualAnalyzer:
             logging.error(f"Error in text overlay analysis: {str(e)}")
             return {'score': 70, 'has_text_areas': True, 'text_background_quality': 65}
     
-    def _analyze_thumbnail_style(self, image):
+    def _analyze_thumbnail_style(self, features):
         """Analyze thumbnail style consistency"""
         try:
-            # Analyze style factors
-            img_array = np.array(image)
-            
             # Color palette consistency (fewer dominant colors = more consistent)
-            dominant_colors = self._extract_dominant_colors(image, num_colors=5)
+            dominant_colors = self._extract_dominant_colors(features, num_colors=5)
             color_consistency = max(60, 100 - len(dominant_colors) * 8)
             
             # Edge density (simpler thumbnails perform better)
-            gray = np.mean(img_array, axis=2)
-            edge_density = self._count_edges(gray) / (img_array.shape[0] * img_array.shape[1])
+            edge_density = self._count_edges(features.intensity) / features.pixel_count
             simplicity_score = max(50, 90 - edge_density * 1000)
             
             # Overall style score
@@ -367,19 +1176,19 @@ class CLIPVisualAnalyzer:
             logging.error(f"Error in thumbnail style analysis: {str(e)}")
             return {'score': 73, 'color_consistency': 75, 'simplicity': 71}
     
-    def _analyze_mobile_readability(self, image):
+    def _analyze_mobile_readability(self, features):
         """Analyze how readable the thumbnail is on mobile devices"""
         try:
             # Simulate mobile viewing by analyzing a smaller version
-            mobile_size = image.resize((120, 90))  # Typical mobile thumbnail size
-            mobile_array = np.array(mobile_size)
+            mobile_size = self.metric_scales['mobile_readability']
+            mobile_array = np.asarray(features.scaled(mobile_size).resize(mobile_size))
             
             # Analyze contrast at mobile size
             contrast = np.std(mobile_array)
             contrast_score = min(85, max(50, contrast * 0.8))
             
             # Analyze detail preservation
-            original_detail = np.var(np.array(image))
+            original_detail = _pixel_moments(features.rgb)[1] ** 2
             mobile_detail = np.var(mobile_array)
             detail_preservation = min(90, (mobile_detail / original_detail) * 100)
             
@@ -412,73 +1221,216 @@ class CLIPVisualAnalyzer:
             # Peak score at middle of range
             return 70 + 30 * (1 - abs(position - 0.5) * 2)
     
-    def _extract_dominant_colors(self, image, num_colors=3):
+    def _score_metric_array(self, values, metric_config):
+        """Vectorized _score_metric over an array of values"""
+        min_val = metric_config['min']
+        max_val = metric_config['max']
+        position = (values - min_val) / (max_val - min_val)
+        
+        return np.select(
+            [values < min_val, values > max_val],
+            [np.maximum(0, 50 - (min_val - values) / min_val * 30),
+             np.maximum(0, 50 - (values - max_val) / max_val * 30)],
+            70 + 30 * (1 - np.abs(position - 0.5) * 2)
+        )
+    
+    def _extract_dominant_colors(self, features, num_colors=3):
         """Extract dominant colors from image"""
         try:
-            # Resize image for faster processing
-            image = image.resize((150, 150))
-            img_array = np.array(image)
-            
-            # Reshape to 2D array
-            pixels = img_array.reshape(-1, 3)
-            
-            # Simple clustering to find dominant colors
-            # Using a basic approach - in production, would use K-means
-            unique_colors = []
-            color_counts = {}
-            
-            for pixel in pixels[::10]:  # Sample every 10th pixel
-                color_key = tuple(pixel)
-                color_counts[color_key] = color_counts.get(color_key, 0) + 1
-            
-            # Get top colors
-            sorted_colors = sorted(color_counts.items(), key=lambda x: x[1], reverse=True)
-            
-            dominant_colors = []
-            for color, count in sorted_colors[:num_colors]:
-                hex_color = '#{:02x}{:02x}{:02x}'.format(color[0], color[1], color[2])
-                dominant_colors.append(hex_color)
-            
-            return dominant_colors
+            return self._palette_hex(self._extract_palette(features, num_colors))
             
         except Exception as e:
             logging.error(f"Error extracting dominant colors: {str(e)}")
             return ['#FF5733', '#33FF57', '#3357FF']
     
+    def _extract_palette(self, features, num_colors=3):
+        """Dominant colors as an (N, 3) float array of 0-255 RGB values"""
+        return self._extract_palettes(features.rgb[None], num_colors)[0]
+    
+    def _extract_palettes(self, rgb, num_colors=3):
+        """Dominant colors of each image of an (N, H, W, 3) stack, as _extract_palette"""
+        # Sample a fixed grid of pixel centers instead of resizing each image
+        grid_width, grid_height = self.metric_scales['dominant_colors']
+        height, width = rgb.shape[1:3]
+        rows = (2 * np.arange(grid_height) + 1) * height // (2 * grid_height)
+        cols = (2 * np.arange(grid_width) + 1) * width // (2 * grid_width)
+        pixels = np.take(np.take(rgb, rows, axis=1), cols, axis=2).reshape(len(rgb), -1, 3)
+        
+        palettes = self._quantized_palettes(pixels, num_colors)
+        
+        iterations = self.palette_config['kmeans_iterations']
+        if iterations:
+            palettes = [self._refine_palette(image_pixels, centers, iterations)
+                        for image_pixels, centers in zip(pixels, palettes)]
+        
+        return [np.rint(centers).clip(0, 255) for centers in palettes]
+    
+    @staticmethod
+    def _palette_array(colors):
+        """(N, 3) float array of a palette given as hex strings or RGB rows"""
+        if isinstance(colors, np.ndarray):
+            return colors.astype(float, copy=False)
+        packed = bytes.fromhex(''.join(color.lstrip('#') for color in colors))
+        return np.frombuffer(packed, dtype=np.uint8).reshape(-1, 3).astype(float)
+    
+    @staticmethod
+    def _palette_hex(palette):
+        return ['#{:02x}{:02x}{:02x}'.format(*color) for color in palette.astype(np.uint8)]
+    
+    def _quantized_palette(self, pixels, num_colors):
+        """Most populated color bins of (P, 3) pixels, as the mean color of each bin"""
+        return self._quantized_palettes(pixels[None], num_colors)[0]
+    
+    def _quantized_palettes(self, pixels, num_colors):
+        """_quantized_palette for each image of (N, P, 3) pixels, binned in one bincount"""
+        shift = 8 - self.palette_config['bits_per_channel']
+        levels = 1 << self.palette_config['bits_per_channel']
+        bins = levels ** 3
+        images = np.arange(len(pixels))
+        
+        # Pack the quantized channels into one bin index per pixel, each
+        # image in its own range of bins
+        quantized = pixels >> shift
+        codes = quantized[..., 0].astype(np.int32)
+        for c in (1, 2):
+            codes *= levels
+            codes += quantized[..., c]
+        codes += (images * bins).astype(np.int32)[:, None]
+        codes = codes.reshape(-1)
+        counts = np.bincount(codes, minlength=len(pixels) * bins).reshape(-1, bins)
+        
+        # Pixels outside the chosen colors keep one extra, discarded label
+        labels = np.full(len(pixels) * bins, len(pixels) * num_colors, dtype=np.int32)
+        top_counts = np.zeros((len(pixels), num_colors), dtype=counts.dtype)
+        
+        # Greedily take the most populated bin (argmax keeps the lowest index
+        # among ties) together with every remaining bin within merge_distance
+        # of it, so one shaded area yields one color rather than several
+        # adjacent bins. Taken bins are marked with -1.
+        offsets = _merge_offsets(levels, 1 << shift, self.palette_config['merge_distance'])
+        for rank in range(num_colors):
+            best = counts.argmax(axis=1)
+            corner = np.stack([best // (levels * levels), best // levels % levels, best % levels], axis=1)
+            neighbours = corner[:, None, :] + offsets
+            inside = ((neighbours >= 0) & (neighbours < levels)).all(axis=2)
+            neighbours = neighbours.clip(0, levels - 1)
+            neighbour_bins = (neighbours[..., 0] * levels + neighbours[..., 1]) * levels + neighbours[..., 2]
+            neighbour_counts = counts[images[:, None], neighbour_bins]
+            taken = inside & (neighbour_counts > 0)
+            
+            top_counts[:, rank] = np.where(taken, neighbour_counts, 0).sum(axis=1)
+            rows, columns = np.nonzero(taken)
+            counts[rows, neighbour_bins[rows, columns]] = -1
+            labels[rows * bins + neighbour_bins[rows, columns]] = rows * num_colors + rank
+        
+        # Represent each color by the mean of its pixels rather than a bin corner
+        pixel_labels = labels[codes]
+        flat = pixels.reshape(-1, 3)
+        sums = np.stack([np.bincount(pixel_labels, weights=flat[:, c], minlength=top_counts.size + 1)[:-1]
+                         for c in range(3)], axis=1).reshape(len(pixels), num_colors, 3)
+        
+        centers = sums / np.maximum(top_counts, 1)[..., None]
+        palettes = []
+        for image_centers, image_counts in zip(centers, top_counts):
+            # Merged colors can outgrow earlier picks: most pixels first
+            order = np.argsort(-image_counts, kind='stable')
+            palettes.append(image_centers[order[image_counts[order] > 0]])
+        return palettes
+    
+    def _refine_palette(self, pixels, centers, iterations):
+        """Lloyd's k-means iterations seeded with the quantized palette"""
+        pixels = pixels.astype(np.float32)
+        centers = centers.astype(np.float32)
+        
+        for _ in range(iterations):
+            # ||p - c||^2 up to the per-pixel constant ||p||^2
+            distances = (centers ** 2).sum(axis=1) - 2 * pixels @ centers.T
+            labels = distances.argmin(axis=1)
+            
+            counts = np.bincount(labels, minlength=len(centers))
+            for c in range(3):
+                sums = np.bincount(labels, weights=pixels[:, c], minlength=len(centers))
+                # Keep the previous center for clusters that lost all pixels
+                centers[:, c] = np.where(counts > 0, sums / np.maximum(counts, 1), centers[:, c])
+        
+        # Order by cluster size so the first color stays the most dominant
+        order = np.argsort(-counts, kind='stable')
+        return centers[order]
+    
     def _calculate_color_harmony(self, colors):
         """Calculate color harmony score"""
         try:
-            if len(colors) < 2:
+            palette = self._palette_array(colors)
+            if len(palette) < 2:
                 return 60
             
-            harmony_score = 70  # Base score
-            
-            # Analyze color relationships
-            for i in range(len(colors) - 1):
-                color1 = colors[i].lstrip('#')
-                color2 = colors[i + 1].lstrip('#')
-                
-                # Convert to RGB
-                r1, g1, b1 = tuple(int(color1[j:j+2], 16) for j in (0, 2, 4))
-                r2, g2, b2 = tuple(int(color2[j:j+2], 16) for j in (0, 2, 4))
-                
-                # Calculate color distance
-                distance = ((r2-r1)**2 + (g2-g1)**2 + (b2-b1)**2)**0.5
-                
-                # Moderate distance is better for harmony
-                if 50 < distance < 150:
-                    harmony_score += 5
-                elif distance < 30:
-                    harmony_score -= 3  # Too similar
-                elif distance > 200:
-                    harmony_score -= 2  # Too contrasting
-            
-            return min(90, max(50, harmony_score))
+            return int(self._color_harmony_scores(palette))
             
         except Exception as e:
             logging.error(f"Error calculating color harmony: {str(e)}")
             return 70
     
+    def _color_harmony_scores(self, palettes):
+        """Harmony of adjacent palette colors for (..., N, 3) palettes, N >= 2"""
+        # Euclidean RGB distance between each color and the next
+        distance = np.sqrt((np.diff(palettes, axis=-2) ** 2).sum(axis=-1))
+        
+        # Moderate distance is better for harmony; too similar or too contrasting is penalized
+        harmony_score = (70 +
+                         5 * ((distance > 50) & (distance < 150)).sum(axis=-1) -
+                         3 * (distance < 30).sum(axis=-1) -
+                         2 * (distance > 200).sum(axis=-1))
+        
+        return np.clip(harmony_score, 50, 90)
+    
+    def _analyze_hue_harmony(self, colors):
+        """Score hue-wheel relationships (analogous, complementary, triadic) between colors"""
+        try:
+            palette = self._palette_array(colors)
+            hue, chroma = self._palette_hue(palette)
+            
+            # Hue is meaningless for near-gray colors
+            chromatic = chroma >= 30
+            if chromatic.sum() < 2:
+                return {'score': 70, 'relationship': 'neutral'}
+            
+            hue = hue[chromatic]
+            angle = np.abs(hue[:, None] - hue[None, :])
+            angle = np.minimum(angle, 360 - angle)[np.triu_indices(len(hue), k=1)]
+            
+            relationships = {
+                'analogous': angle <= 30,
+                'triadic': np.abs(angle - 120) <= 15,
+                'complementary': angle >= 150
+            }
+            counts = {name: int(matches.sum()) for name, matches in relationships.items()}
+            relationship = max(counts, key=counts.get)
+            
+            harmonic = np.any(np.stack(list(relationships.values())), axis=0).mean()
+            return {
+                'score': round(60 + 30 * float(harmonic), 2),
+                'relationship': relationship if counts[relationship] else 'mixed'
+            }
+            
+        except Exception as e:
+            logging.error(f"Error in hue harmony analysis: {str(e)}")
+            return {'score': 70, 'relationship': 'neutral'}
+    
+    @staticmethod
+    def _palette_hue(palette):
+        """Hue angle in degrees and chroma (max - min channel) of each color"""
+        r, g, b = palette[..., 0], palette[..., 1], palette[..., 2]
+        high = palette.max(axis=-1)
+        chroma = high - palette.min(axis=-1)
+        
+        with np.errstate(invalid='ignore', divide='ignore'):
+            hue = np.select(
+                [high == r, high == g],
+                [((g - b) / chroma) % 6, (b - r) / chroma + 2],
+                (r - g) / chroma + 4
+            ) * 60
+        return np.nan_to_num(hue), chroma
+    
     def _calculate_overall_score(self, metrics):
         """Calculate weighted overall score"""
         try:
@@ -590,20 +1542,15 @@ class CLIPVisualAnalyzer:
             return {'score': 50, 'note': 'تعذر تحليل الصورة'}
     
     # Additional helper methods for detailed analysis
-    def _analyze_visual_balance(self, image):
+    def _analyze_visual_balance(self, features):
         """Analyze visual balance of the image"""
         try:
-            img_array = np.array(image)
-            height, width = img_array.shape[:2]
-            
-            # Divide into quadrants
-            q1 = img_array[:height//2, :width//2]
-            q2 = img_array[:height//2, width//2:]
-            q3 = img_array[height//2:, :width//2]
-            q4 = img_array[height//2:, width//2:]
+            # One pixel high or wide: some quadrants are empty
+            if features.height < 2 or features.width < 2:
+                return 50
             
             # Calculate brightness for each quadrant
-            brightness = [np.mean(q) for q in [q1, q2, q3, q4]]
+            brightness, _, _ = features.grid_stats(2, 2)
             
             # Good balance = similar brightness across quadrants
             balance_variance = np.var(brightness)
@@ -615,11 +1562,10 @@ class CLIPVisualAnalyzer:
             logging.error(f"Error in visual balance analysis: {str(e)}")
             return 72
     
-    def _analyze_rule_of_thirds(self, image):
+    def _analyze_rule_of_thirds(self, features):
         """Analyze adherence to rule of thirds"""
         try:
-            img_array = np.array(image)
-            height, width = img_array.shape[:2]
+            height, width = features.height, features.width
             
             # Rule of thirds intersection points
             third_h, two_third_h = height // 3, 2 * height // 3
@@ -627,10 +1573,10 @@ class CLIPVisualAnalyzer:
             
             # Analyze brightness at intersection points
             intersections = [
-                self._get_area_brightness(img_array, third_w-10, third_h-10, 20, 20),
-                self._get_area_brightness(img_array, two_third_w-10, third_h-10, 20, 20),
-                self._get_area_brightness(img_array, third_w-10, two_third_h-10, 20, 20),
-                self._get_area_brightness(img_array, two_third_w-10, two_third_h-10, 20, 20)
+                self._get_area_brightness(features, third_w-10, third_h-10, 20, 20),
+                self._get_area_brightness(features, two_third_w-10, third_h-10, 20, 20),
+                self._get_area_brightness(features, third_w-10, two_third_h-10, 20, 20),
+                self._get_area_brightness(features, two_third_w-10, two_third_h-10, 20, 20)
             ]
             
             # Higher variance at intersections suggests better composition
@@ -643,22 +1589,23 @@ class CLIPVisualAnalyzer:
             logging.error(f"Error in rule of thirds analysis: {str(e)}")
             return 70
     
-    def _get_area_brightness(self, image, x, y, width, height):
+    def _get_area_brightness(self, features, x, y, width, height):
         """Get average brightness of a specific area"""
         try:
-            h, w = image.shape[:2]
-            x = max(0, min(x, w - width))
-            y = max(0, min(y, h - height))
-            area = image[y:y+height, x:x+width]
-            return np.mean(area)
+            x = max(0, min(x, features.width - width))
+            y = max(0, min(y, features.height - height))
+            mean, _, _ = features.region_stats(y, y+height, x, x+width)
+            return mean
         except:
             return 128  # Default brightness
     
-    def _analyze_symmetry(self, image):
+    def _analyze_symmetry(self, features):
         """Analyze image symmetry"""
         try:
-            img_array = np.array(image.convert('L'))  # Convert to grayscale
+            img_array = features.gray
             height, width = img_array.shape
+            if width < 2:
+                return 50
             
             # Horizontal symmetry
             left_half = img_array[:, :width//2]
@@ -670,7 +1617,7 @@ class CLIPVisualAnalyzer:
             right_half = right_half[:, :min_width]
             
             # Calculate difference
-            symmetry_diff = np.mean(np.abs(left_half.astype(float) - right_half.astype(float)))
+            symmetry_diff = np.mean(np.abs(left_half.astype(np.int16) - right_half))
             symmetry_score = max(50, 90 - symmetry_diff / 5)
             
             return round(symmetry_score, 2)
@@ -682,18 +1629,12 @@ class CLIPVisualAnalyzer:
     def _analyze_color_temperature(self, colors):
         """Analyze color temperature warmth/coolness"""
         try:
-            warm_score = 0
-            cool_score = 0
+            palette = self._palette_array(colors)
+            r, g, b = palette[:, 0], palette[:, 1], palette[:, 2]
             
-            for color in colors:
-                color = color.lstrip('#')
-                r, g, b = tuple(int(color[i:i+2], 16) for i in (0, 2, 4))
-                
-                # Warm colors have more red/yellow
-                if r > g and r > b:
-                    warm_score += 1
-                elif b > r and b > g:
-                    cool_score += 1
+            # Warm colors have more red/yellow
+            warm_score = int(((r > g) & (r > b)).sum())
+            cool_score = int(((b > r) & (b > g)).sum())
             
             # Balanced temperature is often better
             if abs(warm_score - cool_score) <= 1:
@@ -707,12 +1648,10 @@ class CLIPVisualAnalyzer:
             logging.error(f"Error in color temperature analysis: {str(e)}")
             return 75
     
-    def _analyze_color_saturation(self, image):
+    def _analyze_color_saturation(self, features):
         """Analyze overall color saturation"""
         try:
-            hsv = image.convert('HSV')
-            saturation_array = np.array(hsv)[:, :, 1]
-            avg_saturation = np.mean(saturation_array) / 255.0
+            avg_saturation = np.mean(features.saturation) / 255.0
             
             # Moderate saturation is usually best
             if 0.4 <= avg_saturation <= 0.7:
@@ -731,26 +1670,13 @@ class CLIPVisualAnalyzer:
     def _analyze_color_contrast(self, colors):
         """Analyze color contrast between dominant colors"""
         try:
-            if len(colors) < 2:
+            palette = self._palette_array(colors)
+            if len(palette) < 2:
                 return 60
             
-            contrasts = []
-            for i in range(len(colors) - 1):
-                color1 = colors[i].lstrip('#')
-                color2 = colors[i + 1].lstrip('#')
-                
-                # Convert to RGB
-                rgb1 = tuple(int(color1[j:j+2], 16) for j in (0, 2, 4))
-                rgb2 = tuple(int(color2[j:j+2], 16) for j in (0, 2, 4))
-                
-                # Calculate luminance contrast
-                l1 = self._calculate_luminance(rgb1)
-                l2 = self._calculate_luminance(rgb2)
-                
-                contrast_ratio = (max(l1, l2) + 0.05) / (min(l1, l2) + 0.05)
-                contrasts.append(contrast_ratio)
-            
-            avg_contrast = np.mean(contrasts)
+            # Contrast of each color with the next one
+            contrasts = np.diagonal(self._contrast_matrix(palette), offset=1)
+            avg_contrast = float(np.mean(contrasts))
             
             # Good contrast is between 3:1 and 7:1
             if 3 <= avg_contrast <= 7:
@@ -766,62 +1692,60 @@ class CLIPVisualAnalyzer:
             logging.error(f"Error in color contrast analysis: {str(e)}")
             return 78
     
+    def _contrast_matrix(self, palette):
+        """WCAG contrast ratio between every pair of colors, shape (..., N, N)"""
+        luminance = self._relative_luminance(palette)
+        lighter = np.maximum(luminance[..., :, None], luminance[..., None, :])
+        darker = np.minimum(luminance[..., :, None], luminance[..., None, :])
+        return (lighter + 0.05) / (darker + 0.05)
+    
     def _calculate_luminance(self, rgb_color):
         """Calculate relative luminance of RGB color"""
         try:
-            r, g, b = [x / 255.0 for x in rgb_color]
-            
-            # Apply gamma correction
-            def gamma_correct(c):
-                return c / 12.92 if c <= 0.03928 else ((c + 0.055) / 1.055) ** 2.4
-            
-            r = gamma_correct(r)
-            g = gamma_correct(g)
-            b = gamma_correct(b)
-            
-            # Calculate luminance
-            return 0.2126 * r + 0.7152 * g + 0.0722 * b
+            return float(self._relative_luminance(np.asarray(rgb_color, dtype=float)))
             
         except Exception as e:
             logging.error(f"Error calculating luminance: {str(e)}")
             return 0.5
     
+    @staticmethod
+    def _relative_luminance(palette):
+        """WCAG relative luminance of (..., 3) arrays of 0-255 RGB values"""
+        channels = palette / 255.0
+        
+        # Apply gamma correction
+        linear = np.where(channels <= 0.03928, channels / 12.92, ((channels + 0.055) / 1.055) ** 2.4)
+        
+        return 0.2126 * linear[..., 0] + 0.7152 * linear[..., 1] + 0.0722 * linear[..., 2]
+    
     def _calculate_emotional_appeal(self, colors):
         """Calculate emotional appeal based on color psychology"""
         try:
-            emotional_score = 70  # Base score
-            
-            for color in colors:
-                color = color.lstrip('#')
-                r, g, b = tuple(int(color[i:i+2], 16) for i in (0, 2, 4))
-                
-                # Color psychology scoring
-                if r > 200 and g < 100 and b < 100:  # Red - energetic
-                    emotional_score += 5
-                elif g > 200 and r < 150 and b < 150:  # Green - calming
-                    emotional_score += 3
-                elif b > 200 and r < 150 and g < 150:  # Blue - trustworthy
-                    emotional_score += 4
-                elif r > 200 and g > 150 and b < 100:  # Orange/Yellow - cheerful
-                    emotional_score += 4
-                elif r < 50 and g < 50 and b < 50:  # Dark - sophisticated
-                    emotional_score += 2
-            
+            palette = self._palette_array(colors)
+            r, g, b = palette[:, 0], palette[:, 1], palette[:, 2]
+            
+            # Color psychology scoring; each color counts for its first matching family
+            bonus = np.select([
+                (r > 200) & (g < 100) & (b < 100),  # Red - energetic
+                (g > 200) & (r < 150) & (b < 150),  # Green - calming
+                (b > 200) & (r < 150) & (g < 150),  # Blue - trustworthy
+                (r > 200) & (g > 150) & (b < 100),  # Orange/Yellow - cheerful
+                (r < 50) & (g < 50) & (b < 50)      # Dark - sophisticated
+            ], [5, 3, 4, 4, 2], 0)
+            
+            emotional_score = 70 + int(bonus.sum())  # Base score
             return min(90, max(50, emotional_score))
             
         except Exception as e:
             logging.error(f"Error calculating emotional appeal: {str(e)}")
             return 74
     
-    def _analyze_visual_complexity(self, image):
+    def _analyze_visual_complexity(self, features):
         """Analyze visual complexity for optimal click appeal"""
         try:
-            img_array = np.array(image.convert('L'))  # Grayscale
-            
             # Edge detection to measure complexity
-            edges = self._count_edges(img_array)
-            total_pixels = img_array.shape[0] * img_array.shape[1]
-            edge_density = edges / total_pixels
+            edges = self._count_edges(features.gray)
+            edge_density = edges / features.pixel_count
             
             # Optimal complexity is moderate (not too busy, not too simple)
             if 0.05 <= edge_density <= 0.15:
@@ -855,20 +1779,16 @@ class CLIPVisualAnalyzer:
             logging.error(f"Error counting edges: {str(e)}")
             return 1000  # Default edge count
     
-    def _analyze_high_contrast(self, image):
+    def _analyze_high_contrast(self, features):
         """Analyze if image has high contrast suitable for thumbnails"""
         try:
-            img_array = np.array(image.convert('L'))
-            
             # Calculate histogram
-            hist, _ = np.histogram(img_array, bins=256, range=(0, 256))
+            hist = np.bincount(features.gray.ravel(), minlength=256)
             
             # High contrast images have peaks at both ends
             dark_pixels = np.sum(hist[:64])  # Very dark
             bright_pixels = np.sum(hist[192:])  # Very bright
-            total_pixels = img_array.shape[0] * img_array.shape[1]
-            
-            contrast_ratio = (dark_pixels + bright_pixels) / total_pixels
+            contrast_ratio = (dark_pixels + bright_pixels) / features.pixel_count
             
             # Good thumbnail contrast
             if contrast_ratio > 0.3:
@@ -884,12 +1804,11 @@ class CLIPVisualAnalyzer:
             logging.error(f"Error in high contrast analysis: {str(e)}")
             return 75
     
-    def _analyze_color_vibrancy(self, image):
+    def _analyze_color_vibrancy(self, features):
         """Analyze color vibrancy"""
         try:
-            hsv = image.convert('HSV')
-            saturation = np.array(hsv)[:, :, 1]
-            value = np.array(hsv)[:, :, 2]
+            saturation = features.saturation
+            value = features.value
             
             # Vibrancy combines saturation and brightness
             vibrancy = np.mean(saturation * value) / (255 * 255)
@@ -908,7 +1827,7 @@ class CLIPVisualAnalyzer:
             logging.error(f"Error in color vibrancy analysis: {str(e)}")
             return 71
     
-    def _analyze_brand_presence(self, image, channel_info):
+    def _analyze_brand_presence(self, features, channel_info):
         """Analyze brand presence in channel art"""
         try:
             # This is a simplified analysis
@@ -923,19 +1842,15 @@ class CLIPVisualAnalyzer:
                 if channel_info.get('description') and len(channel_info['description']) > 100:
                     brand_score += 5
             
-            # Analyze for text areas (likely branding)
-            img_array = np.array(image.convert('L'))
-            
             # Look for consistent color blocks (logos/branding)
             # Simplified: look for areas with low variance (solid colors)
-            height, width = img_array.shape
+            center_h, center_w = features.height // 2, features.width // 2
             
             # Check center area for branding
-            center_h, center_w = height // 2, width // 2
-            center_area = img_array[center_h-50:center_h+50, center_w-100:center_w+100]
+            _, center_variance, center_size = features.region_stats(
+                center_h-50, center_h+50, center_w-100, center_w+100, plane='gray')
             
-            if center_area.size > 0:
-                center_variance = np.var(center_area)
+            if center_size > 0:
                 if center_variance < 1000:  # Low variance suggests branding element
                     brand_score += 8
             
@@ -945,16 +1860,12 @@ class CLIPVisualAnalyzer:
             logging.error(f"Error in brand presence analysis: {str(e)}")
             return 70
     
-    def _analyze_banner_text(self, image):
+    def _analyze_banner_text(self, features):
         """Analyze text readability in banner"""
         try:
-            # Simplified text analysis
-            img_array = np.array(image.convert('L'))
-            
             # Look for high contrast areas (likely text)
-            edges = self._count_edges(img_array)
-            total_pixels = img_array.shape[0] * img_array.shape[1]
-            edge_density = edges / total_pixels
+            edges = self._count_edges(features.gray)
+            edge_density = edges / features.pixel_count
             
             # Text areas typically have higher edge density
             if edge_density > 0.1:
@@ -970,23 +1881,14 @@ class CLIPVisualAnalyzer:
             logging.error(f"Error in banner text analysis: {str(e)}")
             return 68
     
-    def _analyze_visual_hierarchy(self, image):
+    def _analyze_visual_hierarchy(self, features):
         """Analyze visual hierarchy in channel art"""
         try:
-            img_array = np.array(image)
-            height, width = img_array.shape[:2]
-            
             # Analyze brightness distribution
             # Good hierarchy has clear focal points
             
             # Divide into 9 sections (3x3 grid)
-            sections = []
-            for i in range(3):
-                for j in range(3):
-                    start_h, end_h = i * height // 3, (i + 1) * height // 3
-                    start_w, end_w = j * width // 3, (j + 1) * width // 3
-                    section = img_array[start_h:end_h, start_w:end_w]
-                    sections.append(np.mean(section))
+            sections, _, _ = features.grid_stats(3, 3)
             
             # Good hierarchy has variation in brightness
             hierarchy_variance = np.var(sections)
@@ -998,10 +1900,10 @@ class CLIPVisualAnalyzer:
             logging.error(f"Error in visual hierarchy analysis: {str(e)}")
             return 72
     
-    def _analyze_banner_compatibility(self, image):
+    def _analyze_banner_compatibility(self, features):
         """Analyze banner compatibility across platforms"""
         try:
-            width, height = image.size
+            width, height = features.source_width, features.source_height
             
             # YouTube banner optimal ratio is 16:9 (2560x1440)
             aspect_ratio = width / height
@@ -0,0 +1,193 @@
+import json
+import logging
+import threading
+
+import numpy as np
+
+
+def _block_means(plane, rows, cols):
+    """Area-average a 2D plane down to a rows x cols grid"""
+    height, width = plane.shape
+    row_starts = np.linspace(0, height, rows + 1).astype(int)[:-1]
+    col_starts = np.linspace(0, width, cols + 1).astype(int)[:-1]
+    row_sizes = np.diff(np.append(row_starts, height))
+    col_sizes = np.diff(np.append(col_starts, width))
+
+    # Integer row sums first, so no full-size float copy of the plane is made
+    sums = np.add.reduceat(np.add.reduceat(plane, row_starts, axis=0, dtype=np.int64), col_starts, axis=1)
+    return sums / np.outer(row_sizes, col_sizes)
+
+
+def _pack_bits(bits):
+    """Pack a boolean grid into one unsigned 64-bit integer"""
+    return int(np.packbits(bits.ravel()).view('>u8')[0])
+
+
+def average_hash(gray, size=8):
+    """aHash: which grid cells are brighter than the image mean"""
+    cells = _block_means(gray, size, size)
+    return _pack_bits(cells > cells.mean())
+
+
+def difference_hash(gray, size=8):
+    """dHash: whether brightness increases between horizontally adjacent cells"""
+    cells = _block_means(gray, size, size + 1)
+    return _pack_bits(cells[:, 1:] > cells[:, :-1])
+
+
+def color_signature(rgb, size=2):
+    """Mean colour of each cell of a size x size grid, 4 bits per channel
+
+    The brightness hashes cannot tell apart flat images, or images that
+    differ only in hue; this coarse signature can.
+    """
+    levels = [np.minimum(_block_means(rgb[:, :, channel], size, size) // 16, 15).astype(np.int64)
+              for channel in range(3)]
+    signature = 0
+    for level in np.stack(levels, axis=-1).ravel():
+        signature = (signature << 4) | int(level)
+    return signature
+
+
+def _color_levels(signatures, size=2):
+    """Unpack colour signatures into an (n, size * size * 3) array of levels"""
+    shifts = np.arange(size * size * 3 - 1, -1, -1, dtype=np.int64) * 4
+    return (np.asarray(signatures, dtype=np.int64)[..., None] >> shifts) & 15
+
+
+def _to_signed(value):
+    """Map an unsigned 64-bit hash onto the signed BigInteger column range"""
+    return value - (1 << 64) if value >= (1 << 63) else value
+
+
+class PerceptualHashIndex:
+    """Index of analyzed images by perceptual hash
+
+    Hashes and results are stored in the ImageAnalysis table. Each process
+    keeps an in-memory mirror of the hashes per analysis kind, so a lookup
+    is a vectorized Hamming-distance scan plus a single row fetch on a hit.
+    The mirror picks up rows written by other processes on every lookup.
+    """
+
+    def __init__(self, threshold=4, color_tolerance=1):
+        # Maximum Hamming distance (out of 64 bits) for both hashes to count as a hit
+        self.threshold = threshold
+        # Maximum difference, in 16-value levels, of any cell's mean colour channel
+        self.color_tolerance = color_tolerance
+        self.lock = threading.Lock()
+        self.last_id = 0
+        self.entries = {}  # kind -> (ids, average hashes, difference hashes, colour levels)
+
+    def compute_hashes(self, gray, rgb):
+        """(aHash, dHash, colour signature) of an image's grayscale and RGB planes"""
+        return average_hash(gray), difference_hash(gray), color_signature(rgb)
+
+    def lookup(self, kind, hashes):
+        """Cached analysis result for a perceptually identical image, or None"""
+        try:
+            self._sync()
+
+            with self.lock:
+                ids, average_hashes, difference_hashes, color_levels = self.entries.get(kind, (None,) * 4)
+            if ids is None:
+                return None
+
+            average_distance = np.bitwise_count(average_hashes ^ np.uint64(hashes[0]))
+            difference_distance = np.bitwise_count(difference_hashes ^ np.uint64(hashes[1]))
+            distance = np.maximum(average_distance, difference_distance).astype(np.int64)
+
+            # Images of a different colour are never hits, however close their hashes
+            color_distance = np.abs(color_levels - _color_levels(hashes[2])).max(axis=1)
+            distance[color_distance > self.color_tolerance] = 65
+
+            best = int(distance.argmin())
+            if distance[best] > self.threshold:
+                return None
+
+            from models import ImageAnalysis
+            record = ImageAnalysis.query.get(int(ids[best]))
+            if record is None:
+                return None
+
+            result = json.loads(record.analysis_result)
+            result['cache_hit'] = {
+                'hamming_distance': int(distance[best]),
+                'image_url': record.image_url
+            }
+            return result
+
+        except Exception as e:
+            logging.error(f"Error looking up perceptual hash index: {str(e)}")
+            return None
+
+    def add(self, kind, hashes, result, image_url=''):
+        """Store an analysis result under the image's hashes"""
+        try:
+            from app import db
+            from models import ImageAnalysis
+
+            record = ImageAnalysis(
+                image_url=image_url[:500],
+                analysis_kind=kind,
+                average_hash=_to_signed(hashes[0]),
+                difference_hash=_to_signed(hashes[1]),
+                color_signature=hashes[2],
+                analysis_result=json.dumps(result, ensure_ascii=False, default=self._json_default)
+            )
+            db.session.add(record)
+            db.session.commit()
+
+            self._sync()
+
+        except Exception as e:
+            from app import db
+            db.session.rollback()
+            logging.error(f"Error adding to perceptual hash index: {str(e)}")
+
+    def _sync(self):
+        """Load hashes of rows added since the last sync into the mirror
+
+        Rows stored before colour signatures existed are never loaded, so
+        they cannot produce a hit.
+        """
+        from models import ImageAnalysis
+
+        with self.lock:
+            rows = (ImageAnalysis.query
+                    .with_entities(ImageAnalysis.id, ImageAnalysis.analysis_kind,
+                                   ImageAnalysis.average_hash, ImageAnalysis.difference_hash,
+                                   ImageAnalysis.color_signature)
+                    .filter(ImageAnalysis.id > self.last_id, ImageAnalysis.color_signature.isnot(None))
+                    .order_by(ImageAnalysis.id)
+                    .all())
+            if not rows:
+                return
+
+            by_kind = {}
+            for row_id, kind, average, difference, color in rows:
+                by_kind.setdefault(kind, []).append((row_id, average, difference, color))
+
+            for kind, kind_rows in by_kind.items():
+                new = np.array(kind_rows, dtype=np.int64)
+                ids = new[:, 0]
+                average_hashes = new[:, 1].view(np.uint64)
+                difference_hashes = new[:, 2].view(np.uint64)
+                color_levels = _color_levels(new[:, 3])
+
+                if kind in self.entries:
+                    old_ids, old_average, old_difference, old_color = self.entries[kind]
+                    ids = np.concatenate([old_ids, ids])
+                    average_hashes = np.concatenate([old_average, average_hashes])
+                    difference_hashes = np.concatenate([old_difference, difference_hashes])
+                    color_levels = np.concatenate([old_color, color_levels])
+
+                self.entries[kind] = (ids, average_hashes, difference_hashes, color_levels)
+
+            self.last_id = max(self.last_id, rows[-1][0])
+
+    @staticmethod
+    def _json_default(value):
+        # NumPy scalars (np.bool_, np.int64, ...) in metric results
+        if hasattr(value, 'item'):
+            return value.item()
+        return str(value)
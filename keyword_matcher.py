@@ -0,0 +1,128 @@
+import logging
+import threading
+
+from text_features import normalize_arabic
+
+
+class KeywordMatcher:
+    """Aho-Corasick matcher over groups of categorized keyword lists
+
+    Each analyzer registers its dictionaries under a group name
+    ({category: [keywords]}); all groups are compiled into one automaton,
+    so a single left-to-right pass over a text finds every hit of every
+    keyword, whatever the number of keywords. Counts follow str.count,
+    i.e. non-overlapping occurrences of each keyword.
+
+    Keywords are compiled in normalize_arabic form, so scanned text should
+    be normalized the same way (TextFeatures.normalized); hits report the
+    keywords as registered.
+
+    Compiled state is replaced as a whole on registration, so scans never
+    need a lock.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.groups = {}
+        # (entries, transitions, outputs); built by _compile
+        self.automaton = ([], [{}], [()])
+        # (automaton, {groups: outputs}); rebuilt lazily after each compile
+        self.output_cache = (None, {})
+
+    def register(self, group, categories):
+        """Add or replace a group's keyword lists and recompile if they changed"""
+        categories = {
+            category: tuple(keywords)
+            for category, keywords in categories.items()
+            if isinstance(keywords, (list, tuple))
+        }
+        with self.lock:
+            if self.groups.get(group) == categories:
+                return
+            self.groups[group] = categories
+            self.automaton = self._compile(self.groups)
+
+    def scan(self, text, groups=None):
+        """Keyword hits in text as {group: {category: [(keyword, count), ...]}}
+
+        Keywords of a category are listed in registration order; categories
+        without hits are left out. groups restricts the result to those
+        group names.
+        """
+        entries, transitions, outputs = self.automaton
+        if groups is not None:
+            outputs = self._group_outputs(self.automaton, tuple(groups))
+        counts = {}
+        last_end = {}
+
+        node = 0
+        for position, char in enumerate(text):
+            node = transitions[node].get(char, 0)
+            for entry_id in outputs[node]:
+                # Only count an occurrence that starts after the previous one ended
+                if position - entries[entry_id][3] >= last_end.get(entry_id, -1):
+                    counts[entry_id] = counts.get(entry_id, 0) + 1
+                    last_end[entry_id] = position
+
+        hits = {}
+        for entry_id in sorted(counts):
+            group, category, keyword, _ = entries[entry_id]
+            hits.setdefault(group, {}).setdefault(category, []).append((keyword, counts[entry_id]))
+        return hits
+
+    def _group_outputs(self, automaton, groups):
+        """Per-state outputs restricted to some groups, cached per automaton"""
+        cache = self.output_cache
+        if cache[0] is not automaton:
+            cache = self.output_cache = (automaton, {})
+        if groups not in cache[1]:
+            entries, _, outputs = automaton
+            cache[1][groups] = [
+                tuple(entry_id for entry_id in output if entries[entry_id][0] in groups)
+                for output in outputs
+            ]
+        return cache[1][groups]
+
+    @staticmethod
+    def _compile(registered):
+        """Build the trie, failure links and a full transition table"""
+        entries = []
+        children = [{}]
+        outputs = [[]]
+
+        for group, categories in registered.items():
+            for category, keywords in categories.items():
+                for keyword in keywords:
+                    pattern = normalize_arabic(keyword)
+                    if not pattern:
+                        continue
+                    node = 0
+                    for char in pattern:
+                        if char not in children[node]:
+                            children[node][char] = len(children)
+                            children.append({})
+                            outputs.append([])
+                        node = children[node][char]
+                    outputs[node].append(len(entries))
+                    entries.append((group, category, keyword, len(pattern)))
+
+        # Breadth-first, so a node's failure target is complete before the node
+        transitions = [None] * len(children)
+        transitions[0] = dict(children[0])
+        queue = [(child, 0) for child in children[0].values()]
+        index = 0
+        while index < len(queue):
+            node, fail = queue[index]
+            index += 1
+            # Missing moves fall back to the failure node's (already complete) moves
+            transitions[node] = {**transitions[fail], **children[node]}
+            outputs[node] = outputs[node] + outputs[fail]
+            for char, child in children[node].items():
+                queue.append((child, transitions[fail].get(char, 0)))
+
+        logging.debug(f"Keyword matcher compiled: {len(entries)} keywords, {len(children)} states")
+        return entries, transitions, [tuple(sorted(output)) for output in outputs]
+
+
+# Shared by all text analyzers; each registers its dictionaries at construction
+keyword_matcher = KeywordMatcher()
@@ -0,0 +1,163 @@
+import json
+import logging
+
+from sqlalchemy import inspect, text
+
+from app import db
+
+# pg_advisory_lock key held while migrations run, so one worker applies them
+MIGRATION_LOCK_KEY = 720531
+
+# Rows backfilled per transaction; each batch commits on its own
+BACKFILL_BATCH = 5000
+
+
+def _add_column(engine, model, column, column_type):
+    """Add a column to an existing table unless it is already there"""
+    with engine.begin() as connection:
+        columns = {entry['name'] for entry in inspect(connection).get_columns(model.__tablename__)}
+        if column not in columns:
+            connection.execute(text(f'ALTER TABLE {model.__tablename__} ADD COLUMN {column} {column_type}'))
+
+
+def _add_title_hash(engine):
+    """Add TitleAnalysis.title_hash to existing tables and fill it in batches"""
+    from models import TitleAnalysis, title_hash
+
+    _add_column(engine, TitleAnalysis, 'title_hash', 'BIGINT')
+
+    table = TitleAnalysis.__table__
+    while True:
+        with engine.begin() as connection:
+            rows = connection.execute(
+                db.select(table.c.id, table.c.title).where(table.c.title_hash.is_(None)).limit(BACKFILL_BATCH)
+            ).all()
+            if not rows:
+                break
+            connection.execute(
+                table.update().where(table.c.id == db.bindparam('row_id')).values(title_hash=db.bindparam('hash')),
+                [{'row_id': row_id, 'hash': title_hash(title)} for row_id, title in rows]
+            )
+
+
+def _create_lookup_indexes(engine):
+    """Indexes behind the latest-analysis and title lookups
+
+    On PostgreSQL they are built CONCURRENTLY, outside a transaction, so
+    writes to the tables are not blocked while an index builds.
+    """
+    from models import LOOKUP_INDEXES
+
+    if engine.dialect.name != 'postgresql':
+        with engine.begin() as connection:
+            for index in LOOKUP_INDEXES:
+                index.create(connection, checkfirst=True)
+        return
+
+    with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as connection:
+        for index in LOOKUP_INDEXES:
+            # An interrupted concurrent build leaves an invalid index behind
+            invalid = connection.execute(text('SELECT NOT indisvalid FROM pg_index '
+                                              'WHERE indexrelid = to_regclass(:name)'), {'name': index.name}).scalar()
+            if invalid:
+                connection.execute(text(f'DROP INDEX CONCURRENTLY {index.name}'))
+
+            options = index.dialect_options['postgresql']
+            options['concurrently'] = True
+            try:
+                index.create(connection, checkfirst=True)
+            finally:
+                # db.create_all() runs in a transaction, where CONCURRENTLY is not allowed
+                options['concurrently'] = False
+
+
+def _add_color_signature(engine):
+    """Add ImageAnalysis.color_signature; rows without one are never cache hits"""
+    from models import ImageAnalysis
+
+    _add_column(engine, ImageAnalysis, 'color_signature', 'BIGINT')
+
+
+def _add_niche_source(engine):
+    """Add ChannelAnalysis.niche_source, filled in from the stored niche classification"""
+    from models import ChannelAnalysis
+
+    _add_column(engine, ChannelAnalysis, 'niche_source', 'VARCHAR(20)')
+
+    # Analyses from before the column whose niche the classifier decided alone
+    table = ChannelAnalysis.__table__
+    last_id = 0
+    while True:
+        with engine.begin() as connection:
+            rows = connection.execute(
+                db.select(table.c.id, table.c.analysis_details)
+                .where(table.c.id > last_id, table.c.niche_source.is_(None))
+                .order_by(table.c.id).limit(BACKFILL_BATCH)
+            ).all()
+            if not rows:
+                break
+            last_id = rows[-1][0]
+
+            classified = []
+            for row_id, details in rows:
+                try:
+                    classification = json.loads(details or '{}').get('niche_analysis', {}).get('niche_classification', {})
+                except (ValueError, AttributeError):
+                    continue
+                if classification.get('confident'):
+                    classified.append({'row_id': row_id})
+            if classified:
+                connection.execute(
+                    table.update().where(table.c.id == db.bindparam('row_id')).values(niche_source='classifier'),
+                    classified
+                )
+
+
+# Applied in order, each at most once per database. Migrations commit as
+# they go, so each must be safe to run again after an interruption.
+MIGRATIONS = [
+    ('0001_title_hash', _add_title_hash),
+    ('0002_lookup_indexes', _create_lookup_indexes),
+    ('0003_color_signature', _add_color_signature),
+    ('0004_niche_source', _add_niche_source),
+]
+
+
+def run_migrations():
+    """Apply pending schema migrations to a database created by earlier versions
+
+    Every worker process runs this at startup. On PostgreSQL the first one
+    takes an advisory lock and applies the migrations; the others wait for
+    it and then find nothing left to do.
+    """
+    engine = db.engine
+    locking = engine.dialect.name == 'postgresql'
+
+    with engine.connect() as lock_connection:
+        if locking:
+            lock_connection.execute(text('SELECT pg_advisory_lock(:key)'), {'key': MIGRATION_LOCK_KEY})
+            lock_connection.commit()
+        try:
+            with engine.begin() as connection:
+                connection.execute(text('CREATE TABLE IF NOT EXISTS schema_migrations '
+                                        '(name VARCHAR(100) PRIMARY KEY, applied_date TIMESTAMP)'))
+                applied = set(connection.execute(text('SELECT name FROM schema_migrations')).scalars())
+
+            for name, migration in MIGRATIONS:
+                if name in applied:
+                    continue
+                try:
+                    migration(engine)
+                    with engine.begin() as connection:
+                        connection.execute(text('INSERT INTO schema_migrations (name, applied_date) '
+                                                'VALUES (:name, CURRENT_TIMESTAMP)'), {'name': name})
+                    logging.info(f"Applied migration {name}")
+
+                except Exception as e:
+                    logging.error(f"Error applying migration {name}: {str(e)}")
+                    break
+
+        finally:
+            if locking:
+                lock_connection.execute(text('SELECT pg_advisory_unlock(:key)'), {'key': MIGRATION_LOCK_KEY})
+                lock_connection.commit()
@@ -1,6 +1,19 @@
 from app import db
 from datetime import datetime
+import hashlib
 import json
+from text_features import normalize_arabic
+
+
+def title_hash(title):
+    """Signed 64-bit hash of a title's normalized form, for indexed exact-title lookups"""
+    digest = hashlib.blake2b(normalize_arabic(' '.join(title.split())).encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'big', signed=True)
+
+
+def _title_hash_default(context):
+    return title_hash(context.get_current_parameters()['title'])
+
 
 class ChannelAnalysis(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -16,6 +29,7 @@ class ChannelAnalysis(db.Model):
     
     # AI Analysis results
     detected_niche = db.Column(db.String(100))
+    niche_source = db.Column(db.String(20))  # 'ai' or 'classifier'; classifier labels are not trained on
     channel_art_score = db.Column(db.Float)
     thumbnail_score = db.Column(db.Float)
     title_optimization_score = db.Column(db.Float)
@@ -25,12 +39,23 @@ class ChannelAnalysis(db.Model):
     analysis_details = db.Column(db.Text)
     recommendations = db.Column(db.Text)
     
+    @classmethod
+    def latest_for_channel(cls, channel_id):
+        """Most recent analysis of a channel, or None"""
+        return cls.query.filter_by(channel_id=channel_id).order_by(cls.analysis_date.desc()).first()
+    
+    @classmethod
+    def history_for_channel(cls, channel_id, limit=20):
+        """A channel's analyses, newest first"""
+        return cls.query.filter_by(channel_id=channel_id).order_by(cls.analysis_date.desc()).limit(limit).all()
+    
     def __repr__(self):
         return f'<ChannelAnalysis {self.channel_name}>'
 
 class TitleAnalysis(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(500), nullable=False)
+    title_hash = db.Column(db.BigInteger, default=_title_hash_default)
     analysis_date = db.Column(db.DateTime, default=datetime.utcnow)
     
     # AI Analysis scores
@@ -49,6 +74,18 @@ class TitleAnalysis(db.Model):
     best_posting_time = db.Column(db.String(100))
     target_audience = db.Column(db.String(200))
     
+    @classmethod
+    def history_for_title(cls, title, limit=20):
+        """Analyses of the same title (after normalization), newest first"""
+        normalized = normalize_arabic(' '.join(title.split()))
+        candidates = (cls.query
+                      .filter_by(title_hash=title_hash(title))
+                      .order_by(cls.analysis_date.desc())
+                      .limit(limit)
+                      .all())
+        # Rule out hash collisions
+        return [analysis for analysis in candidates if normalize_arabic(' '.join(analysis.title.split())) == normalized]
+    
     def __repr__(self):
         return f'<TitleAnalysis {self.title[:50]}...>'
 
@@ -81,5 +118,84 @@ class OptimalTiming(db.Model):
     confidence_score = db.Column(db.Float)
     data_quality = db.Column(db.String(20))  # 'high', 'medium', 'low'
     
+    @classmethod
+    def latest_for_channel(cls, channel_id):
+        """Most recent timing analysis of a channel, or None"""
+        return cls.query.filter_by(channel_id=channel_id).order_by(cls.analysis_date.desc()).first()
+    
     def __repr__(self):
         return f'<OptimalTiming {self.channel_id}>'
+
+class ImageAnalysis(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    image_url = db.Column(db.String(500))
+    analysis_kind = db.Column(db.String(50), nullable=False)  # 'quality', 'thumbnail', 'channel_art:..'
+    analysis_date = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    # 64-bit perceptual hashes, stored as signed integers
+    average_hash = db.Column(db.BigInteger, nullable=False)
+    difference_hash = db.Column(db.BigInteger, nullable=False)
+    # 2x2 grid of mean colours, 4 bits per channel (48 bits)
+    color_signature = db.Column(db.BigInteger)
+    
+    # Full analysis result (JSON)
+    analysis_result = db.Column(db.Text)
+    
+    def __repr__(self):
+        return f'<ImageAnalysis {self.analysis_kind} {self.image_url}>'
+
+class VideoStatistics(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    video_id = db.Column(db.String(50), unique=True, nullable=False)
+    channel_id = db.Column(db.String(100), nullable=False)
+    title = db.Column(db.String(500), nullable=False)
+    published_at = db.Column(db.DateTime)
+    
+    # Latest observed statistics
+    view_count = db.Column(db.BigInteger, default=0)
+    like_count = db.Column(db.BigInteger, default=0)
+    comment_count = db.Column(db.BigInteger, default=0)
+    fetched_date = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<VideoStatistics {self.video_id}>'
+
+class CategoryTiming(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    category = db.Column(db.String(100), nullable=False)
+    target_audience = db.Column(db.String(200), nullable=False, default='')
+    
+    # Timing recommendations (JSON), refreshed in the background
+    recommendations = db.Column(db.Text, nullable=False)
+    refreshed_date = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (db.UniqueConstraint('category', 'target_audience'),)
+    
+    def __repr__(self):
+        return f'<CategoryTiming {self.category} {self.target_audience}>'
+
+class NicheAggregate(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    niche = db.Column(db.String(100), nullable=False)
+    metric = db.Column(db.String(50), nullable=False)
+    
+    # Histogram over the metric's fixed bins (JSON array), latest analysis per channel
+    channel_count = db.Column(db.Integer, default=0)
+    histogram = db.Column(db.Text, nullable=False)
+    updated_date = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (db.UniqueConstraint('niche', 'metric'),)
+    
+    def __repr__(self):
+        return f'<NicheAggregate {self.niche} {self.metric}>'
+
+
+# Lookup indexes; created for existing databases by migrations.py
+LOOKUP_INDEXES = [
+    db.Index('ix_channel_analysis_channel_date', ChannelAnalysis.channel_id, ChannelAnalysis.analysis_date.desc()),
+    db.Index('ix_optimal_timing_channel_date', OptimalTiming.channel_id, OptimalTiming.analysis_date.desc()),
+    db.Index('ix_title_analysis_title_hash', TitleAnalysis.title_hash, postgresql_using='hash'),
+    db.Index('ix_title_analysis_date', TitleAnalysis.analysis_date.desc()),
+    db.Index('ix_video_idea_analysis', VideoIdea.analysis_id),
+    db.Index('ix_video_statistics_channel_published', VideoStatistics.channel_id, VideoStatistics.published_at.desc())
+]
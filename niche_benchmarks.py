@@ -0,0 +1,201 @@
+import json
+import logging
+import math
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+import numpy as np
+
+# metric -> (log scale, low, high, bins) of the fixed histogram bins
+METRIC_BINS = {
+    'subscriber_count': (True, 0.0, 10.0, 200),
+    'views_per_video': (True, 0.0, 10.0, 200),
+    'overall_rating': (False, 0.0, 10.0, 100),
+    'channel_art_score': (False, 0.0, 10.0, 100),
+    'thumbnail_score': (False, 0.0, 10.0, 100),
+    'title_optimization_score': (False, 0.0, 10.0, 100)
+}
+
+
+def channel_metrics(analysis):
+    """Benchmarked metrics of a ChannelAnalysis row; None where unknown"""
+    return {
+        'subscriber_count': analysis.subscriber_count,
+        'views_per_video': analysis.view_count / analysis.video_count
+        if analysis.video_count and analysis.view_count is not None else None,
+        'overall_rating': analysis.overall_rating,
+        'channel_art_score': analysis.channel_art_score,
+        'thumbnail_score': analysis.thumbnail_score,
+        'title_optimization_score': analysis.title_optimization_score
+    }
+
+
+def _position(metric, value):
+    """Fractional bin position of a value; log-scale metrics are binned on log10(1 + value)"""
+    log_scale, low, high, bins = METRIC_BINS[metric]
+    scaled = math.log10(1 + max(0.0, value)) if log_scale else value
+    return min(bins - 1e-9, max(0.0, (scaled - low) / (high - low) * bins))
+
+
+def _value(metric, position):
+    """Inverse of _position"""
+    log_scale, low, high, bins = METRIC_BINS[metric]
+    scaled = low + position / bins * (high - low)
+    return 10 ** scaled - 1 if log_scale else scaled
+
+
+class NicheBenchmarks:
+    """Per-niche distributions of channel metrics, maintained incrementally
+
+    Each (niche, metric) keeps a histogram over fixed bins in the
+    NicheAggregate table, counting the latest analysis of every channel:
+    a new analysis adds its values and removes those of the channel's
+    previous analysis. Percentile ranks and medians are read from cached
+    cumulative histograms, so a lookup costs the same at any corpus size.
+    """
+
+    def __init__(self, cache_ttl=300):
+        self.cache_ttl = cache_ttl
+        self.lock = threading.Lock()
+        self.cache = {}  # niche -> (loaded_at, {metric: (histogram, cumulative)})
+
+    def record(self, analysis, previous=None):
+        """Count a new ChannelAnalysis in place of the channel's previous one"""
+        try:
+            changes = {}
+            for sign, row in ((-1, previous), (1, analysis)):
+                if row is None or not row.detected_niche:
+                    continue
+                for metric, value in channel_metrics(row).items():
+                    if value is not None:
+                        changes.setdefault((row.detected_niche, metric), Counter())[int(_position(metric, value))] += sign
+            self._apply(changes)
+
+        except Exception as e:
+            from app import db
+            db.session.rollback()
+            logging.error(f"Error recording niche benchmarks: {str(e)}")
+
+    def percentile_ranks(self, niche, metrics):
+        """{metric: {'value', 'percentile', 'niche_median', 'channels'}} within the niche"""
+        histograms = self._histograms(niche)
+        ranks = {}
+        for metric, value in metrics.items():
+            if value is None or metric not in histograms:
+                continue
+            histogram, cumulative = histograms[metric]
+            total = cumulative[-1]
+            if total <= 0:
+                continue
+
+            index = int(_position(metric, value))
+            # Channels in the same bin count as ties, half below
+            below = (cumulative[index - 1] if index else 0) + 0.5 * histogram[index]
+
+            median_index = int(np.searchsorted(cumulative, total / 2))
+            before = cumulative[median_index - 1] if median_index else 0
+            median_position = median_index + (total / 2 - before) / max(1, histogram[median_index])
+
+            ranks[metric] = {
+                'value': round(float(value), 2),
+                'percentile': round(100 * float(below) / total, 1),
+                'niche_median': round(_value(metric, median_position), 2),
+                'channels': int(total)
+            }
+        return ranks
+
+    def rebuild(self):
+        """Recount every niche from the latest analysis of each channel, in one streaming pass"""
+        try:
+            from app import db
+            from models import ChannelAnalysis, NicheAggregate
+
+            histograms = {}
+            last_channel = None
+            rows = (ChannelAnalysis.query
+                    .order_by(ChannelAnalysis.channel_id, ChannelAnalysis.analysis_date.desc())
+                    .yield_per(5000))
+            for row in rows:
+                if row.channel_id == last_channel:
+                    continue
+                last_channel = row.channel_id
+                if not row.detected_niche:
+                    continue
+                for metric, value in channel_metrics(row).items():
+                    if value is not None:
+                        histogram = histograms.setdefault((row.detected_niche, metric),
+                                                          np.zeros(METRIC_BINS[metric][3], dtype=np.int64))
+                        histogram[int(_position(metric, value))] += 1
+
+            NicheAggregate.query.delete()
+            for (niche, metric), histogram in histograms.items():
+                db.session.add(NicheAggregate(niche=niche, metric=metric, channel_count=int(histogram.sum()),
+                                              histogram=json.dumps(histogram.tolist())))
+            db.session.commit()
+
+            with self.lock:
+                self.cache.clear()
+            return {'niches': len({niche for niche, _ in histograms}), 'aggregates': len(histograms)}
+
+        except Exception as e:
+            logging.error(f"Error rebuilding niche benchmarks: {str(e)}")
+            return {'error': str(e)}
+
+    def _apply(self, changes):
+        if not changes:
+            return
+
+        from app import db
+        from models import NicheAggregate
+
+        for (niche, metric), deltas in changes.items():
+            record = (NicheAggregate.query
+                      .filter_by(niche=niche, metric=metric)
+                      .with_for_update()
+                      .first())
+            if record is None:
+                record = NicheAggregate(niche=niche, metric=metric,
+                                        histogram=json.dumps([0] * METRIC_BINS[metric][3]))
+                db.session.add(record)
+
+            histogram = json.loads(record.histogram)
+            for index, delta in deltas.items():
+                histogram[index] = max(0, histogram[index] + delta)
+            record.histogram = json.dumps(histogram)
+            record.channel_count = sum(histogram)
+            record.updated_date = datetime.utcnow()
+        db.session.commit()
+
+        with self.lock:
+            for niche, _ in changes:
+                self.cache.pop(niche, None)
+
+    def _histograms(self, niche):
+        """Cached {metric: (histogram, cumulative)} of a niche"""
+        now = time.monotonic()
+        with self.lock:
+            cached = self.cache.get(niche)
+        if cached and now - cached[0] < self.cache_ttl:
+            return cached[1]
+
+        try:
+            from models import NicheAggregate
+
+            histograms = {}
+            for metric, histogram in (NicheAggregate.query
+                                      .with_entities(NicheAggregate.metric, NicheAggregate.histogram)
+                                      .filter_by(niche=niche)
+                                      .all()):
+                if metric in METRIC_BINS:
+                    histogram = np.array(json.loads(histogram), dtype=np.int64)
+                    histograms[metric] = (histogram, np.cumsum(histogram))
+
+            with self.lock:
+                self.cache[niche] = (now, histograms)
+            return histograms
+
+        except Exception as e:
+            logging.error(f"Error loading niche benchmarks: {str(e)}")
+            return {}
@@ -0,0 +1,198 @@
+import logging
+import threading
+import time
+from collections import Counter
+
+import numpy as np
+
+from text_features import text_features
+
+# Clitic prefixes stripped from tokens, longest first ('والطبخ' -> 'طبخ')
+_PREFIXES = ('وال', 'بال', 'كال', 'فال', 'لل', 'ال')
+
+
+def niche_terms(text):
+    """Normalized Arabic tokens of a text with article/conjunction prefixes stripped"""
+    terms = []
+    for token in text_features(text).tokens:
+        for prefix in _PREFIXES:
+            if token.startswith(prefix) and len(token) - len(prefix) >= 2:
+                token = token[len(prefix):]
+                break
+        terms.append(token)
+    return terms
+
+
+class NicheClassifier:
+    """TF-IDF nearest-centroid niche classifier
+
+    Every niche gets a centroid of L2-normalized TF-IDF vectors: one seed
+    document made of its keyword list plus the text of stored channel
+    analyses labelled with it. Centroids are rebuilt from the database in
+    the background every refresh_interval seconds; a query is a sparse
+    vector over the known terms, scored against all centroids with one dot
+    product. Analyses the classifier labelled itself are never trained on.
+    """
+
+    def __init__(self, niche_keywords, refresh_interval=3600, max_channels=2000, titles_per_channel=20):
+        self.niche_keywords = niche_keywords
+        self.config = {
+            'refresh_interval': refresh_interval,
+            'max_channels': max_channels,
+            'titles_per_channel': titles_per_channel,
+            # Below any threshold the result is not confident enough to stand alone
+            'min_terms': 3,
+            'min_score': 0.3,
+            'min_share': 0.6
+        }
+        self.lock = threading.Lock()
+        self.model = None  # (built_at, niches, vocabulary, idf, centroids, documents)
+        self.worker = None
+
+    def classify(self, text, k=3):
+        """Top-k niches by cosine similarity to their centroids
+
+        Returns {'niches': [{'niche', 'score'}], 'confidence', 'confident',
+        'matched_terms', 'coverage', 'training_documents'}; confidence is
+        the top score's share of the top two, coverage the share of the
+        text's terms the model knows.
+        """
+        _, niches, vocabulary, idf, centroids, documents = self._current()
+
+        terms = Counter(niche_terms(text))
+        counts = {term: count for term, count in terms.items() if term in vocabulary}
+        if not counts:
+            return {'niches': [], 'confidence': 0.0, 'confident': False, 'matched_terms': 0,
+                    'coverage': 0.0, 'training_documents': documents}
+
+        indices = np.fromiter((vocabulary[term] for term in counts), dtype=np.intp, count=len(counts))
+        weights = (1 + np.log(np.fromiter(counts.values(), dtype=np.float64, count=len(counts)))) * idf[indices]
+
+        # Unknown terms weigh as much as a term no document contains, so
+        # every unrelated word in the text lowers all the scores
+        unknown = np.fromiter((count for term, count in terms.items() if term not in vocabulary), dtype=np.float64)
+        unknown_weights = (1 + np.log(unknown)) * (np.log(1 + documents) + 1)
+        norm = np.sqrt(weights @ weights + unknown_weights @ unknown_weights)
+        scores = centroids[:, indices] @ (weights / norm)
+
+        order = np.argsort(-scores, kind='stable')[:k]
+        top = [{'niche': niches[index], 'score': round(float(scores[index]), 4)}
+               for index in order if scores[index] > 0]
+
+        best = scores[order[0]]
+        runner_up = scores[order[1]] if len(order) > 1 else 0.0
+        confidence = float(best / (best + runner_up)) if best > 0 else 0.0
+
+        return {
+            'niches': top,
+            'confidence': round(confidence, 3),
+            'confident': bool(len(counts) >= self.config['min_terms']
+                              and best >= self.config['min_score']
+                              and confidence >= self.config['min_share']),
+            'matched_terms': len(counts),
+            'coverage': round(sum(counts.values()) / sum(terms.values()), 3),
+            'training_documents': documents
+        }
+
+    def _current(self):
+        """Current model; a stale one is rebuilt in the background and swapped in
+
+        Until the first database build finishes, the model is built from
+        the keyword seeds alone.
+        """
+        with self.lock:
+            if self.model is None:
+                self.model = self._build([])
+                refresh = True
+            else:
+                refresh = time.monotonic() - self.model[0] > self.config['refresh_interval']
+
+            if refresh and (self.worker is None or not self.worker.is_alive()):
+                self.worker = threading.Thread(target=self._rebuild, name='niche-classifier-rebuild', daemon=True)
+                self.worker.start()
+            return self.model
+
+    def _rebuild(self):
+        from app import app
+
+        try:
+            with app.app_context():
+                model = self._build(self._labelled_documents())
+            with self.lock:
+                self.model = model
+
+        except Exception as e:
+            logging.error(f"Error rebuilding niche classifier: {str(e)}")
+
+    def _labelled_documents(self):
+        """(niche, text) of stored channel analyses in a known niche, latest per channel"""
+        try:
+            from app import db
+            from models import ChannelAnalysis, VideoStatistics
+
+            analyses = (ChannelAnalysis.query
+                        .with_entities(ChannelAnalysis.channel_id, ChannelAnalysis.detected_niche,
+                                       ChannelAnalysis.channel_name, ChannelAnalysis.description)
+                        .filter(ChannelAnalysis.detected_niche.in_(list(self.niche_keywords)),
+                                db.or_(ChannelAnalysis.niche_source.is_(None),
+                                       ChannelAnalysis.niche_source != 'classifier'))
+                        .order_by(ChannelAnalysis.analysis_date.desc())
+                        .limit(self.config['max_channels'])
+                        .all())
+
+            latest = {}
+            for channel_id, niche, name, description in analyses:
+                latest.setdefault(channel_id, [niche, name or '', (description or '')[:500]])
+
+            titles = {}
+            if latest:
+                # Newest titles_per_channel titles of each channel, limited in the query
+                ranked = (db.select(VideoStatistics.channel_id, VideoStatistics.title,
+                                    db.func.row_number().over(partition_by=VideoStatistics.channel_id,
+                                                              order_by=VideoStatistics.published_at.desc())
+                                    .label('position'))
+                          .where(VideoStatistics.channel_id.in_(list(latest)))
+                          .subquery())
+                rows = db.session.execute(
+                    db.select(ranked.c.channel_id, ranked.c.title)
+                    .where(ranked.c.position <= self.config['titles_per_channel'])
+                    .order_by(ranked.c.channel_id, ranked.c.position)
+                ).all()
+                for channel_id, title in rows:
+                    titles.setdefault(channel_id, []).append(title)
+
+            return [(niche, ' '.join([name, description, *titles.get(channel_id, [])]))
+                    for channel_id, (niche, name, description) in latest.items()]
+
+        except Exception as e:
+            logging.error(f"Error loading labelled niche documents: {str(e)}")
+            return []
+
+    def _build(self, labelled):
+        niches = list(self.niche_keywords)
+        documents = [(niche, Counter(niche_terms(' '.join(keywords)))) for niche, keywords in self.niche_keywords.items()]
+        documents += [(niche, Counter(niche_terms(text))) for niche, text in labelled]
+        documents = [(niche, counts) for niche, counts in documents if counts]
+
+        vocabulary = {}
+        for _, counts in documents:
+            for term in counts:
+                vocabulary.setdefault(term, len(vocabulary))
+
+        document_frequency = np.zeros(len(vocabulary))
+        for _, counts in documents:
+            document_frequency[[vocabulary[term] for term in counts]] += 1
+        idf = np.log((1 + len(documents)) / (1 + document_frequency)) + 1
+
+        # Sum of normalized document vectors per niche, normalized: the centroid direction
+        niche_index = {niche: index for index, niche in enumerate(niches)}
+        centroids = np.zeros((len(niches), len(vocabulary)))
+        for niche, counts in documents:
+            indices = [vocabulary[term] for term in counts]
+            weights = (1 + np.log(np.fromiter(counts.values(), dtype=np.float64))) * idf[indices]
+            centroids[niche_index[niche], indices] += weights / np.linalg.norm(weights)
+        norms = np.linalg.norm(centroids, axis=1, keepdims=True)
+        centroids /= np.where(norms > 0, norms, 1)
+
+        logging.debug(f"Niche classifier built: {len(documents)} documents, {len(vocabulary)} terms")
+        return time.monotonic(), niches, vocabulary, idf, centroids, len(documents)
@@ -1,9 +1,11 @@
 import os
 import json
 import logging
-import re
 from collections import Counter
 from openai import OpenAI
+from keyword_matcher import keyword_matcher
+from niche_classifier import NicheClassifier
+from text_features import text_features
 
 class NicheDetector:
     def __init__(self):
@@ -61,6 +63,15 @@ class NicheDetector:
                 'محاكي', 'مغامرة', 'أكشن', 'إستراتيجية'
             ]
         }
+        
+        self.matcher = keyword_matcher
+        self.matcher.register('niche', self.niche_keywords)
+        
+        # Local TF-IDF classifier; stands in for the AI call when confident
+        self.classifier = NicheClassifier(
+            self.niche_keywords,
+            refresh_interval=int(os.environ.get('NICHE_CLASSIFIER_REFRESH', '3600'))
+        )
     
     def detect_niche(self, channel_info, videos):
         """Detect channel niche using multiple analysis methods"""
@@ -74,14 +85,20 @@ class NicheDetector:
             # Keyword-based analysis
             keyword_analysis = self._analyze_keywords(text_content)
             
-            # AI-powered niche detection
-            ai_analysis = self._get_ai_niche_analysis(channel_info, videos)
+            # TF-IDF similarity to niche centroids
+            classifier_analysis = self.classifier.classify(text_content.text)
+            
+            # AI-powered niche detection, unless the local classifier is confident
+            if classifier_analysis['confident']:
+                ai_analysis = self._get_local_niche_analysis(classifier_analysis)
+            else:
+                ai_analysis = self._get_ai_niche_analysis(channel_info, videos)
             
             # Content pattern analysis
             pattern_analysis = self._analyze_content_patterns(videos)
             
             # Combine all analyses
-            final_niche = self._combine_analyses(keyword_analysis, ai_analysis, pattern_analysis)
+            final_niche = self._combine_analyses(keyword_analysis, ai_analysis, pattern_analysis, classifier_analysis)
             
             result = {
                 'primary_niche': final_niche['primary'],
@@ -89,6 +106,8 @@ class NicheDetector:
                 'confidence_score': final_niche['confidence'],
                 'niche_evolution': pattern_analysis.get('evolution', 'مستقر'),
                 'keyword_analysis': keyword_analysis,
+                'niche_classification': classifier_analysis,
+                'niche_source': 'classifier' if classifier_analysis['confident'] else 'ai',
                 'content_consistency': pattern_analysis.get('consistency', 0.7),
                 'recommendations': ai_analysis.get('recommendations', []),
                 'growth_potential': ai_analysis.get('growth_potential', {}),
@@ -104,7 +123,7 @@ class NicheDetector:
             return self._get_demo_niche_detection(channel_info)
     
     def _collect_text_content(self, channel_info, videos):
-        """Collect all text content for analysis"""
+        """Collect all text content for analysis, as shared TextFeatures"""
         content = []
         
         # Channel info
@@ -117,22 +136,18 @@ class NicheDetector:
             content.append(video.get('title', ''))
             content.append(video.get('description', '')[:200])  # First 200 chars
         
-        return ' '.join(content).lower()
+        return text_features(' '.join(content))
     
     def _analyze_keywords(self, text_content):
         """Analyze keywords to determine niche"""
         niche_scores = {}
         
-        for niche, keywords in self.niche_keywords.items():
-            score = 0
-            matched_keywords = []
-            
-            for keyword in keywords:
-                # Count occurrences of each keyword
-                count = text_content.count(keyword)
-                if count > 0:
-                    score += count
-                    matched_keywords.append({'keyword': keyword, 'count': count})
+        # Occurrences of every niche keyword, from one pass over the text
+        hits = text_content.keyword_hits(self.matcher).get('niche', {})
+        
+        for niche in self.niche_keywords:
+            matched_keywords = [{'keyword': keyword, 'count': count} for keyword, count in hits.get(niche, [])]
+            score = sum(match['count'] for match in matched_keywords)
             
             if score > 0:
                 niche_scores[niche] = {
@@ -221,16 +236,33 @@ class NicheDetector:
             
         except Exception as e:
             logging.error(f"Error in AI niche analysis: {str(e)}")
-            return {
-                'primary_niche': 'عام',
-                'secondary_niches': [],
-                'confidence': 0.5,
-                'growth_potential': {'level': 'متوسط'},
-                'competition_level': 'متوسط',
-                'target_audience': {'age': '18-35'},
-                'monetization': ['إعلانات'],
-                'recommendations': ['تحسين المحتوى']
-            }
+            return self._get_default_niche_analysis()
+    
+    def _get_local_niche_analysis(self, classifier_analysis):
+        """AI-analysis shaped result from a confident classifier result"""
+        niches = [entry['niche'] for entry in classifier_analysis['niches']]
+        analysis = self._get_default_niche_analysis()
+        analysis.update({
+            'primary_niche': niches[0],
+            'secondary_niches': niches[1:],
+            'confidence': classifier_analysis['confidence'],
+            'target_audience': {'age': '18-35', 'interests': niches[:1]},
+            'recommendations': [f'التركيز على محتوى {niches[0]}', 'استخدام كلمات مفتاحية خاصة بالمجال']
+        })
+        return analysis
+    
+    def _get_default_niche_analysis(self):
+        """Neutral niche analysis used when no AI result is available"""
+        return {
+            'primary_niche': 'عام',
+            'secondary_niches': [],
+            'confidence': 0.5,
+            'growth_potential': {'level': 'متوسط'},
+            'competition_level': 'متوسط',
+            'target_audience': {'age': '18-35'},
+            'monetization': ['إعلانات'],
+            'recommendations': ['تحسين المحتوى']
+        }
     
     def _analyze_content_patterns(self, videos):
         """Analyze content patterns and consistency"""
@@ -243,8 +275,7 @@ class NicheDetector:
         # Check for common words across titles
         all_words = []
         for title in titles:
-            words = re.findall(r'\w+', title.lower())
-            all_words.extend(words)
+            all_words.extend(text_features(title).tokens)
         
         word_freq = Counter(all_words)
         common_words = [word for word, count in word_freq.most_common(10) if count > 1]
@@ -254,12 +285,9 @@ class NicheDetector:
         
         # Analyze evolution (simple approach)
         if len(videos) > 5:
-            recent_titles = ' '.join(titles[:5]).lower()
-            older_titles = ' '.join(titles[-5:]).lower()
-            
             # Simple similarity check
-            recent_words = set(re.findall(r'\w+', recent_titles))
-            older_words = set(re.findall(r'\w+', older_titles))
+            recent_words = {token for title in titles[:5] for token in text_features(title).tokens}
+            older_words = {token for title in titles[-5:] for token in text_features(title).tokens}
             
             overlap = len(recent_words.intersection(older_words))
             total_unique = len(recent_words.union(older_words))
@@ -284,20 +312,29 @@ class NicheDetector:
             'content_variety': len(set(titles)) / len(titles) if titles else 0
         }
     
-    def _combine_analyses(self, keyword_analysis, ai_analysis, pattern_analysis):
+    def _combine_analyses(self, keyword_analysis, ai_analysis, pattern_analysis, classifier_analysis=None):
         """Combine different analyses to determine final niche"""
         # Get top niche from keyword analysis
         keyword_niche = None
         if keyword_analysis['top_niches']:
             keyword_niche = keyword_analysis['top_niches'][0][0]
         
+        # Get top niches from the classifier
+        classified_niches = [entry['niche'] for entry in (classifier_analysis or {}).get('niches', [])]
+        
         # Get AI suggested niche
         ai_niche = ai_analysis.get('primary_niche', 'عام')
         
         # Determine primary niche
-        if ai_niche and ai_niche != 'عام':
+        if classifier_analysis and classifier_analysis['confident']:
+            primary_niche = classified_niches[0]
+            confidence = classifier_analysis['confidence']
+        elif ai_niche and ai_niche != 'عام':
             primary_niche = ai_niche
             confidence = ai_analysis.get('confidence', 0.7)
+        elif classified_niches:
+            primary_niche = classified_niches[0]
+            confidence = 0.6 * classifier_analysis['confidence']
         elif keyword_niche:
             primary_niche = keyword_niche
             confidence = 0.6
@@ -308,10 +345,15 @@ class NicheDetector:
         # Determine secondary niches
         secondary_niches = []
         
+        # Add from the classifier
+        for niche in classified_niches:
+            if niche not in secondary_niches and niche != primary_niche:
+                secondary_niches.append(niche)
+        
         # Add from keyword analysis
         if keyword_analysis['top_niches']:
             for niche, data in keyword_analysis['top_niches'][1:4]:
-                if niche != primary_niche:
+                if niche not in secondary_niches and niche != primary_niche:
                     secondary_niches.append(niche)
         
         # Add from AI analysis
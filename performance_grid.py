@@ -0,0 +1,265 @@
+from datetime import datetime, timezone
+from zoneinfo import ZoneInfo
+
+import numpy as np
+
+DAYS, HOURS = 7, 24
+WEEK_HOURS = DAYS * HOURS
+
+
+def parse_timestamps(values):
+    """UTC seconds (int64) of ISO-8601 strings or datetimes; -1 where unparseable"""
+    # Fast path: YouTube's 'YYYY-MM-DDTHH:MM:SS[.fff]Z' strings, all at once
+    if all(isinstance(value, str) and value.endswith('Z') for value in values):
+        try:
+            return np.array([value[:19] for value in values], dtype='datetime64[s]').astype(np.int64)
+        except ValueError:
+            pass
+
+    seconds = np.full(len(values), -1, dtype=np.int64)
+    for index, value in enumerate(values):
+        try:
+            if isinstance(value, str):
+                value = datetime.fromisoformat(value.replace('Z', '+00:00'))
+            if value.tzinfo is None:
+                value = value.replace(tzinfo=timezone.utc)
+            seconds[index] = int(value.timestamp())
+        except (AttributeError, TypeError, ValueError):
+            continue
+    return seconds
+
+
+def local_week_hours(utc_seconds, timezone_name):
+    """Hour of the local week (0 = Monday 00:00) of each UTC timestamp
+
+    UTC offsets are looked up once per distinct UTC day, and per hour only
+    on days where the offset changes (DST transitions).
+    """
+    zone = ZoneInfo(timezone_name)
+
+    def offset(seconds):
+        return int(datetime.fromtimestamp(int(seconds), zone).utcoffset().total_seconds())
+
+    days, day_index = np.unique(utc_seconds // 86400, return_inverse=True)
+    day_start = np.array([offset(day * 86400) for day in days], dtype=np.int64)
+    day_end = np.array([offset(day * 86400 + 86399) for day in days], dtype=np.int64)
+    offsets = day_start[day_index]
+
+    changing = np.flatnonzero(day_start[day_index] != day_end[day_index])
+    for index in changing:
+        offsets[index] = offset(utc_seconds[index])
+
+    local = utc_seconds + offsets
+    # 1970-01-01 was a Thursday (Monday = 0)
+    weekday = (local // 86400 + 3) % DAYS
+    return (weekday * HOURS + (local // 3600) % HOURS).astype(np.intp)
+
+
+def _circular(values, kernel):
+    """Circular convolution of a 1D array with a centered odd-length kernel"""
+    radius = len(kernel) // 2
+    return sum(weight * np.roll(values, shift) for shift, weight in zip(range(radius, -radius - 1, -1), kernel))
+
+
+def _smooth_week(values, hour_kernel, day_weight):
+    """Circular smoothing over neighbouring hours (across midnight) and days"""
+    smoothed = _circular(values, hour_kernel)
+    if day_weight:
+        smoothed = (1 - 2 * day_weight) * smoothed + day_weight * (np.roll(smoothed, HOURS) + np.roll(smoothed, -HOURS))
+    return smoothed
+
+
+def optimize_schedule(gains, k, min_gap=24, top=5):
+    """Top k-slot schedules on a circular week maximizing the summed gain
+
+    Slots must be at least min_gap hours apart, around the week boundary
+    too. Exact dynamic program, vectorized over the schedule's first
+    (earliest) cell: rotating the week to start there makes the rest a
+    linear problem, solved layer by layer with the top schedules kept per
+    cell. Returns [(total gain, sorted cell indices)], best first.
+    """
+    gains = np.asarray(gains, dtype=np.float64)
+    size = len(gains)
+    if k <= 0 or k * min_gap > size:
+        return []
+
+    offsets = np.arange(size)
+    rows = offsets[:, None]
+    rotated = gains[(rows + offsets[None, :]) % size]
+    # Later slots must fall after the first one within the week
+    allowed = offsets[None, :] < size - rows
+    ranks = np.broadcast_to(np.arange(top), (size, top))
+
+    # With j slots placed, the last one sits at offset (j - 1) * min_gap + step, step in 0..span
+    span = size - k * min_gap
+    # costs[first, step, rank]: minus the rank-th best total of a partial
+    # schedule ending at that step (negated so ascending sorts need no copy)
+    costs = np.full((size, span + 1, top), np.inf)
+    costs[:, 0, 0] = -rotated[:, 0]
+    # Per added slot, which candidate each prefix entry took: rank r < top
+    # of the previous step's prefix, or top + r for rank r at the step itself
+    picks = []
+
+    for placed in range(1, k):
+        # Best partial schedules ending at or before each step
+        prefix = np.empty_like(costs)
+        step_picks = np.empty(costs.shape, dtype=np.int8)
+        best = prefix[:, 0] = costs[:, 0]
+        step_picks[:, 0] = top + ranks
+        for step in range(1, span + 1):
+            candidates = np.concatenate([best, costs[:, step]], axis=1)
+            pick = step_picks[:, step] = np.argsort(candidates, axis=1, kind='stable')[:, :top]
+            best = prefix[:, step] = candidates[rows, pick]
+
+        window = slice(placed * min_gap, placed * min_gap + span + 1)
+        costs = np.where(allowed[:, window, None], prefix - rotated[:, window, None], np.inf)
+        picks.append(step_picks)
+
+    flat = costs.ravel()
+    order = np.argsort(flat, kind='stable')[:top]
+    schedules = []
+    for index in order[np.isfinite(flat[order])]:
+        first, step, rank = np.unravel_index(index, costs.shape)
+        cells = [(first + (k - 1) * min_gap + step) % size]
+        for placed, step_picks in zip(range(k - 2, -1, -1), reversed(picks)):
+            # Walk back through the prefix to the step the entry came from
+            pick = step_picks[first, step, rank]
+            while pick < top:
+                step, rank = step - 1, pick
+                pick = step_picks[first, step, rank]
+            rank = pick - top
+            cells.append((first + placed * min_gap + step) % size)
+        schedules.append((-float(flat[index]), sorted(int(cell) for cell in cells)))
+    return schedules
+
+
+class PerformanceGrid:
+    """Age-normalized performance of a channel's uploads per local weekday and hour
+
+    Each video's performance is its log views relative to what the
+    channel's videos of the same age usually get (a log-log fit of views
+    on age), plus a smaller engagement-rate term. Cells hold smoothed sums
+    shrunk toward the channel average (0) by prior_strength videos, so
+    sparse cells report little lift and low confidence.
+    """
+
+    def __init__(self, published, views, likes=None, comments=None, timezone_name='Asia/Riyadh', now=None,
+                 prior_strength=2.0, engagement_weight=0.3, hour_kernel=(0.25, 0.5, 0.25), day_weight=0.1):
+        seconds = parse_timestamps(list(published))
+        views = np.asarray(views, dtype=np.float64)
+        likes = np.zeros_like(views) if likes is None else np.asarray(likes, dtype=np.float64)
+        comments = np.zeros_like(views) if comments is None else np.asarray(comments, dtype=np.float64)
+
+        valid = seconds >= 0
+        seconds, views, likes, comments = seconds[valid], views[valid], likes[valid], comments[valid]
+        now = int((now or datetime.now(timezone.utc)).timestamp())
+
+        self.timezone = timezone_name
+        self.videos = len(seconds)
+        self.week_hours = local_week_hours(seconds, timezone_name) if self.videos else np.zeros(0, dtype=np.intp)
+
+        view_score = self._age_normalized_views(views, np.maximum(now - seconds, 3600) / 86400)
+        engagement_score = self._engagement_score(views, likes + comments)
+        score = view_score + engagement_weight * engagement_score
+
+        self.uploads = np.bincount(self.week_hours, minlength=WEEK_HOURS)
+        counts = _smooth_week(self.uploads.astype(np.float64), hour_kernel, day_weight)
+
+        def cell_means(values):
+            sums = _smooth_week(np.bincount(self.week_hours, weights=values, minlength=WEEK_HOURS),
+                                hour_kernel, day_weight)
+            return sums / (counts + prior_strength)
+
+        self.prior_strength = prior_strength
+        self.score = cell_means(score)
+        self.view_score = cell_means(view_score)
+        self.engagement_score = cell_means(engagement_score)
+        self.confidence = counts / (counts + prior_strength)
+
+        # Day and hour marginals, from the raw scores
+        self.day_score = self._shrunk_marginal(score, self.week_hours // HOURS, DAYS)
+        hour_sums = np.bincount(self.week_hours % HOURS, weights=score, minlength=HOURS)
+        hour_counts = np.bincount(self.week_hours % HOURS, minlength=HOURS).astype(np.float64)
+        self.hour_score = (_circular(hour_sums, hour_kernel) /
+                           (_circular(hour_counts, hour_kernel) + prior_strength))
+        self.day_uploads = np.bincount(self.week_hours // HOURS, minlength=DAYS)
+        self.hour_uploads = hour_counts.astype(np.int64)
+
+    def best_days(self, k=3):
+        """Indices (Monday = 0) of the k days with the highest lift among days with uploads"""
+        return self._top(self.day_score, self.day_uploads, k)
+
+    def best_hours(self, k=3):
+        """The k local hours with the highest lift, smoothed over neighbouring hours"""
+        return self._top(self.hour_score, _circular(self.hour_uploads.astype(np.float64), np.ones(3)), k)
+
+    def best_cells(self, k=3):
+        """(day, hour) of the k cells with the highest lift"""
+        return [divmod(int(cell), HOURS) for cell in self._top(self.score, self.confidence, k)]
+
+    def best_schedules(self, uploads_per_week, min_gap_hours=24, top=5):
+        """Top weekly schedules of uploads_per_week slots, at least min_gap_hours apart
+
+        Each schedule lists (day, hour) slots with their expected lift and
+        the schedule's mean expected lift per upload.
+        """
+        lift = np.expm1(self.score)
+        schedules = []
+        for total, cells in optimize_schedule(lift, uploads_per_week, min_gap_hours, top):
+            schedules.append({
+                'slots': [divmod(cell, HOURS) for cell in cells],
+                'slot_lift': [float(lift[cell]) for cell in cells],
+                'slot_confidence': [float(self.confidence[cell]) for cell in cells],
+                'expected_uplift': total / uploads_per_week
+            })
+        return schedules
+
+    def to_dict(self, day_names):
+        """JSON-ready grid: lift is the expected relative change vs a typical upload"""
+        def grid(values, digits=3):
+            return np.round(values.reshape(DAYS, HOURS), digits).tolist()
+
+        return {
+            'timezone': self.timezone,
+            'videos': self.videos,
+            'days': list(day_names),
+            'lift': grid(np.expm1(self.score)),
+            'view_lift': grid(np.expm1(self.view_score)),
+            'engagement_lift': grid(np.expm1(self.engagement_score)),
+            'confidence': grid(self.confidence),
+            'uploads': self.uploads.reshape(DAYS, HOURS).tolist(),
+            'day_lift': {day_names[day]: round(float(np.expm1(self.day_score[day])), 3) for day in range(DAYS)},
+            'hour_lift': np.round(np.expm1(self.hour_score), 3).tolist()
+        }
+
+    @staticmethod
+    def _age_normalized_views(views, age_days):
+        """Log views minus a least-squares fit of log views on log age"""
+        log_views = np.log1p(views)
+        log_age = np.log(age_days)
+        if len(views) < 3 or np.ptp(log_age) < 1e-6:
+            return log_views - (np.median(log_views) if len(views) else 0)
+        slope, intercept = np.polyfit(log_age, log_views, 1)
+        return log_views - (intercept + slope * log_age)
+
+    @staticmethod
+    def _engagement_score(views, interactions):
+        """Log engagement rate relative to the channel median; 0 for unwatched videos"""
+        watched = views > 0
+        score = np.zeros_like(views)
+        if watched.any():
+            rate = np.log((interactions[watched] + 1) / views[watched])
+            score[watched] = rate - np.median(rate)
+        return score
+
+    def _shrunk_marginal(self, score, index, size):
+        sums = np.bincount(index, weights=score, minlength=size)
+        counts = np.bincount(index, minlength=size)
+        return sums / (counts + self.prior_strength)
+
+    @staticmethod
+    def _top(values, support, k):
+        candidates = np.flatnonzero(support > 0)
+        order = candidates[np.argsort(-values[candidates], kind='stable')]
+        return [int(index) for index in order[:k]]
+
@@ -0,0 +1,150 @@
+import os
+import atexit
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import shared_memory
+
+import numpy as np
+from PIL import Image
+
+# Analyzer instance owned by each worker process
+_worker_analyzer = None
+
+
+def _init_worker():
+    """Create the worker's in-process analyzer once, at process start"""
+    global _worker_analyzer
+    from clip_analyzer import CLIPVisualAnalyzer
+    _worker_analyzer = CLIPVisualAnalyzer(process_workers=0)
+
+
+def _warm_up():
+    """No-op task used to force worker start-up and imports"""
+    return os.getpid()
+
+
+def _run_metrics(method_name, shm_name, shape, args, source_size=None):
+    """Rebuild the image context from shared memory and run one analyzer method"""
+    from clip_analyzer import ImageFeatures, ImageBatch
+
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        pixels = np.ndarray(shape, dtype=np.uint8, buffer=shm.buf)
+        # fromarray copies RGB pixels into PIL's own storage, so nothing
+        # keeps referencing the shared buffer once this block ends
+        if len(shape) == 4:
+            context = ImageBatch([Image.fromarray(frame) for frame in pixels])
+        else:
+            image = Image.fromarray(pixels)
+            if source_size:
+                image.info['source_size'] = source_size
+            context = ImageFeatures(image)
+        del pixels
+    finally:
+        shm.close()
+
+    return getattr(_worker_analyzer, method_name)(context, *args)
+
+
+class ImageProcessPool:
+    """Process pool that runs CLIPVisualAnalyzer metrics outside the GIL
+
+    Decoded pixels are handed to workers through shared memory instead of
+    being pickled. Any pool failure is reported by returning None from
+    submit() so callers can fall back to in-process execution.
+    """
+
+    def __init__(self, workers, warm_up=True, timeout=30):
+        self.workers = workers
+        self.timeout = timeout
+        self.available = False
+        self.executor = None
+
+        try:
+            self.executor = ProcessPoolExecutor(
+                max_workers=workers,
+                # spawn keeps workers independent of the parent's threads and locks
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_init_worker
+            )
+            self.available = True
+
+            if warm_up:
+                self.warm_up()
+
+            atexit.register(self.shutdown)
+
+        except Exception as e:
+            logging.error(f"Error starting image process pool: {str(e)}")
+            self._disable()
+
+    def warm_up(self):
+        """Start every worker process ahead of the first request"""
+        try:
+            futures = [self.executor.submit(_warm_up) for _ in range(self.workers)]
+            pids = {future.result(timeout=self.timeout) for future in futures}
+            logging.info(f"Image process pool ready with {len(pids)} workers")
+        except Exception as e:
+            logging.error(f"Error warming up image process pool: {str(e)}")
+            self._disable()
+
+    def submit(self, method_name, pixels, args=(), source_size=None):
+        """Schedule an analyzer method on a pixel array, or return None"""
+        if not self.available:
+            return None
+
+        shm = None
+        try:
+            shm = shared_memory.SharedMemory(create=True, size=max(1, pixels.nbytes))
+            np.ndarray(pixels.shape, dtype=np.uint8, buffer=shm.buf)[...] = pixels
+
+            future = self.executor.submit(_run_metrics, method_name, shm.name, pixels.shape, args, source_size)
+            future.add_done_callback(lambda _: self._release(shm))
+            return future
+
+        except Exception as e:
+            logging.error(f"Error submitting to image process pool: {str(e)}")
+            if shm is not None:
+                self._release(shm)
+            if isinstance(e, BrokenProcessPool):
+                self._disable()
+            return None
+
+    def result(self, future):
+        """Wait for a submitted task; None if the pool failed or timed out
+
+        Exceptions raised by the analyzer method itself are re-raised, just
+        as they would be in-process.
+        """
+        try:
+            return future.result(timeout=self.timeout)
+        except BrokenProcessPool as e:
+            logging.error(f"Image process pool broke: {str(e)}")
+            self._disable()
+            return None
+        except TimeoutError:
+            logging.error("Image process pool task timed out")
+            future.cancel()
+            return None
+
+    def shutdown(self):
+        self.available = False
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def _disable(self):
+        """Stop using the pool; callers fall back to in-process execution"""
+        if self.available or self.executor is not None:
+            logging.warning("Image process pool disabled, analyzing in-process")
+        self.shutdown()
+        self.executor = None
+
+    @staticmethod
+    def _release(shm):
+        try:
+            shm.close()
+            shm.unlink()
+        except FileNotFoundError:
+            pass
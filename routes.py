@@ -1,4 +1,6 @@
-from flask import render_template, request, flash, redirect, url_for, jsonify
+from flask import render_template, request, flash, redirect, url_for, jsonify, Response, stream_with_context
+from werkzeug.exceptions import RequestEntityTooLarge
+from werkzeug.formparser import parse_form_data
 from app import app, db
 from models import ChannelAnalysis, VideoIdea, TitleAnalysis, OptimalTiming
 from youtube_service import YouTubeService
@@ -7,6 +9,8 @@ from title_analyzer import TitleAnalyzer
 from success_predictor import SuccessPredictor
 from timing_optimizer import TimingOptimizer
 from niche_detector import NicheDetector
+from niche_benchmarks import NicheBenchmarks, channel_metrics
+import io
 import json
 import logging
 import os
@@ -18,6 +22,7 @@ title_analyzer = TitleAnalyzer()
 success_predictor = SuccessPredictor()
 timing_optimizer = TimingOptimizer()
 niche_detector = NicheDetector()
+niche_benchmarks = NicheBenchmarks()
 
 @app.route('/')
 def index():
@@ -64,15 +69,28 @@ def analyze_channel():
         # Get recent videos
         videos = youtube_service.get_channel_videos(channel_id, max_results=20)
         
+        # Keep their observed statistics as training data for the success model
+        success_predictor.record_videos(channel_id, videos)
+        timing_optimizer.cadence.invalidate(channel_id)
+        
         # Perform comprehensive AI analysis
         analysis_result = ai_analyzer.analyze_channel(channel_info, videos)
         
+        # Score the channel's thumbnails locally with the visual metrics
+        thumbnail_analysis = ai_analyzer.clip_analyzer.analyze_thumbnails_batch(videos)
+        if thumbnail_analysis['analyzed_count']:
+            # Visual scores are 0-100; channel scores are on a 1-10 scale
+            analysis_result['thumbnail_score'] = round(thumbnail_analysis['channel_thumbnail_score'] / 10, 1)
+        
         # Detect niche
         niche_analysis = niche_detector.detect_niche(channel_info, videos)
         
         # Analyze optimal timing
         timing_analysis = timing_optimizer.analyze_optimal_timing(channel_info, videos)
         
+        # The channel's previous analysis, replaced in the niche benchmarks by this one
+        previous_analysis = ChannelAnalysis.latest_for_channel(channel_id)
+        
         # Save analysis to database
         analysis = ChannelAnalysis(
             channel_id=channel_id,
@@ -82,6 +100,7 @@ def analyze_channel():
             view_count=channel_info.get('view_count', 0),
             description=channel_info.get('description', ''),
             detected_niche=niche_analysis.get('primary_niche', ''),
+            niche_source=niche_analysis.get('niche_source'),
             channel_art_score=analysis_result.get('channel_art_score', 0),
             thumbnail_score=analysis_result.get('thumbnail_score', 0),
             title_optimization_score=analysis_result.get('title_optimization_score', 0),
@@ -89,6 +108,7 @@ def analyze_channel():
             analysis_details=json.dumps({
                 'niche_analysis': niche_analysis,
                 'timing_analysis': timing_analysis,
+                'thumbnail_analysis': thumbnail_analysis,
                 **analysis_result.get('details', {})
             }),
             recommendations=json.dumps(analysis_result.get('recommendations', []))
@@ -97,6 +117,8 @@ def analyze_channel():
         db.session.add(analysis)
         db.session.commit()
         
+        niche_benchmarks.record(analysis, previous_analysis)
+        
         # Save timing analysis
         timing_record = OptimalTiming(
             channel_id=channel_id,
@@ -133,6 +155,7 @@ def analyze_title():
     title = request.form.get('title', '').strip()
     category = request.form.get('category', 'عام')
     target_audience = request.form.get('target_audience', '')
+    channel_id = request.form.get('channel_id', '').strip() or None
     
     if not title:
         flash('يرجى إدخال عنوان للتحليل', 'error')
@@ -143,7 +166,7 @@ def analyze_title():
         title_analysis_result = title_analyzer.analyze_title(title, category, target_audience)
         
         # Predict success probability
-        success_analysis = success_predictor.predict_success(title, category)
+        success_analysis = success_predictor.predict_success(title, category, channel_id=channel_id)
         
         # Get optimal timing recommendations
         timing_recommendations = timing_optimizer.get_timing_recommendations(category, target_audience)
@@ -249,6 +272,249 @@ def quick_analysis():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/quick_analysis/batch', methods=['POST'])
+def quick_analysis_batch():
+    """Quick analysis of many titles in one request
+    
+    Body: {"titles": [...], "stream": false}. Results come back in input
+    order; with "stream": true (or Accept: application/x-ndjson) they are
+    streamed as one JSON line per title, computed chunk by chunk.
+    """
+    data = request.get_json(silent=True) or {}
+    titles = data.get('titles')
+    limits = title_analyzer.batch_limits
+    
+    if not isinstance(titles, list) or not titles:
+        return jsonify({'error': 'قائمة عناوين مطلوبة'}), 400
+    if len(titles) > limits['max_titles']:
+        return jsonify({'error': f'الحد الأقصى {limits["max_titles"]} عنوان في الطلب الواحد'}), 400
+    if not all(isinstance(title, str) for title in titles):
+        return jsonify({'error': 'يجب أن تكون كل العناوين نصوصاً'}), 400
+    
+    titles = [title.strip() for title in titles]
+    
+    def analyze(chunk):
+        # Blank titles keep their slot so results stay aligned with the input
+        valid = [title for title in chunk if title]
+        results = iter(title_analyzer.quick_analyze_batch(valid))
+        return [{'title': title, **next(results)} if title else {'title': title, 'error': 'عنوان مطلوب'}
+                for title in chunk]
+    
+    stream = data.get('stream') or request.accept_mimetypes.best == 'application/x-ndjson'
+    
+    try:
+        if not stream:
+            return jsonify({'count': len(titles), 'results': analyze(titles)})
+        
+        def generate():
+            chunk_size = limits['stream_chunk']
+            for start in range(0, len(titles), chunk_size):
+                for index, result in enumerate(analyze(titles[start:start + chunk_size]), start):
+                    yield json.dumps({'index': index, **result}, ensure_ascii=False) + '\n'
+        
+        return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/title_variants', methods=['POST'])
+def title_variants():
+    """Ranked local rewrites of a title, optionally polished by the AI"""
+    data = request.get_json(silent=True) or {}
+    title = data.get('title', '').strip()
+    
+    if not title:
+        return jsonify({'error': 'العنوان مطلوب'}), 400
+    
+    try:
+        count = max(1, min(50, int(data.get('count', 10))))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'عدد البدائل يجب أن يكون رقماً صحيحاً'}), 400
+    
+    try:
+        result = title_analyzer.generate_title_variants(title, count, polish=bool(data.get('polish')))
+        return jsonify(result)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/forecast_views', methods=['POST'])
+def forecast_views():
+    """Success prediction with views forecast from a channel's own videos"""
+    data = request.get_json(silent=True) or {}
+    title = data.get('title', '').strip()
+    channel_id = data.get('channel_id', '').strip()
+    
+    if not title or not channel_id:
+        return jsonify({'error': 'العنوان ومعرف القناة مطلوبان'}), 400
+    
+    try:
+        result = success_predictor.predict_success(title, data.get('category', 'عام'), channel_id=channel_id)
+        return jsonify(result)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/optimal_schedule', methods=['POST'])
+def optimal_schedule():
+    """Best weekly publishing schedules from a channel's stored video performance"""
+    data = request.get_json(silent=True) or {}
+    channel_id = data.get('channel_id', '').strip()
+    
+    if not channel_id:
+        return jsonify({'error': 'معرف القناة مطلوب'}), 400
+    
+    try:
+        uploads_per_week = int(data.get('uploads_per_week', 3))
+        min_gap_hours = int(data.get('min_gap_hours') or 0) or None
+    except (TypeError, ValueError):
+        return jsonify({'error': 'عدد الفيديوهات والفاصل الزمني يجب أن يكونا أرقاماً صحيحة'}), 400
+    
+    try:
+        result = timing_optimizer.optimize_schedule({'id': channel_id}, [], uploads_per_week, min_gap_hours)
+        return jsonify(result)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/niche_rank/<channel_id>')
+def niche_rank(channel_id):
+    """Percentile ranks of a channel's latest analysis within its niche"""
+    try:
+        analysis = ChannelAnalysis.latest_for_channel(channel_id)
+        if analysis is None:
+            return jsonify({'error': 'لا يوجد تحليل محفوظ لهذه القناة'}), 404
+        if not analysis.detected_niche:
+            return jsonify({'error': 'لم يتم تحديد مجال هذه القناة'}), 404
+        
+        return jsonify({
+            'channel_id': channel_id,
+            'niche': analysis.detected_niche,
+            'analysis_date': analysis.analysis_date.isoformat(),
+            'ranks': niche_benchmarks.percentile_ranks(analysis.detected_niche, channel_metrics(analysis))
+        })
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/channel_history/<channel_id>')
+def channel_history(channel_id):
+    """A channel's stored analyses, newest first"""
+    try:
+        limit = min(max(request.args.get('limit', 20, type=int), 1), 100)
+        return jsonify({
+            'channel_id': channel_id,
+            'analyses': [
+                {
+                    'id': analysis.id,
+                    'analysis_date': analysis.analysis_date.isoformat(),
+                    'subscriber_count': analysis.subscriber_count,
+                    'view_count': analysis.view_count,
+                    'video_count': analysis.video_count,
+                    'overall_rating': analysis.overall_rating,
+                    'detected_niche': analysis.detected_niche
+                }
+                for analysis in ChannelAnalysis.history_for_channel(channel_id, limit)
+            ]
+        })
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/title_history')
+def title_history():
+    """Earlier analyses of the same title"""
+    try:
+        title = request.args.get('title', '').strip()
+        if not title:
+            return jsonify({'error': 'يرجى إدخال عنوان'}), 400
+        
+        limit = min(max(request.args.get('limit', 20, type=int), 1), 100)
+        return jsonify({
+            'title': title,
+            'analyses': [
+                {
+                    'id': analysis.id,
+                    'analysis_date': analysis.analysis_date.isoformat(),
+                    'attractiveness_score': analysis.attractiveness_score,
+                    'success_probability': analysis.success_probability,
+                    'category': analysis.category
+                }
+                for analysis in TitleAnalysis.history_for_title(title, limit)
+            ]
+        })
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/niche_benchmarks/rebuild', methods=['POST'])
+def rebuild_niche_benchmarks():
+    """Recount the per-niche aggregates from all stored channel analyses"""
+    try:
+        result = niche_benchmarks.rebuild()
+        return jsonify(result), 500 if 'error' in result else 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/success_model/train', methods=['POST'])
+def train_success_model():
+    """Refit the success model on the stored video statistics"""
+    try:
+        result = success_predictor.model.train()
+        return jsonify(result), 200 if result.get('trained') else 409
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def _in_memory_stream(total_content_length, content_type, filename, content_length=None):
+    """Keep uploaded files in memory; Werkzeug spools large ones to temp files by default"""
+    return io.BytesIO()
+
+@app.route('/api/compare_thumbnails', methods=['POST'])
+def compare_thumbnails():
+    """Rank uploaded thumbnail variants by predicted YouTube performance"""
+    clip_analyzer = ai_analyzer.clip_analyzer
+    limits = clip_analyzer.ingest_limits
+    
+    try:
+        _, _, files = parse_form_data(
+            request.environ,
+            stream_factory=_in_memory_stream,
+            max_content_length=limits['max_bytes'] * limits['max_uploads'],
+            max_form_parts=limits['max_uploads'] + 10
+        )
+    except RequestEntityTooLarge:
+        return jsonify({'error': 'حجم الملفات المرفوعة أكبر من المسموح'}), 413
+    
+    uploads = [(upload.filename or f'image-{index + 1}', upload.stream)
+               for index, upload in enumerate(files.getlist('images'))]
+    
+    if not uploads:
+        return jsonify({'error': 'صورة واحدة على الأقل مطلوبة'}), 400
+    if len(uploads) > limits['max_uploads']:
+        return jsonify({'error': f'الحد الأقصى {limits["max_uploads"]} صور في الطلب الواحد'}), 400
+    
+    try:
+        for _, stream in uploads:
+            stream.seek(0)
+        result = clip_analyzer.compare_thumbnails(uploads)
+        return jsonify(result)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/similar_thumbnails', methods=['POST'])
+def similar_thumbnails():
+    """Find analyzed thumbnails that look like the given one"""
+    data = request.get_json() or {}
+    thumbnail_url = data.get('thumbnail_url', '').strip()
+    
+    if not thumbnail_url:
+        return jsonify({'error': 'رابط الصورة المصغرة مطلوب'}), 400
+    
+    try:
+        k = min(max(int(data.get('k', 10)), 1), 100)
+        min_score = data.get('min_score')
+        min_score = float(min_score) if min_score is not None else None
+        
+        result = ai_analyzer.clip_analyzer.find_similar_thumbnails(thumbnail_url, k=k, min_score=min_score)
+        return jsonify(result)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @app.errorhandler(404)
 def page_not_found(e):
     return render_template('index.html'), 404
@@ -0,0 +1,259 @@
+import os
+import json
+import logging
+import threading
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from text_features import text_features
+
+
+def _parse_published_at(value):
+    """Naive UTC datetime from a YouTube publishedAt string, or None"""
+    try:
+        published = datetime.fromisoformat(value.replace('Z', '+00:00'))
+        return published.replace(tzinfo=None) - (published.utcoffset() or timedelta(0))
+    except (AttributeError, ValueError):
+        return None
+
+
+def _group_medians(values, groups):
+    """Median of values within each group code (0..k-1), as a length-k array"""
+    order = np.lexsort((values, groups))
+    counts = np.bincount(groups)
+    starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+    ordered = values[order]
+    return (ordered[starts + (counts - 1) // 2] + ordered[starts + counts // 2]) / 2
+
+
+class SuccessModel:
+    """Ridge regression of a title's views relative to its channel's typical video
+
+    The target is log(1 + views) minus the median of that over the same
+    channel's videos, so channels of any size train one model. Intervals
+    and the success probability come from residuals on a held-out split
+    (split conformal), so they are calibrated rather than assumed normal.
+    """
+
+    columns = [
+        'title_length', 'emotional_words', 'numbers', 'curiosity_gap', 'trending_keywords',
+        'clickbait_elements', 'log_length', 'word_count', 'number_count', 'question'
+    ]
+
+    def __init__(self, predictor, path=None):
+        self.predictor = predictor
+        self.path = path or os.environ.get('SUCCESS_MODEL_PATH', os.path.join('instance', 'success_model.npz'))
+        self.config = {
+            'alpha': float(os.environ.get('SUCCESS_MODEL_ALPHA', '1.0')),
+            'min_samples': int(os.environ.get('SUCCESS_MODEL_MIN_SAMPLES', '50')),
+            'min_channel_videos': 3,
+            # Younger videos are still gathering views
+            'min_age_days': 3,
+            'holdout_share': 0.2,
+            'interval_levels': (0.5, 0.8, 0.9)
+        }
+        self.lock = threading.Lock()
+        self.state = None
+        self.loaded_mtime = None
+
+    @property
+    def ready(self):
+        return self._current() is not None
+
+    def record_videos(self, channel_id, videos):
+        """Store or refresh observed statistics of a channel's videos"""
+        try:
+            from app import db
+            from models import VideoStatistics
+
+            videos = [video for video in videos if video.get('id') and video.get('title')]
+            if not videos:
+                return 0
+
+            existing = {
+                record.video_id: record
+                for record in VideoStatistics.query.filter(
+                    VideoStatistics.video_id.in_([video['id'] for video in videos])).all()
+            }
+
+            for video in videos:
+                record = existing.get(video['id'])
+                if record is None:
+                    record = VideoStatistics(video_id=video['id'], channel_id=channel_id)
+                    db.session.add(record)
+                record.title = video['title'][:500]
+                record.published_at = _parse_published_at(video.get('published_at'))
+                record.view_count = int(video.get('view_count', 0))
+                record.like_count = int(video.get('like_count', 0))
+                record.comment_count = int(video.get('comment_count', 0))
+                record.fetched_date = datetime.utcnow()
+
+            db.session.commit()
+            return len(videos)
+
+        except Exception as e:
+            from app import db
+            db.session.rollback()
+            logging.error(f"Error recording video statistics: {str(e)}")
+            return 0
+
+    def feature_matrix(self, titles):
+        """(n, len(columns)) float matrix of title features"""
+        matrix = np.zeros((len(titles), len(self.columns)))
+        for row, title in enumerate(titles):
+            factors = self.predictor._analyze_success_factors(title)
+            text = text_features(title)
+            matrix[row] = [factors[name] for name in self.columns[:6]] + [
+                np.log1p(text.length), text.word_count, len(text.numbers), text.question_marks > 0
+            ]
+        return matrix
+
+    def train(self):
+        """Fit the model on stored video statistics and save it; returns a summary"""
+        try:
+            from models import VideoStatistics
+
+            cutoff = datetime.utcnow() - timedelta(days=self.config['min_age_days'])
+            rows = (VideoStatistics.query
+                    .with_entities(VideoStatistics.channel_id, VideoStatistics.title, VideoStatistics.view_count)
+                    .filter(VideoStatistics.published_at <= cutoff)
+                    .all())
+
+            _, groups, counts = np.unique([row[0] for row in rows], return_inverse=True, return_counts=True)
+            keep = counts[groups] >= self.config['min_channel_videos'] if len(rows) else np.zeros(0, dtype=bool)
+            if keep.sum() < self.config['min_samples']:
+                return {
+                    'trained': False,
+                    'samples': int(keep.sum()),
+                    'required_samples': self.config['min_samples']
+                }
+
+            rows = [row for row, kept in zip(rows, keep) if kept]
+            _, groups = np.unique(groups[keep], return_inverse=True)
+            log_views = np.log1p(np.array([max(0, row[2] or 0) for row in rows], dtype=np.float64))
+            target = log_views - _group_medians(log_views, groups)[groups]
+            features = self.feature_matrix([row[1] for row in rows])
+
+            # Calibrate on a held-out split, then refit on everything
+            order = np.random.default_rng(0).permutation(len(rows))
+            holdout = order[:max(10, int(len(rows) * self.config['holdout_share']))]
+            training = order[len(holdout):]
+
+            params = self._fit(features[training], target[training])
+            predicted = self._apply(params, features[holdout])
+            residuals = np.sort(target[holdout] - predicted)
+
+            levels = np.array(self.config['interval_levels'])
+            absolute = np.sort(np.abs(residuals))
+            ranks = np.minimum(len(absolute) - 1, np.ceil((len(absolute) + 1) * levels).astype(int) - 1)
+
+            metrics = {
+                'samples': len(rows),
+                'channels': int(groups.max()) + 1,
+                'holdout_samples': len(holdout),
+                'holdout_mae': float(np.mean(np.abs(residuals))),
+                'holdout_r2': float(1 - np.sum(residuals ** 2) / max(1e-12, np.sum((target[holdout] - target[holdout].mean()) ** 2))),
+                'directional_accuracy': float(np.mean((predicted > 0) == (target[holdout] > 0))),
+                'trained_at': datetime.utcnow().isoformat()
+            }
+
+            mean, scale, weights, intercept = self._fit(features, target)
+            state = {
+                'mean': mean, 'scale': scale, 'weights': weights, 'intercept': intercept,
+                'residuals': residuals, 'levels': levels, 'quantiles': absolute[ranks],
+                'metrics': metrics
+            }
+            self._save(state)
+            with self.lock:
+                self.state = state
+
+            return {'trained': True, **metrics}
+
+        except Exception as e:
+            logging.error(f"Error training success model: {str(e)}")
+            return {'trained': False, 'error': str(e)}
+
+    def predict(self, titles):
+        """Relative views, calibrated intervals and success probability per title
+
+        relative_views multiplies the channel's median views; the success
+        probability is the calibrated chance of beating that median.
+        """
+        state = self._current()
+        if state is None:
+            return None
+
+        predicted = self._apply((state['mean'], state['scale'], state['weights'], state['intercept']),
+                                self.feature_matrix(titles))
+        residuals = state['residuals']
+        # Share of held-out residuals that would lift each prediction above zero
+        beats_median = 1 - np.searchsorted(residuals, -predicted, side='right') / len(residuals)
+        metrics = state['metrics']
+
+        return [
+            {
+                'success_probability': round(float(beats_median[i]), 3),
+                'relative_views': round(float(np.exp(predicted[i])), 3),
+                'intervals': {
+                    f"{int(level * 100)}%": [
+                        round(float(np.exp(predicted[i] - quantile)), 3),
+                        round(float(np.exp(predicted[i] + quantile)), 3)
+                    ]
+                    for level, quantile in zip(state['levels'], state['quantiles'])
+                },
+                'confidence': round(metrics['directional_accuracy'], 3),
+                'model': {
+                    'samples': metrics['samples'],
+                    'channels': metrics['channels'],
+                    'trained_at': metrics['trained_at']
+                }
+            }
+            for i in range(len(titles))
+        ]
+
+    def _fit(self, features, target):
+        """Closed-form ridge on standardized features with an unpenalized intercept"""
+        mean = features.mean(axis=0)
+        scale = features.std(axis=0)
+        scale[scale == 0] = 1
+        standardized = (features - mean) / scale
+        intercept = target.mean()
+
+        gram = standardized.T @ standardized + self.config['alpha'] * np.eye(features.shape[1])
+        weights = np.linalg.solve(gram, standardized.T @ (target - intercept))
+        return mean, scale, weights, float(intercept)
+
+    @staticmethod
+    def _apply(params, features):
+        mean, scale, weights, intercept = params
+        return ((features - mean) / scale) @ weights + intercept
+
+    def _current(self):
+        """Loaded model state, reloading it when another process saved a newer one"""
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            return self.state
+
+        with self.lock:
+            if mtime != self.loaded_mtime:
+                self.loaded_mtime = mtime
+                try:
+                    with np.load(self.path) as saved:
+                        state = {key: saved[key] for key in saved.files if key != 'metrics'}
+                        state['metrics'] = json.loads(str(saved['metrics']))
+                        state['intercept'] = float(state['intercept'])
+                    self.state = state
+                except Exception as e:
+                    logging.error(f"Error loading success model: {str(e)}")
+            return self.state
+
+    def _save(self, state):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        temporary = f"{self.path}.tmp.npz"
+        np.savez(temporary, **{key: value for key, value in state.items() if key != 'metrics'},
+                 metrics=json.dumps(state['metrics']))
+        os.replace(temporary, self.path)
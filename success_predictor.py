@@ -1,9 +1,15 @@
 import os
 import json
 import logging
-import re
 from openai import OpenAI
 import math
+import threading
+import time
+from statistics import NormalDist
+import numpy as np
+from keyword_matcher import keyword_matcher
+from text_features import text_features
+from success_model import SuccessModel
 
 class SuccessPredictor:
     def __init__(self):
@@ -30,11 +36,44 @@ class SuccessPredictor:
             'مذهل', 'رائع', 'مدهش', 'لا يصدق', 'صادم', 'مفاجئ', 'غريب',
             'خطير', 'مهم', 'عاجل', 'حصري', 'نادر', 'فريد', 'استثنائي'
         ]
+        
+        self.curiosity_indicators = ['كيف', 'لماذا', 'ماذا', 'سر', 'أسرار', '؟', 'خفي', 'غير معروف']
+        self.clickbait_indicators = ['لن تصدق', 'مفاجأة', 'صادم', 'أخيراً', 'حصري', 'مجاني']
+        
+        self.matcher = keyword_matcher
+        self.matcher.register('success', {
+            'emotional_triggers': self.emotional_triggers,
+            'trending_keywords': self.trending_keywords,
+            'curiosity_indicators': self.curiosity_indicators,
+            'clickbait_indicators': self.clickbait_indicators
+        })
+        
+        # Learned from stored video statistics; used instead of the LLM once trained
+        self.model = SuccessModel(self)
+        
+        # Per-channel view statistics used for channel-aware forecasts
+        self.forecast_config = {
+            'recent_videos': int(os.environ.get('FORECAST_RECENT_VIDEOS', '50')),
+            'min_videos': 5,
+            'cache_ttl': int(os.environ.get('FORECAST_CACHE_TTL', '3600')),
+            'percentiles': (10, 25, 50, 75, 90)
+        }
+        self.channel_stats_cache = {}
+        self.channel_stats_lock = threading.Lock()
     
-    def predict_success(self, title, category='عام', thumbnail_description=''):
-        """Predict video success probability using multiple factors"""
+    def predict_success(self, title, category='عام', thumbnail_description='', channel_id=None):
+        """Predict video success probability using multiple factors
+        
+        With a channel_id whose videos are stored, expected metrics are
+        forecast from that channel's own view distribution.
+        """
+        if self.model.ready:
+            result = self._predict_with_model(title, category, channel_id)
+            if result:
+                return result
+        
         if self.demo_mode:
-            return self._get_demo_success_prediction(title)
+            return self._get_demo_success_prediction(title, channel_id)
         
         try:
             # Calculate individual factor scores
@@ -58,21 +97,29 @@ class SuccessPredictor:
                 'improvement_suggestions': ai_prediction.get('suggestions', []),
                 'risk_factors': ai_prediction.get('risks', []),
                 'optimal_conditions': ai_prediction.get('optimal_conditions', {}),
-                'expected_metrics': self._predict_metrics(final_probability, category)
+                'expected_metrics': self._predict_metrics(final_probability, category, channel_id)
             }
             
             return result
             
         except Exception as e:
             logging.error(f"Error in success prediction: {str(e)}")
-            return self._get_demo_success_prediction(title)
+            return self._get_demo_success_prediction(title, channel_id)
+    
+    def record_videos(self, channel_id, videos):
+        """Store a channel's video statistics and drop its cached forecast statistics"""
+        recorded = self.model.record_videos(channel_id, videos)
+        with self.channel_stats_lock:
+            self.channel_stats_cache.pop(channel_id, None)
+        return recorded
     
     def _analyze_success_factors(self, title):
         """Analyze individual success factors"""
         factors = {}
+        text = text_features(title)
         
         # Title length factor
-        length = len(title)
+        length = text.length
         optimal_range = self.success_factors['title_length']['optimal_range']
         if optimal_range[0] <= length <= optimal_range[1]:
             factors['title_length'] = 1.0
@@ -81,29 +128,84 @@ class SuccessPredictor:
             distance = min(abs(length - optimal_range[0]), abs(length - optimal_range[1]))
             factors['title_length'] = max(0.3, 1.0 - (distance / 50))
         
+        # Keyword hits of every list below, from one pass over the title
+        hits = text.keyword_hits(self.matcher).get('success', {})
+        
         # Emotional words factor
-        emotional_count = sum(1 for word in self.emotional_triggers if word in title)
+        emotional_count = len(hits.get('emotional_triggers', []))
         factors['emotional_words'] = min(1.0, emotional_count * 0.3)
         
         # Numbers factor
-        factors['numbers'] = 1.0 if re.search(r'\d+', title) else 0.3
+        factors['numbers'] = 1.0 if text.has_numbers else 0.3
         
         # Curiosity gap factor
-        curiosity_indicators = ['كيف', 'لماذا', 'ماذا', 'سر', 'أسرار', '؟', 'خفي', 'غير معروف']
-        curiosity_count = sum(1 for indicator in curiosity_indicators if indicator in title)
+        curiosity_count = len(hits.get('curiosity_indicators', []))
         factors['curiosity_gap'] = min(1.0, curiosity_count * 0.4)
         
         # Trending keywords factor
-        trending_count = sum(1 for keyword in self.trending_keywords if keyword in title)
+        trending_count = len(hits.get('trending_keywords', []))
         factors['trending_keywords'] = min(1.0, trending_count * 0.25)
         
         # Clickbait elements (balanced approach)
-        clickbait_indicators = ['لن تصدق', 'مفاجأة', 'صادم', 'أخيراً', 'حصري', 'مجاني']
-        clickbait_count = sum(1 for indicator in clickbait_indicators if indicator in title)
+        clickbait_count = len(hits.get('clickbait_indicators', []))
         factors['clickbait_elements'] = min(0.8, clickbait_count * 0.2)  # Cap at 0.8 to avoid over-clickbait
         
         return factors
     
+    def _predict_with_model(self, title, category, channel_id=None):
+        """Instant prediction from the learned model, or None if it is unavailable"""
+        try:
+            learned = self.model.predict([title])
+            if not learned:
+                return None
+            learned = learned[0]
+            
+            factors = self._analyze_success_factors(title)
+            probability = learned['success_probability']
+            
+            return {
+                'success_probability': probability,
+                'confidence_level': learned['confidence'],
+                'success_factors': factors,
+                'predicted_performance': self._categorize_performance(probability),
+                'improvement_suggestions': self._factor_suggestions(factors),
+                'risk_factors': self._model_risks(factors, learned),
+                'optimal_conditions': {},
+                'expected_metrics': self._predict_metrics(probability, category, channel_id),
+                'learned_prediction': learned,
+                'prediction_source': 'learned_model'
+            }
+            
+        except Exception as e:
+            logging.error(f"Error in learned success prediction: {str(e)}")
+            return None
+    
+    def _factor_suggestions(self, factors):
+        """Improvement suggestions for the weakest success factors"""
+        suggestions = []
+        if factors['title_length'] < 1.0:
+            suggestions.append('اجعل طول العنوان بين 40 و70 حرفاً')
+        if factors['numbers'] < 1.0:
+            suggestions.append('أضف رقماً محدداً إلى العنوان')
+        if factors['curiosity_gap'] == 0:
+            suggestions.append('أضف عنصراً يثير فضول المشاهد')
+        if factors['emotional_words'] == 0:
+            suggestions.append('استخدم كلمة ذات تأثير عاطفي')
+        if factors['trending_keywords'] == 0:
+            suggestions.append('أضف كلمة مفتاحية رائجة في مجالك')
+        return suggestions
+    
+    def _model_risks(self, factors, learned):
+        """Risk factors from the factor scores and the width of the predicted range"""
+        risks = []
+        if factors['clickbait_elements'] >= 0.6:
+            risks.append('كثرة عناصر الإثارة قد تقلل ثقة المشاهدين')
+        # Even the 80% range allows less than half the channel's usual views
+        low, _ = learned['intervals'].get('80%', [1, 1])
+        if low < 0.5:
+            risks.append('تباين كبير في الأداء المتوقع مقارنة بفيديوهات القناة')
+        return risks
+    
     def _get_ai_success_prediction(self, title, category, thumbnail_description):
         """Get AI-powered success prediction"""
         try:
@@ -198,8 +300,13 @@ class SuccessPredictor:
                 'icon': 'fas fa-exclamation-triangle'
             }
     
-    def _predict_metrics(self, probability, category):
+    def _predict_metrics(self, probability, category, channel_id=None):
         """Predict expected video metrics"""
+        if channel_id:
+            forecast = self._forecast_channel_metrics(probability, channel_id)
+            if forecast:
+                return forecast
+        
         # Base metrics for different categories
         base_metrics = {
             'تعليم': {'views': 50000, 'engagement': 0.05},
@@ -218,10 +325,100 @@ class SuccessPredictor:
             'expected_likes': int(base['views'] * multiplier * base['engagement']),
             'expected_comments': int(base['views'] * multiplier * base['engagement'] * 0.1),
             'expected_shares': int(base['views'] * multiplier * base['engagement'] * 0.05),
-            'confidence_interval': f"±{int(base['views'] * multiplier * 0.3)}"
+            'confidence_interval': f"±{int(base['views'] * multiplier * 0.3)}",
+            'forecast_source': 'category'
+        }
+    
+    def _channel_statistics(self, channel_id):
+        """Robust view/like/comment statistics of a channel's recent stored videos, cached"""
+        now = time.monotonic()
+        with self.channel_stats_lock:
+            cached = self.channel_stats_cache.get(channel_id)
+        if cached and now - cached[0] < self.forecast_config['cache_ttl']:
+            return cached[1]
+        
+        try:
+            from models import VideoStatistics
+            
+            rows = (VideoStatistics.query
+                    .with_entities(VideoStatistics.view_count, VideoStatistics.like_count, VideoStatistics.comment_count)
+                    .filter(VideoStatistics.channel_id == channel_id)
+                    .order_by(VideoStatistics.published_at.desc())
+                    .limit(self.forecast_config['recent_videos'])
+                    .all())
+            
+            stats = None
+            if len(rows) >= self.forecast_config['min_videos']:
+                counts = np.array(rows, dtype=np.float64)
+                views, likes, comments = np.maximum(counts, 0).T
+                
+                # Log-normal fit with median and MAD so a single viral video does not dominate
+                log_views = np.log1p(views)
+                mu = float(np.median(log_views))
+                sigma = float(1.4826 * np.median(np.abs(log_views - mu)))
+                
+                watched = views > 0
+                percentiles = self.forecast_config['percentiles']
+                stats = {
+                    'videos': len(rows),
+                    'median_views': float(np.median(views)),
+                    'view_percentiles': dict(zip(percentiles, np.percentile(views, percentiles).tolist())),
+                    'median_likes': float(np.median(likes)),
+                    'median_comments': float(np.median(comments)),
+                    'like_rate': float(np.median(likes[watched] / views[watched])) if watched.any() else 0.0,
+                    'comment_rate': float(np.median(comments[watched] / views[watched])) if watched.any() else 0.0,
+                    'log_mu': mu,
+                    # Floor keeps bands from collapsing for channels with very even views
+                    'log_sigma': max(sigma, 0.1)
+                }
+            
+            with self.channel_stats_lock:
+                self.channel_stats_cache[channel_id] = (now, stats)
+            return stats
+            
+        except Exception as e:
+            logging.error(f"Error computing channel view statistics: {str(e)}")
+            return None
+    
+    def _forecast_channel_metrics(self, probability, channel_id):
+        """Expected metrics and percentile bands from the channel's own view distribution
+        
+        The success probability is read as the chance of beating the
+        channel's median video, which shifts the channel's log-normal view
+        distribution by sigma * z(probability).
+        """
+        stats = self._channel_statistics(channel_id)
+        if not stats:
+            return None
+        
+        normal = NormalDist()
+        mu, sigma = stats['log_mu'], stats['log_sigma']
+        center = mu + sigma * normal.inv_cdf(min(0.98, max(0.02, probability)))
+        
+        bands = {
+            f"p{percentile}": int(max(0.0, math.expm1(center + sigma * normal.inv_cdf(percentile / 100))))
+            for percentile in self.forecast_config['percentiles']
+        }
+        views = bands['p50']
+        
+        return {
+            'expected_views': views,
+            'expected_likes': int(views * stats['like_rate']),
+            'expected_comments': int(views * stats['comment_rate']),
+            'expected_shares': int(views * stats['like_rate'] * 0.05),
+            'confidence_interval': f"{bands['p10']:,} - {bands['p90']:,}",
+            'percentile_bands': bands,
+            'channel_statistics': {
+                'videos': stats['videos'],
+                'median_views': int(stats['median_views']),
+                'median_likes': int(stats['median_likes']),
+                'median_comments': int(stats['median_comments']),
+                'view_percentiles': {f"p{key}": int(value) for key, value in stats['view_percentiles'].items()}
+            },
+            'forecast_source': 'channel'
         }
     
-    def _get_demo_success_prediction(self, title):
+    def _get_demo_success_prediction(self, title, channel_id=None):
         """Demo prediction for testing purposes"""
         # Simple scoring based on title characteristics
         factors = self._analyze_success_factors(title)
@@ -249,5 +446,5 @@ class SuccessPredictor:
                 'target_audience': 'الشباب 18-35 سنة',
                 'recommended_length': '8-12 دقيقة'
             },
-            'expected_metrics': self._predict_metrics(probability, 'عام')
+            'expected_metrics': self._predict_metrics(probability, 'عام', channel_id)
         }
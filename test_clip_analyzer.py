@@ -0,0 +1,51 @@
+import math
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from clip_analyzer import CLIPVisualAnalyzer
+
+TINY_SIZES = [(1, 1), (1, 5), (5, 1), (2, 2)]
+
+
+def _finite(value):
+    if isinstance(value, dict):
+        return all(_finite(item) for item in value.values())
+    if isinstance(value, (list, tuple)):
+        return all(_finite(item) for item in value)
+    if isinstance(value, (float, np.floating)):
+        return math.isfinite(value)
+    return True
+
+
+@pytest.fixture(scope='module')
+def analyzer():
+    return CLIPVisualAnalyzer()
+
+
+@pytest.fixture
+def tiny_images():
+    rng = np.random.default_rng(0)
+    return [Image.fromarray(rng.integers(0, 256, (height, width, 3), dtype=np.uint8))
+            for width, height in TINY_SIZES]
+
+
+def test_batch_scores_of_tiny_images_are_finite(analyzer, tiny_images):
+    scores = analyzer._score_images(tiny_images)
+
+    assert sorted(scores) == list(range(len(tiny_images)))
+    for entry in scores.values():
+        assert _finite(entry)
+
+
+def test_batch_matches_single_image_for_tiny_images(analyzer, tiny_images, monkeypatch):
+    scores = analyzer._score_images(tiny_images)
+
+    for index, image in enumerate(tiny_images):
+        monkeypatch.setattr(analyzer, '_load_image', lambda url, **kwargs: image)
+        single = analyzer.analyze_thumbnail(f'tiny-{index}')
+
+        assert _finite(single)
+        assert scores[index]['youtube_optimized_score'] == single['youtube_optimized_score']
+        assert scores[index]['overall_score'] == single['overall_score']
@@ -0,0 +1,46 @@
+from niche_classifier import NicheClassifier
+
+NICHE_KEYWORDS = {
+    'طبخ وطعام': ['طبخ', 'وصفة', 'مطبخ', 'حلويات', 'أكلات', 'شيف'],
+    'ألعاب': ['ألعاب', 'جيمنج', 'لعبة', 'بلاي', 'مغامرة', 'أكشن'],
+    'تقنية وبرمجة': ['تقنية', 'برمجة', 'هاتف', 'كمبيوتر', 'تطبيق', 'مراجعة'],
+}
+
+
+def seeded_classifier():
+    classifier = NicheClassifier(NICHE_KEYWORDS)
+    # Keyword seeds only, so no database build is started
+    classifier.model = classifier._build([])
+    return classifier
+
+
+def test_one_keyword_title_is_not_confident():
+    result = seeded_classifier().classify('طبخ')
+
+    assert result['niches'][0]['niche'] == 'طبخ وطعام'
+    assert result['matched_terms'] == 1
+    assert not result['confident']
+
+
+def test_several_keywords_are_confident():
+    result = seeded_classifier().classify('ألعاب بلاي مغامرة أكشن لعبة جديدة')
+
+    assert result['niches'][0]['niche'] == 'ألعاب'
+    assert result['confident']
+
+
+def test_unrelated_words_lower_the_score():
+    classifier = seeded_classifier()
+    focused = classifier.classify('ألعاب بلاي مغامرة')
+    diluted = classifier.classify('ألعاب بلاي مغامرة ذهبنا اليوم إلى السوق مع الأصدقاء واشترينا ملابس')
+
+    assert diluted['niches'][0]['score'] < focused['niches'][0]['score']
+    assert diluted['coverage'] < focused['coverage']
+    assert not diluted['confident']
+
+
+def test_text_without_known_terms():
+    result = seeded_classifier().classify('ذهبنا إلى السوق')
+
+    assert result['niches'] == []
+    assert not result['confident']
@@ -0,0 +1,43 @@
+import pytest
+
+from title_analyzer import TitleAnalyzer
+
+TITLES = [
+    '',
+    'كيف تتعلم البرمجة في 30 يوم؟',
+    'سر مذهل لن تصدق نتيجته الآن',
+    'تحذير: خطأ كارثي يقع فيه الجميع',
+    'مراجعة حصرية لأحدث هاتف 2024 مع مقارنة شاملة وتجربة حقيقية',
+    'أفضل طريقة مجانية لتعلم الطبخ بسهولة ' * 4,
+    'vlog',
+]
+
+
+@pytest.fixture(scope='module')
+def analyzer():
+    return TitleAnalyzer()
+
+
+def test_batch_matches_single_title_helpers(analyzer):
+    for title, quick in zip(TITLES, analyzer.quick_analyze_batch(TITLES)):
+        basic = analyzer._calculate_basic_metrics(title)
+        emotional = analyzer._analyze_emotional_content(title)
+        seo = analyzer._analyze_seo_factors(title)
+
+        attractiveness = (basic['keyword_strength'] + emotional['emotional_score'] + seo['seo_score']) / 3 * 10
+        assert quick['attractiveness_score'] == pytest.approx(attractiveness)
+        assert quick['emotional_impact'] == emotional['emotional_score']
+        assert quick['seo_score'] == seo['seo_score']
+        assert quick['has_numbers'] == basic['has_numbers']
+        assert quick['is_question'] == basic['has_question']
+        assert quick['has_emotional_keywords'] == any(emotional['emotional_keywords'].values())
+
+
+def test_quick_analyze_matches_batch(analyzer):
+    assert [analyzer.quick_analyze(title) for title in TITLES] == analyzer.quick_analyze_batch(TITLES)
+
+
+def test_scores_stay_in_range(analyzer):
+    for quick in analyzer.quick_analyze_batch(TITLES):
+        assert 1 <= quick['emotional_impact'] <= 10
+        assert 1 <= quick['seo_score'] <= 10
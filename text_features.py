@@ -0,0 +1,71 @@
+import re
+from functools import cached_property, lru_cache
+
+# Harakat, Quranic annotation marks and superscript alef
+_DIACRITICS = [chr(code) for code in [*range(0x0610, 0x061B), *range(0x064B, 0x0660), 0x0670, *range(0x06D6, 0x06EE)]]
+_TATWEEL = 'ـ'
+
+_FOLDING = {
+    'أ': 'ا', 'إ': 'ا', 'آ': 'ا', 'ٱ': 'ا',
+    'ى': 'ي', 'ی': 'ي', 'ة': 'ه', 'ک': 'ك'
+}
+
+# Arabic-Indic and Persian digits to ASCII
+_DIGITS = {chr(base + digit): str(digit) for base in (0x0660, 0x06F0) for digit in range(10)}
+
+_NORMALIZE = str.maketrans({**_FOLDING, **_DIGITS, **{char: None for char in _DIACRITICS + [_TATWEEL]}})
+
+QUESTION_MARKS = ('؟', '?')
+
+
+def normalize_arabic(text):
+    """Lowercase, strip diacritics and tatweel, fold alef/ya/ta marbuta and digits"""
+    return text.lower().translate(_NORMALIZE)
+
+
+class TextFeatures:
+    """Normalized form, tokens, numbers and keyword hits of one text
+
+    Built once per text and shared by every analyzer that looks at it;
+    keyword hits are computed on first use and kept for the matcher's
+    current automaton.
+    """
+
+    def __init__(self, text):
+        self.text = text
+        self.length = len(text)
+        self.words = text.split()
+        self.normalized = normalize_arabic(text)
+        self.numbers = re.findall(r'\d+', self.normalized)
+        self.question_marks = sum(text.count(mark) for mark in QUESTION_MARKS)
+        self._hits = (None, {})
+
+    @cached_property
+    def tokens(self):
+        return re.findall(r'\w+', self.normalized)
+
+    @property
+    def word_count(self):
+        return len(self.words)
+
+    @property
+    def has_numbers(self):
+        return bool(self.numbers)
+
+    def keyword_hits(self, matcher, groups=None):
+        """Matcher hits in the normalized text, {group: {category: [(keyword, count)]}}"""
+        automaton, cached = self._hits
+        if automaton is not matcher.automaton:
+            automaton, cached = matcher.automaton, {}
+            self._hits = (automaton, cached)
+
+        key = tuple(groups) if groups is not None else None
+        if key not in cached:
+            cached[key] = matcher.scan(self.normalized, key)
+        return cached[key]
+
+
+@lru_cache(maxsize=1024)
+def text_features(text):
+    """Shared TextFeatures of a text, so analyzers of one request reuse it"""
+    return TextFeatures(text)
@@ -0,0 +1,214 @@
+import os
+import json
+import fcntl
+import logging
+import threading
+
+import numpy as np
+
+# Every descriptor is computed from the thumbnail resampled to this size
+VECTOR_SIZE = (64, 36)
+GRID = (4, 4)
+DIMENSIONS = 64 + 2 + GRID[0] * GRID[1] * 3
+
+# Relative weight of each descriptor block in the cosine similarity
+BLOCK_WEIGHTS = {'colors': 0.5, 'edges': 0.1, 'layout': 0.4}
+
+
+def thumbnail_vector(features):
+    """Unit-length float32 descriptor of a thumbnail
+
+    Concatenates a 4x4x4 RGB histogram, horizontal/vertical edge densities
+    and the mean color of each cell of a 4x4 layout grid (relative to the
+    image mean), each block scaled so that its share of the cosine
+    similarity follows BLOCK_WEIGHTS.
+    """
+    small = np.asarray(features.scaled(VECTOR_SIZE).resize(VECTOR_SIZE))
+
+    # Joint color histogram over 4 levels per channel
+    levels = (small >> 6).astype(np.intp)
+    codes = (levels[..., 0] * 4 + levels[..., 1]) * 4 + levels[..., 2]
+    colors = np.bincount(codes.ravel(), minlength=64).astype(np.float64)
+
+    # Share of strong gradients along each axis
+    gray = small.mean(axis=2)
+    edges = np.array([
+        (np.abs(np.diff(gray, axis=1)) > 30).mean(),
+        (np.abs(np.diff(gray, axis=0)) > 30).mean()
+    ])
+
+    # Mean color per grid cell, centered so only the arrangement counts
+    rows, cols = GRID
+    cells = small.reshape(rows, VECTOR_SIZE[1] // rows, cols, VECTOR_SIZE[0] // cols, 3).mean(axis=(1, 3))
+    layout = (cells - cells.mean(axis=(0, 1))).ravel() / 255.0
+
+    blocks = []
+    for name, block in (('colors', colors), ('edges', edges), ('layout', layout)):
+        norm = np.linalg.norm(block)
+        blocks.append(block / norm * np.sqrt(BLOCK_WEIGHTS[name]) if norm > 0 else block)
+
+    vector = np.concatenate(blocks)
+    norm = np.linalg.norm(vector)
+    return (vector / norm if norm > 0 else vector).astype(np.float32)
+
+
+class ThumbnailSimilarityIndex:
+    """Top-k cosine search over descriptors of analyzed thumbnails
+
+    Descriptors are rows of a float32 matrix file (vectors.f32) that is
+    memory-mapped for search; row metadata is a JSON line per row in
+    meta.jsonl, written after the row itself so it marks the row complete.
+    Appends from several processes are serialized with a file lock, and
+    each process picks up rows written by others on every call.
+
+    With projection_bits > 0, rows are also bucketed by the signs of random
+    projections and searches only score rows whose signature is within
+    bucket_radius bits of the query's, falling back to a full scan when
+    that leaves fewer than k candidates.
+    """
+
+    def __init__(self, directory=None, projection_bits=None, bucket_radius=None, seed=0):
+        self.directory = directory or os.environ.get('THUMBNAIL_INDEX_DIR', os.path.join('instance', 'thumbnail_index'))
+        self.vectors_path = os.path.join(self.directory, 'vectors.f32')
+        self.meta_path = os.path.join(self.directory, 'meta.jsonl')
+        self.lock_path = os.path.join(self.directory, 'index.lock')
+
+        if projection_bits is None:
+            projection_bits = int(os.environ.get('THUMBNAIL_INDEX_PROJECTION_BITS', '0'))
+        self.projection_bits = min(projection_bits, 64)
+        self.bucket_radius = bucket_radius if bucket_radius is not None else max(1, self.projection_bits // 8)
+        self.planes = np.random.default_rng(seed).standard_normal(
+            (self.projection_bits, DIMENSIONS)).astype(np.float32)
+
+        self.lock = threading.Lock()
+        self.meta_offset = 0
+        self.matrix = np.empty((0, DIMENSIONS), dtype=np.float32)
+        self.metadata = []
+        self.scores = np.empty(0, dtype=np.float32)
+        self.signatures = np.empty(0, dtype=np.uint64)
+        self.rows_by_url = {}
+
+    def __len__(self):
+        return len(self.metadata)
+
+    def add_many(self, vectors, metadata):
+        """Append descriptors with their metadata, skipping thumbnails already indexed"""
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+
+            with self.lock, open(self.lock_path, 'a') as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    self._sync_locked()
+
+                    rows, lines, seen = [], [], set()
+                    for vector, meta in zip(vectors, metadata):
+                        url = meta.get('thumbnail_url')
+                        if url in self.rows_by_url or url in seen:
+                            continue
+                        seen.add(url)
+                        rows.append(np.asarray(vector, dtype=np.float32))
+                        lines.append(json.dumps(meta, ensure_ascii=False) + '\n')
+                    if not rows:
+                        return 0
+
+                    with open(self.vectors_path, 'ab') as vectors_file:
+                        # Truncate any row left behind by a writer that died before its metadata
+                        vectors_file.truncate(len(self.metadata) * DIMENSIONS * 4)
+                        vectors_file.write(np.stack(rows).tobytes())
+                        vectors_file.flush()
+                        os.fsync(vectors_file.fileno())
+                    with open(self.meta_path, 'a', encoding='utf-8') as meta_file:
+                        meta_file.writelines(lines)
+
+                    self._sync_locked()
+                    return len(rows)
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+        except Exception as e:
+            logging.error(f"Error adding to thumbnail similarity index: {str(e)}")
+            return 0
+
+    def search(self, vector, k=10, min_score=None, exclude_url=None):
+        """Most similar indexed thumbnails, best first
+
+        min_score keeps only thumbnails whose youtube_optimized_score is at
+        least that value; exclude_url drops the query thumbnail itself.
+        """
+        try:
+            with self.lock:
+                self._sync_locked()
+                matrix, metadata, scores, signatures = self.matrix, self.metadata, self.scores, self.signatures
+                excluded = self.rows_by_url.get(exclude_url)
+
+            if not metadata:
+                return []
+
+            query = np.asarray(vector, dtype=np.float32)
+            allowed = np.ones(len(metadata), dtype=bool)
+            if min_score is not None:
+                allowed &= scores >= min_score
+            if excluded is not None:
+                allowed[excluded] = False
+
+            candidates = np.flatnonzero(allowed)
+            if self.projection_bits and len(candidates) > k:
+                distance = np.bitwise_count(signatures[candidates] ^ self._signatures(query[None, :])[0])
+                bucketed = candidates[distance <= self.bucket_radius]
+                if len(bucketed) >= k:
+                    candidates = bucketed
+
+            top = min(k, len(candidates))
+            if not top:
+                return []
+
+            # Gathering most of the rows would copy the matrix; score them all instead
+            if len(candidates) * 2 > len(metadata):
+                similarity = (matrix @ query)[candidates]
+            else:
+                similarity = matrix[candidates] @ query
+            best = np.argpartition(-similarity, top - 1)[:top]
+            best = best[np.argsort(-similarity[best], kind='stable')]
+
+            return [
+                {**metadata[candidates[i]], 'similarity': round(float(similarity[i]), 4)}
+                for i in best
+            ]
+
+        except Exception as e:
+            logging.error(f"Error searching thumbnail similarity index: {str(e)}")
+            return []
+
+    def _sync_locked(self):
+        """Load metadata lines (and their rows) written since the last sync"""
+        if not os.path.exists(self.meta_path):
+            return
+
+        with open(self.meta_path, 'rb') as meta_file:
+            meta_file.seek(self.meta_offset)
+            data = meta_file.read()
+        # Only complete lines; a concurrent writer may be mid-line
+        complete = data[:data.rfind(b'\n') + 1]
+        if not complete:
+            return
+
+        new = [json.loads(line) for line in complete.decode('utf-8').splitlines()]
+        self.meta_offset += len(complete)
+        for meta in new:
+            self.rows_by_url.setdefault(meta.get('thumbnail_url'), len(self.metadata))
+            self.metadata.append(meta)
+
+        self.matrix = np.memmap(self.vectors_path, dtype=np.float32, mode='r', shape=(len(self.metadata), DIMENSIONS))
+        self.scores = np.concatenate([self.scores, np.array(
+            [meta.get('youtube_optimized_score', 0) for meta in new], dtype=np.float32)])
+        if self.projection_bits:
+            self.signatures = np.concatenate([self.signatures, self._signatures(self.matrix[-len(new):])])
+
+    def _signatures(self, vectors):
+        """Random-projection sign bits of each vector, packed into uint64"""
+        bits = (vectors @ self.planes.T) > 0
+        packed = np.packbits(bits, axis=1, bitorder='little')
+        padded = np.zeros((len(vectors), 8), dtype=np.uint8)
+        padded[:, :packed.shape[1]] = packed
+        return padded.view('<u8').ravel()
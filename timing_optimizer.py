@@ -2,7 +2,13 @@ import os
 import json
 import logging
 from datetime import datetime, timedelta
+import numpy as np
 from openai import OpenAI
+from keyword_matcher import keyword_matcher
+from text_features import text_features
+from cadence_analytics import CadenceAnalytics, frequency_label
+from category_timing_table import CategoryTimingTable
+from performance_grid import PerformanceGrid, parse_timestamps, local_week_hours, DAYS, HOURS
 
 class TimingOptimizer:
     def __init__(self):
@@ -30,16 +36,65 @@ class TimingOptimizer:
                 'عام': {'best_days': ['الخميس', 'الجمعة', 'السبت'], 'best_hours': [20, 21, 22]}
             }
         }
+        
+        # Keywords used to guess a channel's content category
+        self.category_keywords = {
+            'تعليم': ['تعليم', 'شرح', 'دروس', 'كورس', 'تعلم', 'دليل', 'كيف'],
+            'ترفيه': ['ترفيه', 'كوميدي', 'مضحك', 'تحدي', 'فلوق', 'مقلب'],
+            'تقنية': ['تقنية', 'برمجة', 'كمبيوتر', 'تطوير', 'تطبيق', 'موقع'],
+            'رياضة': ['رياضة', 'كرة', 'لعب', 'فريق', 'مباراة', 'تمرين'],
+            'موسيقى': ['موسيقى', 'أغنية', 'مطرب', 'فنان', 'إيقاع', 'لحن'],
+            'طبخ': ['طبخ', 'وصفة', 'أكل', 'طعام', 'مطبخ', 'طبخة']
+        }
+        
+        self.matcher = keyword_matcher
+        self.matcher.register('timing_category', self.category_keywords)
+        
+        # Per-channel performance heatmap
+        self.grid_config = {
+            'timezone': os.environ.get('AUDIENCE_TIMEZONE', 'Asia/Riyadh'),
+            'min_videos': 8,
+            'history_limit': 5000
+        }
+        
+        # Upload cadence over the full stored history
+        self.cadence = CadenceAnalytics(hiatus_days=int(os.environ.get('CADENCE_HIATUS_DAYS', '30')))
+        
+        # Weekly schedule search on the performance grid
+        self.schedule_config = {
+            'max_uploads_per_week': 21,
+            'default_min_gap_hours': 24,
+            'top_schedules': 5
+        }
+        
+        # Category timing recommendations, precomputed in the background
+        self.category_timing = CategoryTimingTable(
+            self._compute_category_timing,
+            refresh_interval=int(os.environ.get('CATEGORY_TIMING_REFRESH', '86400'))
+        )
+        if not self.demo_mode:
+            self.category_timing.warm((category, '') for category in self.general_patterns['content_categories'])
     
     def analyze_optimal_timing(self, channel_info, videos):
         """Analyze optimal posting timing for a channel"""
         if self.demo_mode:
-            return self._get_demo_timing_analysis(channel_info)
+            result = self._apply_performance_grid(self._get_demo_timing_analysis(channel_info),
+                                                  self._build_performance_grid(channel_info, videos))
+            result['cadence'] = self.cadence.analyze(channel_info.get('id'))
+            return result
         
         try:
             # Analyze historical posting patterns
             posting_patterns = self._analyze_posting_patterns(videos)
             
+            # Gaps, streaks and hiatuses over the whole stored upload history
+            cadence = self.cadence.analyze(channel_info.get('id'))
+            if cadence:
+                posting_patterns['posting_frequency'] = cadence['posting_frequency']
+            
+            # How every known upload performed per local weekday and hour
+            performance_grid = self._build_performance_grid(channel_info, videos)
+            
             # Determine content category
             content_category = self._determine_content_category(channel_info, videos)
             
@@ -47,22 +102,25 @@ class TimingOptimizer:
             ai_analysis = self._get_ai_timing_analysis(channel_info, posting_patterns, content_category)
             
             # Combine with general patterns
-            optimal_timing = self._calculate_optimal_timing(content_category, posting_patterns, ai_analysis)
+            optimal_timing = self._calculate_optimal_timing(content_category, posting_patterns, ai_analysis,
+                                                            performance_grid)
             
             result = {
                 'best_days': optimal_timing['best_days'],
                 'best_hours': optimal_timing['best_hours'],
-                'timezone': 'Asia/Riyadh',  # Default for MENA
+                'timezone': self.grid_config['timezone'],
                 'audience_data': {
                     'primary_timezone': 'GMT+3',
                     'activity_pattern': optimal_timing['activity_pattern'],
                     'engagement_peaks': optimal_timing['engagement_peaks']
                 },
                 'confidence_score': optimal_timing['confidence'],
-                'data_quality': self._assess_data_quality(videos),
+                'data_quality': self._assess_data_quality(videos, cadence),
                 'recommendations': ai_analysis.get('recommendations', []),
                 'seasonal_considerations': ai_analysis.get('seasonal_factors', {}),
-                'content_specific_timing': optimal_timing.get('content_specific', {})
+                'content_specific_timing': optimal_timing.get('content_specific', {}),
+                'performance_heatmap': self._heatmap(performance_grid),
+                'cadence': cadence
             }
             
             return result
@@ -78,19 +136,11 @@ class TimingOptimizer:
         else:
             pattern = self.general_patterns['content_categories']['عام']
         
-        # Get AI-enhanced recommendations if available
+        # AI-enhanced recommendations once the background refresh has stored them
         if not self.demo_mode:
-            try:
-                ai_recommendations = self._get_ai_category_timing(category, target_audience)
-                # Merge AI recommendations with general patterns
-                return {
-                    'best_days': ai_recommendations.get('best_days', pattern['best_days']),
-                    'best_hours': ai_recommendations.get('best_hours', pattern['best_hours']),
-                    'reasoning': ai_recommendations.get('reasoning', []),
-                    'additional_tips': ai_recommendations.get('tips', [])
-                }
-            except:
-                pass
+            recommendations = self.category_timing.get(category, target_audience)
+            if recommendations:
+                return recommendations
         
         return {
             'best_days': pattern['best_days'],
@@ -99,50 +149,79 @@ class TimingOptimizer:
             'additional_tips': ['انشر بانتظام', 'تفاعل مع التعليقات']
         }
     
+    def optimize_schedule(self, channel_info, videos, uploads_per_week, min_gap_hours=None):
+        """Weekly schedules of uploads_per_week slots with the highest expected lift
+        
+        Slots are at least min_gap_hours apart so uploads don't cannibalize
+        each other; lifts are relative to the channel's typical upload.
+        """
+        config = self.schedule_config
+        min_gap_hours = min_gap_hours or config['default_min_gap_hours']
+        if not 1 <= uploads_per_week <= config['max_uploads_per_week']:
+            raise ValueError(f"عدد الفيديوهات الأسبوعية يجب أن يكون بين 1 و {config['max_uploads_per_week']}")
+        if min_gap_hours < 1 or uploads_per_week * min_gap_hours > DAYS * HOURS:
+            raise ValueError('الفاصل الزمني بين الفيديوهات لا يتسع لهذا العدد في الأسبوع')
+        
+        performance_grid = self._build_performance_grid(channel_info, videos)
+        if performance_grid is None:
+            return {
+                'schedules': [],
+                'message': f"يلزم {self.grid_config['min_videos']} فيديوهات على الأقل لحساب الجدول"
+            }
+        
+        schedules = performance_grid.best_schedules(uploads_per_week, min_gap_hours, config['top_schedules'])
+        # What the channel's actual upload slots earn, for comparison
+        uploads = performance_grid.uploads
+        current_uplift = float((uploads * np.expm1(performance_grid.score)).sum() / max(1, uploads.sum()))
+        
+        return {
+            'uploads_per_week': uploads_per_week,
+            'min_gap_hours': min_gap_hours,
+            'timezone': performance_grid.timezone,
+            'videos_analyzed': performance_grid.videos,
+            'current_uplift': round(current_uplift, 3),
+            'schedules': [
+                {
+                    'slots': [
+                        {
+                            'day': self._get_arabic_day_name(day),
+                            'hour': hour,
+                            'expected_lift': round(lift, 3),
+                            'confidence': round(confidence, 3)
+                        }
+                        for (day, hour), lift, confidence in zip(schedule['slots'], schedule['slot_lift'],
+                                                                 schedule['slot_confidence'])
+                    ],
+                    'expected_uplift': round(schedule['expected_uplift'], 3)
+                }
+                for schedule in schedules
+            ]
+        }
+    
     def _analyze_posting_patterns(self, videos):
         """Analyze historical posting patterns"""
         if not videos:
             return {'posting_frequency': 'غير منتظم', 'common_days': [], 'common_hours': []}
         
-        posting_times = []
-        for video in videos:
-            if video.get('published_at'):
-                try:
-                    pub_time = datetime.fromisoformat(video['published_at'].replace('Z', '+00:00'))
-                    posting_times.append(pub_time)
-                except:
-                    continue
+        seconds = parse_timestamps([video.get('published_at') or '' for video in videos])
+        seconds = seconds[seconds >= 0]
         
-        if not posting_times:
+        if not len(seconds):
             return {'posting_frequency': 'غير منتظم', 'common_days': [], 'common_hours': []}
         
-        # Analyze days of week
-        days_count = {}
-        hours_count = {}
-        
-        for time in posting_times:
-            day_name = self._get_arabic_day_name(time.weekday())
-            hour = time.hour
-            
-            days_count[day_name] = days_count.get(day_name, 0) + 1
-            hours_count[hour] = hours_count.get(hour, 0) + 1
+        # Uploads per local weekday and hour
+        week_hours = local_week_hours(seconds, self.grid_config['timezone'])
+        days_count = np.bincount(week_hours // HOURS, minlength=DAYS)
+        hours_count = np.bincount(week_hours % HOURS, minlength=HOURS)
         
         # Get most common days and hours
-        common_days = sorted(days_count.keys(), key=lambda x: days_count[x], reverse=True)[:3]
-        common_hours = sorted(hours_count.keys(), key=lambda x: hours_count[x], reverse=True)[:3]
-        
-        # Calculate posting frequency
-        if len(posting_times) > 1:
-            time_diff = max(posting_times) - min(posting_times)
-            avg_interval = time_diff.days / len(posting_times)
-            if avg_interval < 3:
-                frequency = 'يومي'
-            elif avg_interval < 7:
-                frequency = 'أسبوعي'
-            elif avg_interval < 30:
-                frequency = 'شهري'
-            else:
-                frequency = 'غير منتظم'
+        common_days = [self._get_arabic_day_name(int(day)) for day in np.argsort(-days_count, kind='stable')[:3]
+                       if days_count[day]]
+        common_hours = [int(hour) for hour in np.argsort(-hours_count, kind='stable')[:3] if hours_count[hour]]
+        
+        # Calculate posting frequency from the typical gap between uploads
+        if len(seconds) > 1:
+            frequency = frequency_label(float(np.median(np.diff(np.sort(seconds)))) / 86400)
         else:
             frequency = 'غير منتظم'
         
@@ -151,9 +230,89 @@ class TimingOptimizer:
             'common_days': common_days,
             'common_hours': common_hours,
             'total_videos': len(videos),
-            'analysis_period': len(posting_times)
+            'analysis_period': len(seconds)
         }
     
+    def _build_performance_grid(self, channel_info, videos):
+        """PerformanceGrid over the channel's stored upload history and the given videos, or None"""
+        try:
+            records = {}
+            
+            channel_id = channel_info.get('id')
+            if channel_id:
+                from models import VideoStatistics
+                rows = (VideoStatistics.query
+                        .with_entities(VideoStatistics.video_id, VideoStatistics.published_at, VideoStatistics.view_count,
+                                       VideoStatistics.like_count, VideoStatistics.comment_count)
+                        .filter(VideoStatistics.channel_id == channel_id)
+                        .order_by(VideoStatistics.published_at.desc())
+                        .limit(self.grid_config['history_limit'])
+                        .all())
+                for video_id, published_at, views, likes, comments in rows:
+                    if published_at:
+                        # Stored as naive UTC
+                        records[video_id] = (published_at.isoformat() + 'Z', views or 0, likes or 0, comments or 0)
+            
+            # Freshly fetched statistics win over stored ones
+            for video in videos:
+                if video.get('published_at'):
+                    records[video.get('id') or len(records)] = (
+                        video['published_at'], video.get('view_count', 0),
+                        video.get('like_count', 0), video.get('comment_count', 0)
+                    )
+            
+            if len(records) < self.grid_config['min_videos']:
+                return None
+            
+            published, views, likes, comments = zip(*records.values())
+            grid = PerformanceGrid(published, views, likes, comments, timezone_name=self.grid_config['timezone'])
+            return grid if grid.videos >= self.grid_config['min_videos'] else None
+            
+        except Exception as e:
+            logging.error(f"Error building performance grid: {str(e)}")
+            return None
+    
+    def _heatmap(self, performance_grid):
+        """JSON form of a performance grid, with Arabic day names"""
+        if performance_grid is None:
+            return None
+        return performance_grid.to_dict([self._get_arabic_day_name(day) for day in range(DAYS)])
+    
+    def _grid_timing(self, performance_grid):
+        """Best days, hours and peaks measured from the channel's own uploads"""
+        cells = performance_grid.best_cells(3)
+        top_day, top_hour = cells[0]
+        top_lift = float(np.expm1(performance_grid.score[top_day * HOURS + top_hour]))
+        
+        return {
+            'best_days': [self._get_arabic_day_name(day) for day in performance_grid.best_days(3)],
+            'best_hours': performance_grid.best_hours(3),
+            'activity_pattern': f'أفضل أداء فعلي للقناة: {self._get_arabic_day_name(top_day)} '
+                                f'الساعة {top_hour:02d}:00 ({top_lift:+.0%} مقارنة بالمعتاد)',
+            'engagement_peaks': [f'{self._get_arabic_day_name(day)} {hour:02d}:00-{(hour + 1) % 24:02d}:00'
+                                 for day, hour in cells],
+            'confidence': float(np.mean([performance_grid.confidence[day * HOURS + hour] for day, hour in cells]))
+        }
+    
+    def _apply_performance_grid(self, timing, performance_grid):
+        """Replace generic best days/hours in a timing result with measured ones"""
+        if performance_grid is None:
+            return timing
+        
+        measured = self._grid_timing(performance_grid)
+        timing.update({
+            'best_days': measured['best_days'],
+            'best_hours': measured['best_hours'],
+            'timezone': self.grid_config['timezone'],
+            'performance_heatmap': self._heatmap(performance_grid)
+        })
+        timing['audience_data'] = {
+            **timing.get('audience_data', {}),
+            'activity_pattern': measured['activity_pattern'],
+            'engagement_peaks': measured['engagement_peaks']
+        }
+        return timing
+    
     def _determine_content_category(self, channel_info, videos):
         """Determine content category from channel info and videos"""
         # Simple keyword-based categorization
@@ -163,23 +322,13 @@ class TimingOptimizer:
         for video in videos[:5]:  # Check first 5 videos
             text_content += f" {video.get('title', '')}"
         
-        text_content = text_content.lower()
-        
-        # Category keywords
-        categories = {
-            'تعليم': ['تعليم', 'شرح', 'دروس', 'كورس', 'تعلم', 'دليل', 'كيف'],
-            'ترفيه': ['ترفيه', 'كوميدي', 'مضحك', 'تحدي', 'فلوق', 'مقلب'],
-            'تقنية': ['تقنية', 'برمجة', 'كمبيوتر', 'تطوير', 'تطبيق', 'موقع'],
-            'رياضة': ['رياضة', 'كرة', 'لعب', 'فريق', 'مباراة', 'تمرين'],
-            'موسيقى': ['موسيقى', 'أغنية', 'مطرب', 'فنان', 'إيقاع', 'لحن'],
-            'طبخ': ['طبخ', 'وصفة', 'أكل', 'طعام', 'مطبخ', 'طبخة']
-        }
+        hits = text_features(text_content).keyword_hits(self.matcher).get('timing_category', {})
         
         max_matches = 0
         detected_category = 'عام'
         
-        for category, keywords in categories.items():
-            matches = sum(1 for keyword in keywords if keyword in text_content)
+        for category in self.category_keywords:
+            matches = len(hits.get(category, []))
             if matches > max_matches:
                 max_matches = matches
                 detected_category = category
@@ -233,6 +382,21 @@ class TimingOptimizer:
                 'reasoning': ['تحليل عام']
             }
     
+    def _compute_category_timing(self, category, target_audience):
+        """AI recommendations for a category merged with general patterns, or None on failure"""
+        ai_recommendations = self._get_ai_category_timing(category, target_audience)
+        if not ai_recommendations:
+            return None
+        
+        pattern = self.general_patterns['content_categories'].get(
+            category, self.general_patterns['content_categories']['عام'])
+        return {
+            'best_days': ai_recommendations.get('best_days', pattern['best_days']),
+            'best_hours': ai_recommendations.get('best_hours', pattern['best_hours']),
+            'reasoning': ai_recommendations.get('reasoning', []),
+            'additional_tips': ai_recommendations.get('tips', [])
+        }
+    
     def _get_ai_category_timing(self, category, target_audience):
         """Get AI timing recommendations for specific category"""
         try:
@@ -265,8 +429,27 @@ class TimingOptimizer:
             logging.error(f"Error in AI category timing: {str(e)}")
             return {}
     
-    def _calculate_optimal_timing(self, content_category, posting_patterns, ai_analysis):
-        """Calculate optimal timing based on all factors"""
+    def _calculate_optimal_timing(self, content_category, posting_patterns, ai_analysis, performance_grid=None):
+        """Calculate optimal timing based on all factors
+        
+        With a performance grid, best days and hours come from how the
+        channel's own uploads performed; otherwise from category patterns
+        merged with the AI analysis.
+        """
+        if performance_grid is not None:
+            measured = self._grid_timing(performance_grid)
+            return {
+                'best_days': measured['best_days'],
+                'best_hours': measured['best_hours'],
+                'activity_pattern': measured['activity_pattern'],
+                'engagement_peaks': measured['engagement_peaks'],
+                'confidence': min(1.0, 0.6 + 0.4 * measured['confidence']),
+                'content_specific': {
+                    'category': content_category,
+                    'reasoning': f'محسوب من أداء {performance_grid.videos} فيديو للقناة'
+                }
+            }
+        
         # Get base recommendations for content category
         base_timing = self.general_patterns['content_categories'].get(
             content_category, 
@@ -306,8 +489,16 @@ class TimingOptimizer:
             }
         }
     
-    def _assess_data_quality(self, videos):
+    def _assess_data_quality(self, videos, cadence=None):
         """Assess the quality of data for analysis"""
+        if cadence:
+            # Stored history: enough uploads over a long enough span
+            if cadence['uploads'] >= 50 and cadence['span_days'] >= 90:
+                return 'عالي'
+            elif cadence['uploads'] >= 15:
+                return 'متوسط'
+            return 'منخفض'
+        
         if not videos:
             return 'منخفض'
         elif len(videos) < 5:
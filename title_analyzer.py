@@ -2,8 +2,12 @@ import os
 import json
 import logging
 import re
+import numpy as np
 from openai import OpenAI
 from collections import Counter
+from keyword_matcher import keyword_matcher
+from text_features import TextFeatures, text_features
+from title_variants import TitleVariantGenerator
 
 class TitleAnalyzer:
     def __init__(self):
@@ -27,6 +31,22 @@ class TitleAnalyzer:
             'trending': ['2024', 'جديد', 'حديث', 'آخر', 'عاجل', 'حصري', 'مباشر'],
             'engagement': ['تحدي', 'مسابقة', 'تجربة', 'اختبار', 'لعبة', 'مقارنة', 'مراجعة']
         }
+        
+        # Limits of the batch quick-analysis endpoint
+        self.batch_limits = {
+            'max_titles': int(os.environ.get('QUICK_ANALYSIS_MAX_TITLES', '10000')),
+            'stream_chunk': 500
+        }
+        
+        # Score change per keyword found in each category
+        self.emotional_weights = {'positive': 1, 'negative': -0.5, 'curiosity': 1.5, 'urgency': 1.2}
+        self.seo_weights = {'high_value': 1.5, 'trending': 1.2, 'engagement': 1}
+        
+        self.matcher = keyword_matcher
+        self.matcher.register('title_emotional', self.emotional_keywords)
+        self.matcher.register('title_seo', self.seo_keywords)
+        
+        self.variant_generator = TitleVariantGenerator(self)
     
     def analyze_title(self, title, category='عام', target_audience=''):
         """Comprehensive title analysis using AI and linguistic analysis"""
@@ -89,20 +109,95 @@ class TitleAnalyzer:
     
     def quick_analyze(self, title):
         """Quick analysis for API endpoints"""
-        basic_metrics = self._calculate_basic_metrics(title)
-        emotional_analysis = self._analyze_emotional_content(title)
-        seo_analysis = self._analyze_seo_factors(title)
+        return self.quick_analyze_batch([title])[0]
+    
+    def quick_analyze_batch(self, titles):
+        """Quick analysis of many titles at once, results in input order
+        
+        Each title is scanned once for all emotional and SEO keywords; the
+        basic, emotional and SEO scores are then computed for the whole
+        batch from one feature matrix by _score_features, the same rules
+        _calculate_basic_metrics, _analyze_emotional_content and
+        _analyze_seo_factors apply to a single title.
+        """
+        # Not the shared text_features cache: a large batch would only churn it
+        features = np.array([self._title_features(TextFeatures(title)) for title in titles], dtype=np.float64)
+        features = features.reshape(len(titles), 4 + len(self.emotional_weights) + len(self.seo_weights))
+        scores = self._score_features(features)
+        
+        length = features[:, 0]
+        attractiveness = (scores['keyword_strength'] + scores['emotional_score'] + scores['seo_score']) / 3 * 10
+        length_score = np.where((length >= 40) & (length <= 70), 10, 5)
+        
+        return [
+            {
+                'attractiveness_score': float(attractiveness[i]),
+                'emotional_impact': float(scores['emotional_score'][i]),
+                'length_score': int(length_score[i]),
+                'has_emotional_keywords': bool(scores['has_emotional'][i]),
+                'has_numbers': bool(scores['has_numbers'][i]),
+                'is_question': bool(scores['has_question'][i]),
+                'seo_score': float(scores['seo_score'][i])
+            }
+            for i in range(len(titles))
+        ]
+    
+    def _title_features(self, text):
+        """Feature row of one title: length, word count, numbers, question, then keyword counts per category"""
+        hits = text.keyword_hits(self.matcher, ('title_emotional', 'title_seo'))
+        emotional_hits = hits.get('title_emotional', {})
+        seo_hits = hits.get('title_seo', {})
+        
+        return [
+            text.length,
+            text.word_count,
+            len(text.numbers),
+            text.question_marks > 0 or 'questions' in emotional_hits,
+            *[len(emotional_hits.get(category, [])) for category in self.emotional_weights],
+            *[len(seo_hits.get(category, [])) for category in self.seo_weights]
+        ]
+    
+    def _score_features(self, features):
+        """Basic, emotional and SEO scores of an (n, columns) _title_features matrix"""
+        emotional_end = 4 + len(self.emotional_weights)
+        length, word_count, numbers, question = features[:, :4].T
+        emotional_counts = features[:, 4:emotional_end]
+        seo_counts = features[:, emotional_end:]
+        has_numbers = numbers > 0
+        has_question = question > 0
+        
+        # Keyword strength based on length and structure
+        keyword_strength = np.minimum(10, 5 + 2 * ((length >= 40) & (length <= 70)) + has_numbers + has_question
+                                      + (word_count >= 5))
+        
+        # Emotional keywords, plus numbers as a curiosity factor
+        emotional_score = 5 + emotional_counts @ np.array(list(self.emotional_weights.values())) + 0.5 * numbers
+        
+        # SEO keywords, length optimal for YouTube titles (or too long) and keyword potential
+        seo_score = (5 + seo_counts @ np.array(list(self.seo_weights.values()))
+                     + ((length >= 40) & (length <= 60)) - (length > 100) + 0.5 * (word_count >= 5))
         
         return {
-            'attractiveness_score': (basic_metrics['keyword_strength'] + emotional_analysis['emotional_score'] + seo_analysis['seo_score']) / 3 * 10,
-            'emotional_impact': emotional_analysis['emotional_score'],
-            'length_score': 10 if 40 <= basic_metrics['length'] <= 70 else 5,
-            'has_emotional_keywords': len(emotional_analysis['emotional_keywords']) > 0,
-            'has_numbers': basic_metrics['has_numbers'],
-            'is_question': basic_metrics['has_question'],
-            'seo_score': seo_analysis['seo_score']
+            'has_numbers': has_numbers,
+            'has_question': has_question,
+            'has_emotional': emotional_counts.sum(axis=1) > 0,
+            'keyword_strength': keyword_strength,
+            'emotional_score': np.clip(emotional_score, 1, 10),
+            'seo_score': np.clip(seo_score, 1, 10),
+            'seo_keyword_score': np.minimum(10, seo_score)
         }
     
+    def generate_title_variants(self, title, count=10, polish=False):
+        """Locally generated and ranked title rewrites; the LLM only polishes the winners"""
+        result = self.variant_generator.rank(title, top=count)
+        result['polished'] = False
+        
+        if polish and not self.demo_mode and result['variants']:
+            result['variants'] = self.variant_generator.polish(self.openai_client, title, result['variants'])
+            result['polished'] = all('polished_title' in variant for variant in result['variants'])
+        
+        return result
+    
     def _get_ai_analysis(self, title, category, target_audience):
         """Get AI-powered analysis from GPT-4o with enhanced accuracy"""
         try:
@@ -199,33 +294,15 @@ class TitleAnalyzer:
     def _calculate_basic_metrics(self, title):
         """Calculate basic linguistic metrics"""
         try:
-            length = len(title)
-            words = title.split()
-            word_count = len(words)
-            
-            # Check for numbers
-            has_numbers = bool(re.search(r'\d+', title))
-            
-            # Check for questions
-            has_question = '؟' in title or any(q in title for q in self.emotional_keywords['questions'])
-            
-            # Keyword strength based on length and structure
-            keyword_strength = 5  # Base score
-            if 40 <= length <= 70:
-                keyword_strength += 2
-            if has_numbers:
-                keyword_strength += 1
-            if has_question:
-                keyword_strength += 1
-            if word_count >= 5:
-                keyword_strength += 1
+            text = text_features(title)
+            scores = self._score_features(np.array([self._title_features(text)], dtype=np.float64))
             
             return {
-                'length': length,
-                'word_count': word_count,
-                'has_numbers': has_numbers,
-                'has_question': has_question,
-                'keyword_strength': min(10, keyword_strength)
+                'length': text.length,
+                'word_count': text.word_count,
+                'has_numbers': text.has_numbers,
+                'has_question': bool(scores['has_question'][0]),
+                'keyword_strength': int(scores['keyword_strength'][0])
             }
             
         except Exception as e:
@@ -241,40 +318,16 @@ class TitleAnalyzer:
     def _analyze_emotional_content(self, title):
         """Analyze emotional content and appeal"""
         try:
-            emotional_score = 5  # Base score
-            found_keywords = {
-                'positive': [],
-                'negative': [],
-                'curiosity': [],
-                'urgency': []
-            }
-            
-            title_lower = title.lower()
+            text = text_features(title)
+            hits = text.keyword_hits(self.matcher, ('title_emotional', 'title_seo')).get('title_emotional', {})
+            found_keywords = {category: [keyword for keyword, _ in hits.get(category, [])]
+                              for category in self.emotional_weights}
             
-            # Check for emotional keywords
-            for category, keywords in self.emotional_keywords.items():
-                if category == 'numbers' or category == 'questions':
-                    continue
-                    
-                for keyword in keywords:
-                    if keyword in title_lower:
-                        found_keywords[category].append(keyword)
-                        if category == 'positive':
-                            emotional_score += 1
-                        elif category == 'curiosity':
-                            emotional_score += 1.5
-                        elif category == 'urgency':
-                            emotional_score += 1.2
-                        elif category == 'negative':
-                            emotional_score -= 0.5
-            
-            # Check for numbers (curiosity factor)
-            numbers = re.findall(r'\d+', title)
-            if numbers:
-                emotional_score += 0.5 * len(numbers)
+            scores = self._score_features(np.array([self._title_features(text)], dtype=np.float64))
+            numbers = text.numbers
             
             return {
-                'emotional_score': min(10, max(1, emotional_score)),
+                'emotional_score': float(scores['emotional_score'][0]),
                 'emotional_keywords': found_keywords,
                 'curiosity_factors': found_keywords['curiosity'] + (numbers if numbers else []),
                 'urgency_indicators': found_keywords['urgency']
@@ -292,42 +345,17 @@ class TitleAnalyzer:
     def _analyze_seo_factors(self, title):
         """Analyze SEO and discoverability factors"""
         try:
-            seo_score = 5  # Base score
-            found_keywords = {
-                'high_value': [],
-                'trending': [],
-                'engagement': []
-            }
-            
-            title_lower = title.lower()
-            
-            # Check for SEO keywords
-            for category, keywords in self.seo_keywords.items():
-                for keyword in keywords:
-                    if keyword in title_lower:
-                        found_keywords[category].append(keyword)
-                        if category == 'high_value':
-                            seo_score += 1.5
-                        elif category == 'trending':
-                            seo_score += 1.2
-                        elif category == 'engagement':
-                            seo_score += 1
-            
-            # Length optimization for SEO
-            length = len(title)
-            if 40 <= length <= 60:  # Optimal length for YouTube titles
-                seo_score += 1
-            elif length > 100:  # Too long
-                seo_score -= 1
+            text = text_features(title)
+            hits = text.keyword_hits(self.matcher, ('title_emotional', 'title_seo')).get('title_seo', {})
+            found_keywords = {category: [keyword for keyword, _ in hits.get(category, [])]
+                              for category in self.seo_weights}
             
-            # Keyword density analysis
-            words = title.split()
-            if len(words) >= 5:  # Good keyword potential
-                seo_score += 0.5
+            scores = self._score_features(np.array([self._title_features(text)], dtype=np.float64))
+            length = text.length
             
             return {
-                'seo_score': min(10, max(1, seo_score)),
-                'keyword_score': min(10, seo_score),
+                'seo_score': float(scores['seo_score'][0]),
+                'keyword_score': float(scores['seo_keyword_score'][0]),
                 'found_keywords': found_keywords,
                 'length_optimization': 40 <= length <= 60
             }
@@ -431,22 +459,8 @@ class TitleAnalyzer:
     
     def _generate_alternative_titles(self, title, category):
         """Generate alternative title suggestions"""
-        base_words = title.split()
-        alternatives = []
-        
-        # Add numbers if not present
-        if not re.search(r'\d+', title):
-            alternatives.append(f"5 {' '.join(base_words[:3])} مذهلة")
-        
-        # Add question format if not present
-        if '؟' not in title and not any(q in title for q in ['كيف', 'لماذا', 'ماذا']):
-            alternatives.append(f"كيف {' '.join(base_words[:4])}؟")
-        
-        # Add urgency if not present
-        if not any(u in title.lower() for u in ['الآن', 'اليوم', 'جديد', 'عاجل']):
-            alternatives.append(f"{title} - جديد 2024")
-        
-        return alternatives[:3] if alternatives else [f"تحسين: {title}"]
+        alternatives = [variant['title'] for variant in self.variant_generator.rank(title, top=3)['variants']]
+        return alternatives if alternatives else [f"تحسين: {title}"]
     
     def _identify_viral_factors(self, title, emotional_analysis, basic_metrics):
         """Identify viral factors present or missing"""
@@ -0,0 +1,194 @@
+import json
+import logging
+import re
+from datetime import datetime
+
+from text_features import normalize_arabic, text_features
+
+# Separators between the parts of a title ('العنوان: الشرح', 'أ - ب', 'أ | ب')
+_SEPARATOR = re.compile(r'\s*[:\-|–]\s*')
+_TRAILING_PUNCTUATION = '؟?!.،,:- '
+
+
+class TitleVariantGenerator:
+    """Rule-based title rewrites ranked with the local title heuristics
+
+    Rules insert numbers, turn the title into a question, add urgency and
+    curiosity words, reorder its parts and trim it toward the optimal
+    length; rewrites of rewrites are included too, so one title yields
+    dozens of candidates. All candidates are scored in one
+    quick_analyze_batch call.
+    """
+
+    def __init__(self, title_analyzer):
+        self.title_analyzer = title_analyzer
+        self.numbers = ['3', '5', '7', '10']
+        self.templates = {
+            'number': ['{n} {core}', 'أفضل {n} {core}', '{core}: {n} نصائح', '{n} أسرار عن {core}'],
+            'question': ['كيف {core}؟', 'لماذا {core}؟', 'هل {core}؟', 'ماذا تعرف عن {core}؟'],
+            'urgency': ['{title} الآن', 'عاجل: {title}', 'جديد: {title}', '{title} {year}', '{title} قبل فوات الأوان'],
+            'curiosity': ['سر {core}', '{title} (لن تصدق النتيجة)', 'مفاجأة: {title}', 'ما لا يخبرك به أحد عن {core}']
+        }
+        # Second-round rules applied on top of the first ones
+        self.combinations = [('number', 'urgency'), ('question', 'urgency'), ('curiosity', 'urgency')]
+        self.question_words = ('كيف', 'لماذا', 'هل', 'ماذا', 'متي', 'اين', 'من')
+        self.optimal_length = (40, 70)
+        self.max_candidates = 200
+
+    def generate(self, title):
+        """Unique candidate rewrites of a title as (text, rules applied, family)
+
+        Candidates of one family differ only in the number or the
+        second-round word, so ranking keeps one per family.
+        """
+        title = ' '.join(title.split())
+        candidates = {}
+        if not title.strip(_TRAILING_PUNCTUATION):
+            return []
+
+        def add(text, rules, family):
+            text = ' '.join(text.split())
+            key = normalize_arabic(text)
+            if text and key != normalize_arabic(title) and key not in candidates:
+                candidates[key] = (text, rules, family)
+
+        first_round = {rule: self._apply(rule, title) for rule in self.templates}
+        for rule, variants in first_round.items():
+            for index, text in variants:
+                add(text, [rule], f'{rule}:{index}')
+
+        for first, second in self.combinations:
+            for index, text in first_round[first]:
+                for _, combined in self._apply(second, text):
+                    add(combined, [first, second], f'{first}:{index}+{second}')
+
+        for index, text in enumerate(self._reorder(title)):
+            add(text, ['reorder'], f'reorder:{index}')
+
+        # Trim everything that ended up too long, keeping both versions
+        for text, rules, family in list(candidates.values()):
+            trimmed = self._trim(text)
+            if trimmed != text:
+                add(trimmed, rules + ['trim'], family + '+trim')
+        trimmed = self._trim(title)
+        if trimmed != title:
+            add(trimmed, ['trim'], 'trim')
+
+        return list(candidates.values())[:self.max_candidates]
+
+    def rank(self, title, top=10):
+        """Top candidates by local attractiveness, one per family, with the original's score"""
+        candidates = self.generate(title)
+        scores = self.title_analyzer.quick_analyze_batch([title] + [text for text, _, _ in candidates])
+        original = scores[0]['attractiveness_score']
+
+        ranked = sorted(
+            zip(candidates, scores[1:]),
+            key=lambda item: (-item[1]['attractiveness_score'], self._length_penalty(item[0][0]))
+        )
+        variants = []
+        families = set()
+        for (text, rules, family), score in ranked:
+            if family in families:
+                continue
+            families.add(family)
+            variants.append({
+                'title': text,
+                'rules': rules,
+                'score': round(score['attractiveness_score'], 1),
+                'improvement': round(score['attractiveness_score'] - original, 1)
+            })
+            if len(variants) == top:
+                break
+
+        return {
+            'title': title,
+            'original_score': round(original, 1),
+            'candidates_scored': len(candidates),
+            'variants': variants
+        }
+
+    def polish(self, openai_client, title, variants):
+        """Ask the LLM to polish the winning variants' wording; the variants unchanged on failure"""
+        try:
+            # the newest OpenAI model is "gpt-4o" which was released May 13, 2024.
+            # do not change this unless explicitly requested by the user
+            response = openai_client.chat.completions.create(
+                model="gpt-4o",
+                messages=[
+                    {
+                        "role": "system",
+                        "content": """أنت محرر عناوين يوتيوب عربية.
+                        حسّن صياغة كل عنوان لغوياً دون تغيير بنيته (الأرقام، السؤال، كلمات الاستعجال).
+                        أرجع النتيجة بصيغة JSON: {"titles": [...]} بنفس الترتيب والعدد."""
+                    },
+                    {
+                        "role": "user",
+                        "content": json.dumps({'original': title, 'titles': [variant['title'] for variant in variants]},
+                                              ensure_ascii=False)
+                    }
+                ],
+                response_format={"type": "json_object"}
+            )
+
+            polished = json.loads(response.choices[0].message.content).get('titles', [])
+            if len(polished) != len(variants):
+                return variants
+            return [{**variant, 'polished_title': text} for variant, text in zip(variants, polished)]
+
+        except Exception as e:
+            logging.error(f"Error polishing title variants: {str(e)}")
+            return variants
+
+    def _apply(self, rule, title):
+        """(template index, rewrite) pairs of one rule; empty if the title already follows it"""
+        text = text_features(title)
+        core = title.strip(_TRAILING_PUNCTUATION)
+        question_worded = bool(text.words) and normalize_arabic(text.words[0]) in self.question_words
+        if rule == 'number' and text.has_numbers:
+            return []
+        if rule == 'question':
+            if text.question_marks:
+                return []
+            # Already worded as a question: only the question mark is missing
+            if question_worded:
+                return [(0, f'{core}؟')]
+
+        year = str(datetime.now().year)
+        variants = []
+        for index, template in enumerate(self.templates[rule]):
+            # Nothing goes in front of a leading question word
+            if question_worded and not template.startswith(('{core}', '{title}')) and rule != 'urgency':
+                continue
+            if '{n}' in template:
+                variants.extend((index, template.format(n=n, core=core, title=title, year=year))
+                                for n in self.numbers)
+            else:
+                variants.append((index, template.format(core=core, title=title, year=year)))
+        return variants
+
+    @staticmethod
+    def _reorder(title):
+        """Swap the parts around a separator, or move the last words to the front"""
+        parts = [part for part in _SEPARATOR.split(title.strip(_TRAILING_PUNCTUATION)) if part]
+        if len(parts) > 1:
+            return [f"{parts[-1]}: {' '.join(parts[:-1])}", ' - '.join(reversed(parts))]
+
+        words = title.split()
+        if len(words) >= 4:
+            return [f"{' '.join(words[-2:])}: {' '.join(words[:-2])}"]
+        return []
+
+    def _trim(self, title):
+        """Drop words from the end until the title fits the optimal length"""
+        words = title.split()
+        while len(' '.join(words)) > self.optimal_length[1] and len(words) > 3:
+            words.pop()
+        trimmed = ' '.join(words)
+        if trimmed != title and title.endswith(('؟', '?')) and not trimmed.endswith(('؟', '?')):
+            trimmed = trimmed.rstrip(_TRAILING_PUNCTUATION) + '؟'
+        return trimmed
+
+    def _length_penalty(self, title):
+        low, high = self.optimal_length
+        return max(0, low - len(title), len(title) - high)